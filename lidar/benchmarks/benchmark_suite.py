@@ -0,0 +1,459 @@
+"""Offline benchmark suite of the labelled LiDAR and the orthophoto pipelines.
+
+Generates synthetic LAS tiles, a campus boundary and orthophotos at several data sizes and
+times extract_relative_las_data, filter_out_of_campus_points, extract_polygon_features and
+extract_tree_cover_from_tif_tfw on them. Every stage runs cold, the tile and artifact caches
+are emptied before each repetition. The columnar extraction is also checked against the per
+record loop the pipeline used before, and the speedup over it is reported. The results are
+written as json into the results folder, so runs before and after a change can be compared
+with --compare.
+
+usage: python benchmark_suite.py [--sizes small medium] [--repeat 3] [--workers 1]
+                                 [--compare results/benchmark_<timestamp>.json]
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic_data
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+ORTHOPHOTO_SRC_DIR = os.path.join(BENCHMARKS_DIR, "..", "..", "orthophoto")
+# paths given on the command line are relative to where the suite was started
+INVOCATION_DIR = os.getcwd()
+# the pipeline modules read their configs relative to the source folder
+LIDAR_SRC_DIR = os.path.join(BENCHMARKS_DIR, "..", "lidar")
+sys.path.insert(0, LIDAR_SRC_DIR)
+os.chdir(LIDAR_SRC_DIR)
+
+from laspy.file import File  # noqa: E402
+from config import configure  # noqa: E402
+from instrumentation import RunInstrumentation  # noqa: E402
+from pre_processing import LiDARIndexType, PreProcessor  # noqa: E402
+from processing import ProcessingPipeline  # noqa: E402
+from settings import LabelledSettings  # noqa: E402
+from tile_cache import TileCache  # noqa: E402
+
+RESULTS_VERSION = 1
+# tiles, points per square metre of the LAS tiles and width of the orthophotos in pixels.
+# The CoV orthophotos are 10000 pixels wide, 0.1 m per pixel.
+SIZES = {
+    "small": {"tiles": 1, "density": 0.5, "image_size": 2500},
+    "medium": {"tiles": 4, "density": 1.0, "image_size": 5000},
+    "large": {"tiles": 9, "density": 2.0, "image_size": 10000},
+}
+# the default thresholds of the orthophoto pipeline
+ORTHOPHOTO_GRANULARITY = 20
+ORTHOPHOTO_STDDEV_THRESHOLD = 5
+ORTHOPHOTO_MIN_COLOUR = (35.0 / 360 * 255, 30.0, 0.0)
+ORTHOPHOTO_MAX_COLOUR = (270.0 / 360 * 255, 255.0, 150.0)
+
+
+class StageBenchmark:
+    """Wall times of the repetitions of one stage and the instrumentation of its runs"""
+
+    def __init__(self, name):
+        self._name = name
+        # the benchmarks run on their own, so the peak rss of every case can be measured on its own
+        self._instrumentation = RunInstrumentation(name, stage_peak_rss=True)
+        self.wall_times = []
+        self.breakdown = None
+        self.skipped = None
+
+    @property
+    def name(self):
+        return self._name
+
+    def run(self, function, points_in=0):
+        """Time one repetition of the stage
+
+        Args:
+            function (function): runs the stage and returns the number of points out
+            points_in (int, optional): number of points going into the stage. Defaults to 0.
+
+        Returns:
+            the result of the function
+        """
+        with self._instrumentation.stage(self._name, points_in=points_in) as record:
+            start_time = time.perf_counter()
+            points_out = function()
+            self.wall_times.append(time.perf_counter() - start_time)
+            record.points_out += points_out
+        return points_out
+
+    def to_dict(self):
+        if self.skipped is not None:
+            return {"name": self._name, "skipped": self.skipped}
+        record = self._instrumentation.record(self._name).to_dict()
+        calls = max(record["calls"], 1)
+        return {
+            "name": self._name,
+            "repetitions": len(self.wall_times),
+            "wall_times_s": self.wall_times,
+            "best_s": min(self.wall_times),
+            "median_s": float(np.median(self.wall_times)),
+            "cpu_time_s": record["cpu_time_s"] / calls,
+            "peak_rss_mb": record["peak_rss_mb"],
+            "points_in": record["points_in"] // calls,
+            "points_out": record["points_out"] // calls,
+            "points_per_second": record["points_in"] / sum(self.wall_times)
+            if sum(self.wall_times) > 0 else None,
+            "breakdown": self.breakdown,
+        }
+
+
+def workspace_settings(settings, workspace, boundary_path):
+    """Point every path the pipelines write to into the workspace, so the benchmark never
+    touches the data folder or its caches
+
+    Args:
+        settings (LabelledSettings): the settings of the benchmark
+        workspace (str): temporary folder of the benchmark
+        boundary_path (str): the synthetic campus boundary
+
+    Returns:
+        LabelledSettings: the settings with the paths in the workspace
+    """
+    return dataclasses.replace(settings, paths=dataclasses.replace(
+        settings.paths,
+        data_folder_path=os.path.join(workspace, "data"),
+        tests_folder_path=os.path.join(workspace, "tests"),
+        tile_cache_dir=os.path.join(workspace, "tile_cache"),
+        artifact_cache_dir=os.path.join(workspace, "artifact_cache"),
+        point_store_path=os.path.join(workspace, "point_store"),
+        run_report_dir=os.path.join(workspace, "run_reports"),
+        boundary_geojson_file_path=boundary_path,
+    ))
+
+
+def legacy_extract(pre_processor, las_file, index_type=LiDARIndexType.HIGH_VEGETATION):
+    """The per record extraction loop the pipeline used before, without down sampling
+
+    Args:
+        pre_processor (PreProcessor): pre processor holding the corner tile
+        las_file (LasFile): the tile to extract
+        index_type (int, optional): the class of the points. Defaults to LiDARIndexType.HIGH_VEGETATION.
+
+    Returns:
+        np.array, np.array: the points in the relative frame
+    """
+    frame = pre_processor.settings.frame
+    in_file = File(las_file.file_path, mode="r")
+    sample = in_file.points[in_file.Classification == index_type]
+    x = np.zeros(sample.shape[0])
+    y = np.zeros(sample.shape[0])
+    z = np.zeros(sample.shape[0])
+    for i in np.arange(0, sample.shape[0]):
+        x[i] = sample[i][0][0]
+        y[i] = sample[i][0][1]
+        z[i] = sample[i][0][2]
+    in_file.close()
+    x_min = (las_file.east - frame.east_offset) * frame.tile_scale
+    y_min = (las_file.north - frame.north_offset) * frame.tile_scale
+    x_transformed = x - x_min + (las_file.east - pre_processor.min_east) * frame.tile_scale
+    y_transformed = y - y_min + (las_file.north - pre_processor.min_north) * frame.tile_scale
+    return x_transformed, y_transformed
+
+
+def benchmark_legacy_extraction(tile_dir, tile_points, repeat, settings):
+    """Time the per record extraction loop against the columnar extraction on the same tiles and
+    check that they give the same points. Both run without down sampling, which the loop had not.
+
+    Args:
+        tile_dir (str): folder of the synthetic tiles
+        tile_points (int): number of points in the tiles
+        repeat (int): repetitions of every stage
+        settings (LabelledSettings): the settings of the pipeline, with the paths in the workspace
+
+    Raises:
+        AssertionError: the columnar extraction does not give the points of the loop
+
+    Returns:
+        list, float: the stage benchmarks and the speedup of the columnar extraction over the loop
+    """
+    settings = dataclasses.replace(settings, down_sample=dataclasses.replace(
+        settings.down_sample, min_points_for_downsize=tile_points))
+    pre_processor = PreProcessor(tile_dir, settings)
+    points = {}
+    stages = {"legacy": StageBenchmark("legacy_record_loop_extraction"),
+              "columnar": StageBenchmark("columnar_full_extraction")}
+    extractors = {"legacy": lambda las_file: legacy_extract(pre_processor, las_file),
+                  "columnar": pre_processor.extract_relative_las_data}
+    for _ in range(repeat):
+        empty_dir(settings.paths.tile_cache_dir)
+        pre_processor.tile_cache = TileCache(settings.paths.tile_cache_dir)
+        for name, extract in extractors.items():
+            def extract_tiles():
+                points[name] = []
+                for las_file in pre_processor.lasfile_list:
+                    try:
+                        points[name].append(extract(las_file))
+                    except LookupError:
+                        # no high vegetation in the tile
+                        points[name].append((np.array([]), np.array([])))
+                return sum(x.shape[0] for x, _ in points[name])
+            stages[name].run(extract_tiles, points_in=tile_points)
+        for (legacy_x, legacy_y), (x, y) in zip(points["legacy"], points["columnar"]):
+            assert np.array_equal(legacy_x, x) and np.array_equal(legacy_y, y), \
+                "the columnar extraction does not give the points of the per record loop"
+    speedup = min(stages["legacy"].wall_times) / min(stages["columnar"].wall_times)
+    return [stages["legacy"], stages["columnar"]], speedup
+
+
+def empty_dir(dir_path):
+    """remove a cache folder, so the next repetition starts cold"""
+    shutil.rmtree(dir_path, ignore_errors=True)
+
+
+def benchmark_lidar(size, workspace, repeat, seed, settings):
+    """Benchmark the labelled LiDAR stages on synthetic tiles
+
+    Args:
+        size (dict): number of tiles and point density
+        workspace (str): temporary folder of the benchmark
+        repeat (int): repetitions of every stage
+        seed (int): seed of the synthetic data
+        settings (LabelledSettings): the settings of the pipeline
+
+    Returns:
+        dict: the data set and the stage benchmarks
+    """
+    tile_dir = os.path.join(workspace, "tiles")
+    os.makedirs(tile_dir, exist_ok=True)
+    tiles = synthetic_data.tile_indices(size["tiles"])
+    start_time = time.perf_counter()
+    for east, north in tiles:
+        synthetic_data.write_las_tile(tile_dir, east, north, density=size["density"], seed=seed)
+    boundary_path = synthetic_data.write_boundary_geojson(
+        os.path.join(workspace, "boundary.geojson"), tiles)
+    generation_time = time.perf_counter() - start_time
+    settings = workspace_settings(settings, workspace, boundary_path)
+
+    pre_processor = PreProcessor(tile_dir, settings)
+    tile_points = sum(pre_processor.tile_catalog.entry(las_file.file_path)["point_count"]
+                      for las_file in pre_processor.lasfile_list)
+
+    extraction = StageBenchmark("extract_relative_las_data")
+    points = None
+    for _ in range(repeat):
+        empty_dir(settings.paths.tile_cache_dir)
+        pre_processor.tile_cache = TileCache(settings.paths.tile_cache_dir)
+
+        def extract():
+            nonlocal points
+            points = []
+            for las_file in pre_processor.lasfile_list:
+                try:
+                    points.append(pre_processor.extract_relative_las_data(las_file))
+                except LookupError:
+                    # no high vegetation in the tile
+                    pass
+            return sum(x.shape[0] for x, _ in points)
+        extraction.run(extract, points_in=tile_points)
+    point_x = np.concatenate([x for x, _ in points]).astype(int)
+    point_y = np.concatenate([y for _, y in points]).astype(int)
+
+    boundary_filter = StageBenchmark("filter_out_of_campus_points")
+    campus_points = None
+    for _ in range(repeat):
+        # the boundary is parsed and projected on first use, that is part of the stage
+        pre_processor._campus_boundary = None
+
+        def filter_points():
+            nonlocal campus_points
+            campus_points = pre_processor.filter_out_of_campus_points(point_x, point_y)
+            return campus_points[0].shape[0]
+        boundary_filter.run(filter_points, points_in=point_x.shape[0])
+
+    polygons = StageBenchmark("extract_polygon_features")
+    for _ in range(repeat):
+        empty_dir(settings.paths.artifact_cache_dir)
+        pipeline = ProcessingPipeline(notebook=True, settings=settings)
+        pipeline.pre_processor = pre_processor
+        polygons.run(lambda: len(pipeline.extract_polygon_features(*campus_points)),
+                     points_in=campus_points[0].shape[0])
+        # the pipeline measures its own stages, keep the split of the last repetition
+        polygons.breakdown = [stage.to_dict() for stage in pipeline.instrumentation.stages]
+
+    legacy_stages, legacy_speedup = benchmark_legacy_extraction(tile_dir, tile_points, repeat, settings)
+
+    return {
+        "data": {
+            "tiles": len(tiles),
+            "density": size["density"],
+            "tile_points": tile_points,
+            "generation_time_s": generation_time,
+            "legacy_extraction_speedup": round(legacy_speedup, 1),
+        },
+        "stages": [extraction, boundary_filter, polygons] + legacy_stages,
+    }
+
+
+def benchmark_orthophoto(size, workspace, repeat, seed):
+    """Benchmark the tree cover extraction of the orthophoto pipeline on a synthetic orthophoto
+
+    Args:
+        size (dict): width of the orthophoto in pixels
+        workspace (str): temporary folder of the benchmark
+        repeat (int): repetitions of the stage
+        seed (int): seed of the synthetic data
+
+    Returns:
+        dict: the data set and the stage benchmark
+    """
+    stage = StageBenchmark("extract_tree_cover_from_tif_tfw")
+    data = {"image_size": size["image_size"]}
+    sys.path.insert(0, ORTHOPHOTO_SRC_DIR)
+    try:
+        import orthophoto_to_geojson
+    except ImportError as error:
+        # the orthophoto pipeline needs OpenCV, the LiDAR stages are still benchmarked without it
+        stage.skipped = "orthophoto pipeline not importable: %s" % error
+        return {"data": data, "stages": [stage]}
+
+    image_dir = os.path.join(workspace, "orthophoto")
+    os.makedirs(image_dir, exist_ok=True)
+    start_time = time.perf_counter()
+    east, north = synthetic_data.tile_indices(1)[0]
+    image_name = synthetic_data.write_orthophoto(
+        image_dir, east, north, image_size=size["image_size"], seed=seed)
+    data["generation_time_s"] = time.perf_counter() - start_time
+
+    for _ in range(repeat):
+        orthophoto_to_geojson.INSTRUMENTATION = RunInstrumentation("orthophoto")
+
+        def extract():
+            orthophoto_to_geojson.extract_tree_cover_from_tif_tfw(
+                image_name, size["image_size"], ORTHOPHOTO_GRANULARITY, ORTHOPHOTO_STDDEV_THRESHOLD,
+                ORTHOPHOTO_MIN_COLOUR, ORTHOPHOTO_MAX_COLOUR)
+            with open(image_name + ".geojson") as in_file:
+                return len(json.load(in_file)["features"])
+        stage.run(extract, points_in=size["image_size"] ** 2)
+        stage.breakdown = [record.to_dict() for record in orthophoto_to_geojson.INSTRUMENTATION.stages]
+    return {"data": data, "stages": [stage]}
+
+
+def run_suite(size_names, repeat, workers, seed):
+    """Run every stage benchmark at the given sizes
+
+    Args:
+        size_names (list): names of the SIZES to run
+        repeat (int): repetitions of every stage
+        workers (int): worker processes of the pipeline, 0 for one per cpu
+        seed (int): seed of the synthetic data
+
+    Returns:
+        dict: json serializable results
+    """
+    # no progress prints, they would be timed with the stages
+    settings = dataclasses.replace(LabelledSettings.from_config(configure), workers=workers, debug=False)
+    results = {
+        "version": RESULTS_VERSION,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "workers": workers,
+        "seed": seed,
+        "parameters": settings.parameters(),
+        "sizes": {},
+    }
+    for size_name in size_names:
+        print("benchmarking the %s data set..." % size_name)
+        size_results = {"stages": []}
+        for benchmark, arguments in ((benchmark_lidar, (settings,)), (benchmark_orthophoto, ())):
+            workspace = tempfile.mkdtemp(prefix="treesap_benchmark_")
+            try:
+                result = benchmark(SIZES[size_name], workspace, repeat, seed, *arguments)
+            finally:
+                shutil.rmtree(workspace, ignore_errors=True)
+            size_results.update(result["data"])
+            size_results["stages"] += [stage.to_dict() for stage in result["stages"]]
+        results["sizes"][size_name] = size_results
+        print(format_size(size_name, size_results))
+    return results
+
+
+def format_size(size_name, size_results):
+    """human readable table of the stages of one data set"""
+    lines = ["%s: %s" % (size_name, ", ".join(
+        "%s %s" % (key, value) for key, value in size_results.items()
+        if key not in ("stages", "generation_time_s"))),
+        "  %-32s %10s %10s %12s %14s" % ("stage", "best s", "median s", "points in", "points/s")]
+    for stage in size_results["stages"]:
+        if "skipped" in stage:
+            lines.append("  %-32s skipped, %s" % (stage["name"], stage["skipped"]))
+            continue
+        lines.append("  %-32s %10.3f %10.3f %12d %14s" % (
+            stage["name"], stage["best_s"], stage["median_s"], stage["points_in"],
+            "-" if stage["points_per_second"] is None else "%.0f" % stage["points_per_second"]))
+    return "\n".join(lines)
+
+
+def compare(baseline, results):
+    """Compare the best wall time of every stage with a previous run
+
+    Args:
+        baseline (dict): results of the previous run
+        results (dict): results of this run
+
+    Returns:
+        str: one line per stage run in both, a ratio below 1 is faster than the baseline
+    """
+    lines = ["%-8s %-32s %10s %10s %8s" % ("size", "stage", "before s", "after s", "ratio")]
+    for size_name, size_results in results["sizes"].items():
+        baseline_stages = {stage["name"]: stage for stage in
+                           baseline["sizes"].get(size_name, {}).get("stages", [])}
+        for stage in size_results["stages"]:
+            before = baseline_stages.get(stage["name"])
+            if before is None or "skipped" in before or "skipped" in stage:
+                continue
+            lines.append("%-8s %-32s %10.3f %10.3f %8.2f" % (
+                size_name, stage["name"], before["best_s"], stage["best_s"],
+                stage["best_s"] / before["best_s"] if before["best_s"] > 0 else float("nan")))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TREESAP offline benchmark suite")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"],
+                        help="data sets to benchmark")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="repetitions of every stage, the best and the median are reported")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes of the pipeline, 0 for one per cpu")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--output", default=None,
+                        help="results file, defaults to results/benchmark_<timestamp>.json")
+    parser.add_argument("--compare", default=None,
+                        help="results file of a previous run to compare against")
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.repeat, args.workers, args.seed)
+    output = args.output
+    if output is not None:
+        output = os.path.join(INVOCATION_DIR, output)
+    else:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, "benchmark_%s.json" % time.strftime("%Y%m%dT%H%M%S"))
+    with open(output, "w") as out_file:
+        json.dump(results, out_file, indent=4)
+    print("results written to %s" % output)
+
+    if args.compare is not None:
+        with open(os.path.join(INVOCATION_DIR, args.compare)) as in_file:
+            print(compare(json.load(in_file), results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Synthetic data for the benchmarks, so the pipelines can be measured without the City of Vancouver dataset.
+
+Writes LAS tiles named after the CoV tile scheme (e.g. 4810E_54560N.las) with tree crowns of
+high vegetation points over bare earth, a campus boundary GeoJSON covering part of the tiles,
+and orthophoto TIF/TFW pairs of green textured crowns. Everything is seeded, so the same
+arguments always give the same data.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+import utm
+
+# a CoV tile is 1 km by 1 km, the tile indices are in units of 100 m
+TILE_SIZE_M = 1000
+TILE_INDEX_M = 100
+TILE_INDEX_STEP = TILE_SIZE_M // TILE_INDEX_M
+UTM_ZONE_NUMBER = 10
+UTM_ZONE_LETTER = "U"
+# offsets of the CoV tiles, the raw X/Y of a tile are centimetres from them (east_offset, north_offset)
+EAST_OFFSET = 4000
+NORTH_OFFSET = 50000
+# LiDARIndexType values of the CoV 2018 dataset
+BARE_EARTH_AND_LOW_GRASS = 2
+HIGH_VEGETATION = 5
+
+
+def tile_indices(tile_count, east=4810, north=54560):
+    """East, north indices of a square-ish block of adjacent tiles
+
+    Args:
+        tile_count (int): number of tiles
+        east (int, optional): east index of the south west tile. Defaults to 4810.
+        north (int, optional): north index of the south west tile. Defaults to 54560.
+
+    Returns:
+        list: (east, north) of every tile
+    """
+    columns = int(np.ceil(np.sqrt(tile_count)))
+    return [(east + (index % columns) * TILE_INDEX_STEP, north + (index // columns) * TILE_INDEX_STEP)
+            for index in range(tile_count)]
+
+
+def crowns(rng, area_m, crowns_per_hectare, mean_radius_m):
+    """Tree crowns spread over a square area
+
+    Args:
+        rng (np.random.Generator): random generator
+        area_m (float): side of the area in metres
+        crowns_per_hectare (float): average number of crowns per hectare
+        mean_radius_m (float): average crown radius in metres
+
+    Returns:
+        np.array, np.array: n x 2 crown centres and their radius, in metres from the south west corner
+    """
+    count = rng.poisson(crowns_per_hectare * area_m * area_m / 10000)
+    centres = rng.uniform(0, area_m, (count, 2))
+    # crown sizes are skewed, a few large trees and many small ones
+    radii = np.clip(rng.lognormal(np.log(mean_radius_m), 0.4, count), 1.0, 4 * mean_radius_m)
+    return centres, radii
+
+
+def points_in_crowns(rng, centres, radii, count):
+    """Points spread uniformly over the crowns, each crown getting points in proportion to its area
+
+    Args:
+        rng (np.random.Generator): random generator
+        centres (np.array): n x 2 crown centres
+        radii (np.array): crown radii
+        count (int): number of points
+
+    Returns:
+        np.array: count x 2 points
+    """
+    if centres.shape[0] == 0:
+        return np.zeros((0, 2))
+    crown = rng.choice(centres.shape[0], count, p=radii ** 2 / np.sum(radii ** 2))
+    distance = radii[crown] * np.sqrt(rng.uniform(0, 1, count))
+    angle = rng.uniform(0, 2 * np.pi, count)
+    return centres[crown] + np.column_stack((distance * np.cos(angle), distance * np.sin(angle)))
+
+
+def write_las_tile(dir_path, east, north, density=1.0, canopy_fraction=0.3,
+                   crowns_per_hectare=40, mean_radius_m=4.0, seed=0):
+    """Write a LAS tile of high vegetation crowns over bare earth
+
+    Args:
+        dir_path (str): folder to write the tile into
+        east (int): east index of the tile, in 100 m
+        north (int): north index of the tile, in 100 m
+        density (float, optional): points per square metre. Defaults to 1.0.
+        canopy_fraction (float, optional): fraction of the points in the crowns. Defaults to 0.3.
+        crowns_per_hectare (float, optional): average number of crowns per hectare. Defaults to 40.
+        mean_radius_m (float, optional): average crown radius in metres. Defaults to 4.0.
+        seed (int, optional): random seed, combined with the tile indices. Defaults to 0.
+
+    Returns:
+        str: path to the written tile
+    """
+    # laspy is only needed to write tiles, not for the rasters or the boundary
+    import laspy
+    from laspy.file import File
+
+    rng = np.random.default_rng([seed, east, north])
+    point_count = int(density * TILE_SIZE_M * TILE_SIZE_M)
+    canopy_count = int(point_count * canopy_fraction)
+    centres, radii = crowns(rng, TILE_SIZE_M, crowns_per_hectare, mean_radius_m)
+    canopy = points_in_crowns(rng, centres, radii, canopy_count)
+    canopy = canopy[np.all((canopy >= 0) & (canopy < TILE_SIZE_M), axis=1)]
+    ground = rng.uniform(0, TILE_SIZE_M, (point_count - canopy.shape[0], 2))
+
+    file_path = os.path.join(dir_path, "%dE_%dN.las" % (east, north))
+    header = laspy.header.Header(point_format=1)
+    out_file = File(file_path, mode="w", header=header)
+    # centimetre precision and the CoV offsets, the raw X/Y are centimetres from them
+    out_file.header.scale = [0.01, 0.01, 0.01]
+    out_file.header.offset = [EAST_OFFSET * TILE_INDEX_M, NORTH_OFFSET * TILE_INDEX_M, 0]
+    points = np.vstack((canopy, ground))
+    out_file.X = np.floor((points[:, 0] + (east - EAST_OFFSET) * TILE_INDEX_M) * 100).astype(np.int64)
+    out_file.Y = np.floor((points[:, 1] + (north - NORTH_OFFSET) * TILE_INDEX_M) * 100).astype(np.int64)
+    out_file.Z = np.concatenate((rng.integers(500, 3000, canopy.shape[0]),
+                                 rng.integers(0, 100, ground.shape[0])))
+    out_file.Classification = np.concatenate((
+        np.full(canopy.shape[0], HIGH_VEGETATION, dtype=np.uint8),
+        np.full(ground.shape[0], BARE_EARTH_AND_LOW_GRASS, dtype=np.uint8)))
+    out_file.close()
+    return file_path
+
+
+def write_boundary_geojson(file_path, tiles, inset=0.15, vertex_count=64):
+    """Write a campus boundary covering the middle of a block of tiles, so that some tiles are
+    inside it, some outside and some straddle it
+
+    Args:
+        file_path (str): path of the GeoJSON file
+        tiles (list): (east, north) of the tiles
+        inset (float, optional): fraction of the block left outside on every side. Defaults to 0.15.
+        vertex_count (int, optional): number of vertices of the boundary. Defaults to 64.
+
+    Returns:
+        str: path to the written file
+    """
+    tiles = np.asarray(tiles)
+    min_x, min_y = tiles.min(axis=0) * TILE_INDEX_M
+    max_x, max_y = tiles.max(axis=0) * TILE_INDEX_M + TILE_SIZE_M
+    centre_x, centre_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+    half_x, half_y = (max_x - min_x) * (0.5 - inset), (max_y - min_y) * (0.5 - inset)
+    # a rounded square, the boundary is not aligned with the tiles
+    angles = np.linspace(0, 2 * np.pi, vertex_count, endpoint=False)
+    x = centre_x + half_x * np.sign(np.cos(angles)) * np.abs(np.cos(angles)) ** 0.5
+    y = centre_y + half_y * np.sign(np.sin(angles)) * np.abs(np.sin(angles)) ** 0.5
+    latitude, longitude = utm.to_latlon(x, y, UTM_ZONE_NUMBER, UTM_ZONE_LETTER)
+    ring = np.column_stack((longitude, latitude)).tolist()
+    ring.append(ring[0])
+    with open(file_path, "w") as out_file:
+        json.dump({"type": "FeatureCollection", "features": [{
+            "type": "Feature", "properties": {"name": "synthetic campus"},
+            "geometry": {"type": "Polygon", "coordinates": [ring]}}]}, out_file)
+    return file_path
+
+
+def write_tiff(file_path, image):
+    """Write an uncompressed 8 bit RGB TIFF, readable by OpenCV, without any imaging library
+
+    Args:
+        file_path (str): path of the TIFF file
+        image (np.array): height x width x 3 uint8 image
+    """
+    height, width, _ = image.shape
+    entry_count = 10
+    ifd_offset = 8
+    bits_offset = ifd_offset + 2 + entry_count * 12 + 4
+    data_offset = bits_offset + 6
+    entries = [
+        (256, 4, 1, width),  # image width
+        (257, 4, 1, height),  # image length
+        (258, 3, 3, bits_offset),  # bits per sample, 8 8 8
+        (259, 3, 1, 1),  # no compression
+        (262, 3, 1, 2),  # RGB
+        (273, 4, 1, data_offset),  # strip offset
+        (277, 3, 1, 3),  # samples per pixel
+        (278, 4, 1, height),  # rows per strip, one strip
+        (279, 4, 1, height * width * 3),  # strip byte count
+        (284, 3, 1, 1),  # chunky planar configuration
+    ]
+    with open(file_path, "wb") as out_file:
+        out_file.write(struct.pack("<2sHI", b"II", 42, ifd_offset))
+        out_file.write(struct.pack("<H", entry_count))
+        for tag, field_type, count, value in entries:
+            if field_type == 3 and count == 1:
+                out_file.write(struct.pack("<HHIHH", tag, field_type, count, value, 0))
+            else:
+                out_file.write(struct.pack("<HHII", tag, field_type, count, value))
+        out_file.write(struct.pack("<I", 0))
+        out_file.write(struct.pack("<3H", 8, 8, 8))
+        out_file.write(np.ascontiguousarray(image, dtype=np.uint8).tobytes())
+
+
+def write_orthophoto(dir_path, east, north, image_size=10000, crowns_per_hectare=40,
+                     mean_radius_m=4.0, seed=0):
+    """Write an orthophoto TIF/TFW pair of a tile, textured green crowns over grey ground
+
+    Args:
+        dir_path (str): folder to write the files into
+        east (int): east index of the tile, in 100 m
+        north (int): north index of the tile, in 100 m
+        image_size (int, optional): width and height of the image in pixels. Defaults to 10000.
+        crowns_per_hectare (float, optional): average number of crowns per hectare. Defaults to 40.
+        mean_radius_m (float, optional): average crown radius in metres. Defaults to 4.0.
+        seed (int, optional): random seed, combined with the tile indices. Defaults to 0.
+
+    Returns:
+        str: path of the image without its extension, as extract_tree_cover_from_tif_tfw expects
+    """
+    rng = np.random.default_rng([seed, east, north, image_size])
+    resolution = TILE_SIZE_M / image_size
+    image = np.empty((image_size, image_size, 3), dtype=np.uint8)
+    # flat grey ground with a little noise, one row block at a time to bound the memory
+    for start in range(0, image_size, 1000):
+        rows = image[start:start + 1000]
+        rows[:] = rng.integers(110, 125, rows.shape, dtype=np.uint8)
+
+    centres, radii = crowns(rng, TILE_SIZE_M, crowns_per_hectare, mean_radius_m)
+    for (centre_x, centre_y), radius in zip(centres / resolution, radii / resolution):
+        # image rows go from north to south
+        row, column, radius = image_size - centre_y, centre_x, radius
+        top, bottom = int(max(row - radius, 0)), int(min(row + radius + 1, image_size))
+        left, right = int(max(column - radius, 0)), int(min(column + radius + 1, image_size))
+        if top >= bottom or left >= right:
+            continue
+        rows, columns = np.ogrid[top:bottom, left:right]
+        inside = (rows - row) ** 2 + (columns - column) ** 2 <= radius ** 2
+        # leaves are textured, the pipeline tells trees from lawns by the standard deviation
+        patch = image[top:bottom, left:right]
+        patch[inside] = np.column_stack((
+            rng.integers(20, 70, np.count_nonzero(inside)),
+            rng.integers(70, 160, np.count_nonzero(inside)),
+            rng.integers(20, 60, np.count_nonzero(inside)))).astype(np.uint8)
+
+    name = os.path.join(dir_path, "%dE_%dN" % (east // 10, north // 10))
+    write_tiff(name + ".tif", image)
+    with open(name + ".tfw", "w") as tfw_file:
+        # pixel size, rotations, negative pixel height, then the centre of the top left pixel
+        tfw_file.write("%f\n0.0\n0.0\n%f\n%f\n%f\n" % (
+            resolution, -resolution, east * TILE_INDEX_M + resolution / 2,
+            north * TILE_INDEX_M + TILE_SIZE_M - resolution / 2))
+    return name
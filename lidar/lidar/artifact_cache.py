@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import numpy as np
+from shapely.geometry import Polygon
+
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+KEY_ARRAY_NAME = "artifact_key"
+
+
+class ArtifactCache:
+    """Content addressed cache of the outputs of the pipeline stages.
+
+    An artifact is a set of named arrays saved under its stage and a key. The key covers the
+    hashes of the stage's inputs and only the parameters the stage depends on, so changing a
+    parameter of a later stage leaves the artifacts of the earlier stages in use, and an
+    artifact built from other inputs or parameters is never served.
+    """
+
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @staticmethod
+    def key(stage, inputs, parameters):
+        """Build the key of the artifact of a stage
+
+        Args:
+            stage (str): name of the stage
+            inputs (list): hashes of the inputs, e.g. the keys of the artifacts the stage reads
+            parameters (dict): every parameter the artifact depends on
+
+        Returns:
+            str: the artifact key
+        """
+        description = json.dumps(
+            {"stage": stage, "inputs": list(inputs), "parameters": parameters}, sort_keys=True)
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def array_hash(*arrays):
+        """SHA-1 of the type, shape and content of arrays
+
+        Args:
+            arrays (np.array): the arrays to hash
+
+        Returns:
+            str: the hex digest
+        """
+        digest = hashlib.sha1()
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            digest.update(("%s%s" % (array.dtype.str, array.shape)).encode("utf-8"))
+            digest.update(memoryview(array).cast("B"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def file_hash(file_path):
+        """SHA-1 of the content of a file
+
+        Args:
+            file_path (str): path to the file
+
+        Returns:
+            str: the hex digest
+        """
+        digest = hashlib.sha1()
+        with open(file_path, "rb") as in_file:
+            for block in iter(lambda: in_file.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load(self, stage, key):
+        """Load an artifact
+
+        Args:
+            stage (str): name of the stage
+            key (str): the artifact key
+
+        Returns:
+            dict or None: the arrays keyed by name, None on a cache miss
+        """
+        file_path = self.__file_path(stage, key)
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with np.load(file_path) as cached:
+                # the key is stored in the artifact too, a renamed or mixed up file is a miss
+                if str(cached[KEY_ARRAY_NAME]) != key:
+                    return None
+                return {name: cached[name] for name in cached.files if name != KEY_ARRAY_NAME}
+        except (OSError, ValueError, KeyError):
+            # a broken artifact is a miss, it will be overwritten
+            return None
+
+    def save(self, stage, key, **arrays):
+        """Save an artifact, written atomically so a stage interrupted while saving never leaves a partial file
+
+        Args:
+            stage (str): name of the stage
+            key (str): the artifact key
+            arrays (np.array): the arrays of the artifact by name
+        """
+        file_path = self.__file_path(stage, key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_file_path = "%s.%d.tmp.npz" % (file_path[:-len(".npz")], os.getpid())
+        np.savez(temp_file_path, **{KEY_ARRAY_NAME: np.array(key)}, **arrays)
+        os.replace(temp_file_path, file_path)
+
+    def __file_path(self, stage, key):
+        return os.path.join(self._cache_dir, stage, key + ".npz")
+
+
+def polygons_to_arrays(polygons):
+    """Pack the exterior rings of polygons into flat arrays to store them as an artifact
+
+    Args:
+        polygons (list): shapely polygons
+
+    Returns:
+        dict: n x 2 coordinates and the offset of every ring into them
+    """
+    rings = [np.asarray(polygon.exterior.coords, dtype=np.float64) for polygon in polygons]
+    offsets = np.cumsum([0] + [ring.shape[0] for ring in rings])
+    coordinates = np.vstack(rings) if len(rings) > 0 else np.zeros((0, 2))
+    return {"coordinates": coordinates, "offsets": offsets}
+
+
+def concatenate_polygon_arrays(parts):
+    """Join polygons packed batch by batch with polygons_to_arrays into one set of arrays
+
+    Args:
+        parts (list): the dicts returned by polygons_to_arrays
+
+    Returns:
+        dict: n x 2 coordinates and the offset of every ring into them
+    """
+    coordinates = [part["coordinates"] for part in parts]
+    offsets = [np.zeros(1, dtype=np.int64)]
+    start = 0
+    for part in parts:
+        offsets.append(part["offsets"][1:] + start)
+        start += part["coordinates"].shape[0]
+    return {"coordinates": np.vstack(coordinates) if len(coordinates) > 0 else np.zeros((0, 2)),
+            "offsets": np.concatenate(offsets)}
+
+
+def polygons_from_arrays(coordinates, offsets):
+    """Unpack the polygons packed by polygons_to_arrays
+
+    Args:
+        coordinates (np.array): n x 2 coordinates
+        offsets (np.array): the offset of every ring into the coordinates
+
+    Returns:
+        list: shapely polygons
+    """
+    return [Polygon(coordinates[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
@@ -0,0 +1,125 @@
+import json
+from enum import IntEnum
+import numpy as np
+import utm
+from shapely.geometry import Polygon, MultiPolygon, box
+
+UTM_ZONE_NUMBER = 10
+
+
+class TileBoundaryState(IntEnum):
+    """Where a tile lies relative to the campus boundary"""
+    OUTSIDE = 0
+    INSIDE = 1
+    STRADDLING = 2
+
+
+class CampusBoundary:
+    """The campus boundary projected once into the pipeline's relative centimetre frame.
+
+    The frame is the same one PreProcessor.extract_relative_las_data produces: centimetres
+    relative to the south west corner tile, so the points never leave the integer grid.
+    """
+
+    def __init__(self, geojson_file_path, min_east, min_north):
+        self._rings = []
+        with open(geojson_file_path) as in_file:
+            feature_collection = json.load(in_file)
+        for feature in feature_collection["features"]:
+            geometry = feature["geometry"]
+            polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [
+                geometry["coordinates"]]
+            for polygon in polygons:
+                self._rings.append(
+                    [self.__project_ring(ring, min_east, min_north) for ring in polygon])
+
+        # every edge of every ring, the even-odd rule takes care of the holes
+        edges = []
+        for polygon in self._rings:
+            for ring in polygon:
+                edges.append(np.hstack((ring[:-1], ring[1:])))
+        self._edges = np.vstack(edges)
+        all_points = np.vstack([ring for polygon in self._rings for ring in polygon])
+        self._bounds = (*all_points.min(axis=0), *all_points.max(axis=0))
+        self._polygon = None
+
+    @property
+    def bounds(self):
+        """(min_x, min_y, max_x, max_y) of the boundary in the relative frame"""
+        return self._bounds
+
+    @property
+    def polygon(self):
+        """The boundary as a shapely geometry in the relative frame"""
+        if self._polygon is None:
+            polygons = [Polygon(polygon[0], polygon[1:]) for polygon in self._rings]
+            self._polygon = polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+        return self._polygon
+
+    @staticmethod
+    def __project_ring(ring, min_east, min_north):
+        """Project a ring of longitude, latitude into the relative centimetre frame"""
+        ring = np.asarray(ring, dtype=np.float64)[:, :2]
+        east, north, _, _ = utm.from_latlon(
+            ring[:, 1], ring[:, 0], force_zone_number=UTM_ZONE_NUMBER)
+        # same transform as the pipeline, east/north are in 100 metres, the frame in centimetres
+        x = (east - min_east * 100) * 100
+        y = (north - min_north * 100) * 100
+        projected = np.vstack((x, y)).T
+        if not np.array_equal(projected[0], projected[-1]):
+            projected = np.vstack((projected, projected[:1]))
+        return projected
+
+    def classify_extent(self, min_x, min_y, max_x, max_y):
+        """Classify a rectangular extent, e.g. a tile, against the boundary
+
+        Args:
+            min_x (float): west edge in the relative frame
+            min_y (float): south edge in the relative frame
+            max_x (float): east edge in the relative frame
+            max_y (float): north edge in the relative frame
+
+        Returns:
+            TileBoundaryState: whether the extent is fully outside, fully inside or straddling the boundary
+        """
+        extent = box(min_x, min_y, max_x, max_y)
+        if not self.polygon.intersects(extent):
+            return TileBoundaryState.OUTSIDE
+        if self.polygon.contains(extent):
+            return TileBoundaryState.INSIDE
+        return TileBoundaryState.STRADDLING
+
+    def contains(self, point_x, point_y):
+        """Vectorized point in polygon test with the even-odd rule.
+
+        The points are sorted by y once, so each edge only tests the points within its
+        y range instead of every point of the map.
+
+        Args:
+            point_x (np.array): x in the relative frame
+            point_y (np.array): y in the relative frame
+
+        Returns:
+            np.array: boolean mask of the points inside the boundary
+        """
+        point_x = np.asarray(point_x, dtype=np.float64)
+        point_y = np.asarray(point_y, dtype=np.float64)
+        order = np.argsort(point_y, kind="stable")
+        sorted_x = point_x[order]
+        sorted_y = point_y[order]
+
+        inside = np.zeros(point_x.shape[0], dtype=bool)
+        for x1, y1, x2, y2 in self._edges:
+            if y1 == y2:
+                continue
+            # half open range so a vertex shared by two edges is only counted once
+            start, end = np.searchsorted(
+                sorted_y, [min(y1, y2), max(y1, y2)], side="left")
+            if start == end:
+                continue
+            x_cross = x1 + (sorted_y[start:end] - y1) * (x2 - x1) / (y2 - y1)
+            inside[start:end] ^= sorted_x[start:end] < x_cross
+
+        mask = np.empty_like(inside)
+        mask[order] = inside
+        return mask
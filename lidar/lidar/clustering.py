@@ -0,0 +1,740 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import time
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import ConvexHull, QhullError
+from sklearn.cluster import DBSCAN
+
+SKLEARN_BACKEND = "sklearn"
+TILED_BACKEND = "tiled"
+GRID_BACKEND = "grid"
+DBSCAN_BACKENDS = (SKLEARN_BACKEND, TILED_BACKEND, GRID_BACKEND)
+# upper bound of the candidate pairs compared at once by the grid backend
+MAX_CANDIDATE_PAIRS = 20000000
+
+
+def dbscan_labels(point_x, point_y, eps, min_samples, backend=GRID_BACKEND, tile_size=50000, workers=0,
+                  start_method=None):
+    """Cluster 2d points with DBSCAN
+
+    Every backend gives the labels sklearn.cluster.DBSCAN gives on the whole point set.
+
+    Args:
+        point_x (np.array): x of the points
+        point_y (np.array): y of the points
+        eps (float): the neighbourhood radius
+        min_samples (int): the number of points, itself included, in the neighbourhood of a core point
+        backend (str, optional): "sklearn" for one global DBSCAN, "grid" for the grid hashed DBSCAN,
+            "tiled" to cluster tiles of the plane in parallel and merge them. Defaults to "grid".
+        tile_size (float, optional): side of the tiles of the tiled backend. Defaults to 50000.
+        workers (int, optional): number of processes, 0 for one per cpu. Defaults to 0.
+        start_method (str, optional): how the processes of the tiled backend are started, e.g. "spawn",
+            fork is not safe from the Qt GUI threads. Defaults to the platform's default.
+
+    Raises:
+        ValueError: unknown backend
+
+    Returns:
+        np.array: cluster label of every point, -1 for noise
+    """
+    if backend == SKLEARN_BACKEND:
+        return DBSCAN(eps=eps, min_samples=min_samples, n_jobs=-1 if workers == 0 else workers).fit(
+            np.vstack((point_x, point_y)).T).labels_
+    if backend == TILED_BACKEND:
+        return tiled_dbscan_labels(point_x, point_y, eps, min_samples, tile_size, workers, start_method)
+    if backend == GRID_BACKEND:
+        return grid_dbscan_labels(point_x, point_y, eps, min_samples)
+    raise ValueError("Unknown DBSCAN backend %s, expected one of %s" %
+                     (backend, ", ".join(DBSCAN_BACKENDS)))
+
+
+def tiled_dbscan_labels(point_x, point_y, eps, min_samples, tile_size, workers=0, start_method=None):
+    """DBSCAN over square tiles of the plane, merged into the labels of a global DBSCAN.
+
+    Each tile is clustered with the points up to 2 eps around it. The neighbourhood of every
+    point up to eps around the tile is then complete, so the core points and the core to core
+    links seen by the tile are exact, and every link of a point owned by the tile is seen by it.
+    The clusters of the tiles are merged by union of the clusters sharing a core point, then
+    numbered by their lowest core point like sklearn numbers them while expanding in index order.
+    A border point takes the lowest label among its core neighbours, the first cluster sklearn
+    would have reached it from.
+
+    Args:
+        point_x (np.array): x of the points
+        point_y (np.array): y of the points
+        eps (float): the neighbourhood radius
+        min_samples (int): the number of points, itself included, in the neighbourhood of a core point
+        tile_size (float): side of the tiles, at least 2 eps
+        workers (int, optional): number of processes, 0 for one per cpu, 1 to stay in this process. Defaults to 0.
+        start_method (str, optional): how the processes are started, e.g. "spawn". Defaults to the platform's default.
+
+    Raises:
+        ValueError: the tiles are smaller than the halo
+
+    Returns:
+        np.array: cluster label of every point, -1 for noise
+    """
+    if tile_size < 2 * eps:
+        raise ValueError("The cluster tiles (%s) must be at least 2 eps (%s) wide" %
+                         (tile_size, 2 * eps))
+    points = np.vstack((point_x, point_y)).T.astype(np.float64)
+    labels = np.full(points.shape[0], -1, dtype=np.int64)
+    if points.shape[0] == 0:
+        return labels
+
+    tiles = list(_split_into_tiles(points, eps, tile_size))
+    if workers == 1 or len(tiles) <= 1:
+        results = [_cluster_tile(*tile, eps, min_samples) for tile in tiles]
+    else:
+        context = None if start_method is None else multiprocessing.get_context(start_method)
+        with ProcessPoolExecutor(max_workers=workers if workers > 0 else None, mp_context=context) as executor:
+            results = list(executor.map(
+                _cluster_tile, *zip(*tiles), [eps] * len(tiles), [min_samples] * len(tiles)))
+
+    # give the clusters of all tiles one numbering
+    core_points, core_clusters, border_points, border_clusters = [], [], [], []
+    cluster_count = 0
+    for tile_core_points, tile_core_clusters, tile_border_points, tile_border_clusters, tile_cluster_count in results:
+        core_points.append(tile_core_points)
+        core_clusters.append(tile_core_clusters + cluster_count)
+        border_points.append(tile_border_points)
+        border_clusters.append(tile_border_clusters + cluster_count)
+        cluster_count += tile_cluster_count
+    if cluster_count == 0:
+        return labels
+    core_points = np.concatenate(core_points)
+    core_clusters = np.concatenate(core_clusters)
+    border_points = np.concatenate(border_points)
+    border_clusters = np.concatenate(border_clusters)
+
+    # union the tile clusters that share a core point
+    order = np.argsort(core_points, kind="stable")
+    core_points, core_clusters = core_points[order], core_clusters[order]
+    shared = core_points[1:] == core_points[:-1]
+    links = coo_matrix(
+        (np.ones(np.count_nonzero(shared), dtype=np.int8),
+         (core_clusters[:-1][shared], core_clusters[1:][shared])),
+        shape=(cluster_count, cluster_count))
+    _, merged = connected_components(links, directed=False)
+
+    # number the merged clusters by their lowest core point
+    lowest_core = np.full(merged.max() + 1, points.shape[0], dtype=np.int64)
+    np.minimum.at(lowest_core, merged[core_clusters], core_points)
+    numbering = np.empty_like(lowest_core)
+    numbering[np.argsort(lowest_core, kind="stable")] = np.arange(lowest_core.shape[0])
+    labels[core_points] = numbering[merged[core_clusters]]
+
+    border_labels = np.full(points.shape[0], np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(border_labels, border_points,
+                  numbering[merged[border_clusters]])
+    has_core_neighbour = border_labels != np.iinfo(np.int64).max
+    labels[has_core_neighbour] = border_labels[has_core_neighbour]
+    return labels
+
+
+def _split_into_tiles(points, eps, tile_size):
+    """Cut the points into tiles with a 2 eps halo
+
+    Yields:
+        np.array, np.array, np.array, np.array: global index of the points within 2 eps of the tile,
+        their coordinates, whether they are within eps of the tile, whether the tile owns them
+    """
+    origin = points.min(axis=0)
+    tile_index = np.floor((points - origin) / tile_size).astype(np.int64)
+    tile_rows = tile_index[:, 1].max() + 1
+    tile_key = tile_index[:, 0] * tile_rows + tile_index[:, 1]
+    order = np.argsort(tile_key, kind="stable")
+    sorted_key = tile_key[order]
+
+    for key in np.unique(sorted_key):
+        tile_x, tile_y = divmod(int(key), int(tile_rows))
+        # the 2 eps halo never reaches past the neighbouring tiles
+        neighbours = [
+            neighbour_x * tile_rows + neighbour_y
+            for neighbour_x in range(max(tile_x - 1, 0), tile_x + 2)
+            for neighbour_y in range(max(tile_y - 1, 0), min(tile_y + 2, tile_rows))
+        ]
+        candidates = np.concatenate([
+            order[slice(*np.searchsorted(sorted_key, [neighbour, neighbour + 1]))]
+            for neighbour in neighbours
+        ])
+        candidates.sort()
+        low = origin + np.array([tile_x, tile_y]) * tile_size
+        high = low + tile_size
+        candidate_points = points[candidates]
+        in_box = np.all((candidate_points >= low - 2 * eps) &
+                        (candidate_points < high + 2 * eps), axis=1)
+        box_index = candidates[in_box]
+        box_points = candidate_points[in_box]
+        inner = np.all((box_points >= low - eps) &
+                       (box_points < high + eps), axis=1)
+        owned = tile_key[box_index] == key
+        yield box_index, box_points, inner, owned
+
+
+def _cluster_tile(box_index, box_points, inner, owned, eps, min_samples):
+    """Cluster the core points of one tile and find the clusters next to its border points
+
+    Returns:
+        np.array, np.array, np.array, np.array, int: global index and cluster of the core points
+        within eps of the tile, global index of the owned border points and the cluster of each
+        of their core neighbours, the number of clusters
+    """
+    first, second, _ = grid_neighbour_pairs(box_points[:, 0], box_points[:, 1], eps)
+    size = box_points.shape[0]
+    neighbour_count = 1 + np.bincount(first, minlength=size) + np.bincount(second, minlength=size)
+    # the whole neighbourhood of the inner points is in the box, so their core flag is exact
+    is_core = inner & (neighbour_count >= min_samples)
+    core_index = np.flatnonzero(is_core)
+    if core_index.shape[0] == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty, empty, 0
+
+    core_link = is_core[first] & is_core[second]
+    core_position = np.full(size, -1, dtype=np.int64)
+    core_position[core_index] = np.arange(core_index.shape[0])
+    links = coo_matrix(
+        (np.ones(np.count_nonzero(core_link), dtype=np.int8),
+         (core_position[first[core_link]], core_position[second[core_link]])),
+        shape=(core_index.shape[0], core_index.shape[0]))
+    cluster_count, core_clusters = connected_components(links, directed=False)
+
+    border_points, border_clusters = [], []
+    for border, core in ((first, second), (second, first)):
+        link = owned[border] & ~is_core[border] & is_core[core]
+        border_points.append(box_index[border[link]])
+        border_clusters.append(core_clusters[core_position[core[link]]].astype(np.int64))
+    return (
+        box_index[core_index],
+        core_clusters.astype(np.int64),
+        np.concatenate(border_points),
+        np.concatenate(border_clusters),
+        cluster_count,
+    )
+
+
+class GridNeighbourIndex:
+    """Fixed radius neighbour search of 2d points hashed into a grid of radius sized cells.
+
+    The neighbours of a point within the radius can only be in its own cell and the 8 cells
+    around it. The points are sorted by cell once so every cell is a contiguous run, and each
+    pair of neighbouring cells is compared once, in vectorized batches. Distances are compared
+    squared, which is exact for the integer centimetre coordinates of the pipeline.
+    """
+
+    # the own cell and half of the cells around it, the other half sees the pairs from the other side
+    HALF_NEIGHBOURHOOD = ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1))
+
+    def __init__(self, point_x, point_y, radius):
+        self._radius = radius
+        point_x = np.asarray(point_x, dtype=np.float64)
+        point_y = np.asarray(point_y, dtype=np.float64)
+        cell_x = np.floor(point_x / radius).astype(np.int64)
+        cell_y = np.floor(point_y / radius).astype(np.int64)
+        if cell_x.shape[0] > 0:
+            # a free row around the cells, so no neighbour key wraps into the next column
+            cell_x -= cell_x.min()
+            cell_y -= cell_y.min() - 1
+        width = int(cell_y.max()) + 2 if cell_y.shape[0] > 0 else 1
+        cell_key = cell_x * width + cell_y
+
+        self._order = np.argsort(cell_key, kind="stable")
+        self._x = point_x[self._order]
+        self._y = point_y[self._order]
+        cells, cell_start, cell_count = np.unique(
+            cell_key[self._order], return_index=True, return_counts=True)
+        # positions fit in 32 bits for any realistic map, half the memory traffic of the pairs
+        position_type = np.int32 if len(self) < np.iinfo(np.int32).max else np.int64
+        self._cell_start = cell_start.astype(position_type)
+        self._cell_count = cell_count.astype(position_type)
+        self._neighbour_cells = []
+        for dx, dy in GridNeighbourIndex.HALF_NEIGHBOURHOOD:
+            neighbour_keys = cells + dx * width + dy
+            neighbour = np.minimum(np.searchsorted(cells, neighbour_keys), max(cells.shape[0] - 1, 0))
+            self._neighbour_cells.append(
+                np.where(cells[neighbour] == neighbour_keys, neighbour, -1) if cells.shape[0] > 0 else neighbour)
+
+    @property
+    def radius(self):
+        return self._radius
+
+    @property
+    def order(self):
+        """the point index at every position of the cell sorted order"""
+        return self._order
+
+    def __len__(self):
+        return self._order.shape[0]
+
+    def pairs(self, max_candidates=MAX_CANDIDATE_PAIRS):
+        """Walk every pair of distinct points within the radius of each other, each pair once
+
+        Args:
+            max_candidates (int, optional): the most candidate pairs compared at once. Defaults to MAX_CANDIDATE_PAIRS.
+
+        Yields:
+            np.array, np.array, np.array: point index of both ends of the pairs, and their squared distances
+        """
+        candidates = np.zeros(self._cell_count.shape[0], dtype=np.int64)
+        for neighbour in self._neighbour_cells:
+            candidates += self._cell_count.astype(np.int64) * np.where(neighbour >= 0, self._cell_count[neighbour], 0)
+        candidates = np.cumsum(candidates)
+        batch_start = 0
+        while batch_start < candidates.shape[0]:
+            compared = candidates[batch_start - 1] if batch_start > 0 else 0
+            batch_end = max(int(np.searchsorted(
+                candidates, compared + max_candidates, side="right")), batch_start + 1)
+            yield self.__cell_pairs(np.arange(batch_start, batch_end))
+            batch_start = batch_end
+
+    def __cell_pairs(self, cells):
+        first_parts, second_parts, distance_parts = [], [], []
+        for offset, neighbour in enumerate(self._neighbour_cells):
+            cell = cells[neighbour[cells] >= 0]
+            other = neighbour[cell]
+            # every point of the cell against the run of the other cell
+            other_count = np.repeat(self._cell_count[other], self._cell_count[cell])
+            first = np.repeat(_expand_runs(self._cell_start[cell], self._cell_count[cell]), other_count)
+            second = _expand_runs(np.repeat(self._cell_start[other], self._cell_count[cell]), other_count)
+            if offset == 0:
+                # a cell against itself, keep every pair once
+                distinct = second > first
+                first, second = first[distinct], second[distinct]
+            squared_distance = self._x[first]
+            squared_distance -= self._x[second]
+            squared_distance *= squared_distance
+            delta_y = self._y[first]
+            delta_y -= self._y[second]
+            delta_y *= delta_y
+            squared_distance += delta_y
+            within = squared_distance <= self._radius ** 2
+            first_parts.append(first[within])
+            second_parts.append(second[within])
+            distance_parts.append(squared_distance[within])
+        return (self._order[np.concatenate(first_parts)],
+                self._order[np.concatenate(second_parts)],
+                np.concatenate(distance_parts))
+
+
+def _expand_runs(start, count):
+    """concatenate the ranges start[i]..start[i]+count[i]"""
+    total = count.sum()
+    return np.repeat(start - (np.cumsum(count) - count), count) + np.arange(total, dtype=start.dtype)
+
+
+def grid_neighbour_pairs(point_x, point_y, radius):
+    """All pairs of distinct points within a radius of each other, each pair once
+
+    Args:
+        point_x (np.array): x of the points
+        point_y (np.array): y of the points
+        radius (float): the neighbourhood radius
+
+    Returns:
+        np.array, np.array, np.array: point index of both ends of the pairs, and their squared distances
+    """
+    parts = list(GridNeighbourIndex(point_x, point_y, radius).pairs())
+    index_type = np.int32 if len(point_x) < np.iinfo(np.int32).max else np.int64
+    if len(parts) == 0:
+        return np.array([], dtype=index_type), np.array([], dtype=index_type), np.array([])
+    return tuple(np.concatenate([part[i] for part in parts]).astype(
+        index_type if i < 2 else np.float64) for i in range(3))
+
+
+def grid_dbscan_labels(point_x, point_y, eps, min_samples):
+    """DBSCAN on a grid of eps sized cells, with the labels of sklearn.cluster.DBSCAN
+
+    Args:
+        point_x (np.array): x of the points
+        point_y (np.array): y of the points
+        eps (float): the neighbourhood radius
+        min_samples (int): the number of points, itself included, in the neighbourhood of a core point
+
+    Returns:
+        np.array: cluster label of every point, -1 for noise
+    """
+    first, second, _ = grid_neighbour_pairs(point_x, point_y, eps)
+    return labels_from_neighbour_pairs(len(point_x), first, second, min_samples)
+
+
+def labels_from_neighbour_pairs(size, first, second, min_samples):
+    """DBSCAN labels from the pairs of neighbouring points
+
+    The core points are linked into clusters, numbered by their lowest core point like sklearn
+    numbers them while expanding in index order, and a border point joins the lowest labelled
+    cluster around it, the first one sklearn would have reached it from.
+
+    Args:
+        size (int): the number of points
+        first (np.array): point index of one end of the pairs
+        second (np.array): point index of the other end, every pair of distinct neighbours given once
+        min_samples (int): the number of points, itself included, in the neighbourhood of a core point
+
+    Returns:
+        np.array: cluster label of every point, -1 for noise
+    """
+    neighbour_count = 1 + np.bincount(first, minlength=size) + np.bincount(second, minlength=size)
+    is_core = neighbour_count >= min_samples
+    if not np.any(is_core):
+        return np.full(size, -1, dtype=np.int64)
+
+    core_link = is_core[first] & is_core[second]
+    _, component = connected_components(
+        coo_matrix((np.ones(np.count_nonzero(core_link), dtype=np.int8),
+                    (first[core_link], second[core_link])), shape=(size, size)),
+        directed=False)
+    labels = _number_core_clusters(is_core, component)
+    _label_border_points(labels, is_core, first, second)
+    return labels
+
+
+def _number_core_clusters(is_core, component):
+    """labels of the core points, the connected components numbered by their lowest core point"""
+    size = is_core.shape[0]
+    labels = np.full(size, -1, dtype=np.int64)
+    core_point = np.flatnonzero(is_core)
+    lowest_core = np.full(size, size, dtype=np.int64)
+    np.minimum.at(lowest_core, component[core_point], core_point)
+    clusters = np.flatnonzero(lowest_core < size)
+    numbering = np.full(size, -1, dtype=np.int64)
+    numbering[clusters[np.argsort(lowest_core[clusters], kind="stable")]] = np.arange(clusters.shape[0])
+    labels[core_point] = numbering[component[core_point]]
+    return labels
+
+
+def _label_border_points(labels, is_core, first, second):
+    """give every border point the lowest label among its core neighbours, in place"""
+    border_label = np.full(labels.shape[0], np.iinfo(np.int64).max, dtype=np.int64)
+    for border, core in ((first, second), (second, first)):
+        link = ~is_core[border] & is_core[core]
+        np.minimum.at(border_label, border[link], labels[core[link]])
+    is_border = border_label != np.iinfo(np.int64).max
+    labels[is_border] = border_label[is_border]
+
+
+class ClusterIndex:
+    """The points grouped by cluster label, built once with a single stable argsort.
+
+    The points are stored sorted by label so every cluster is a contiguous run, and a cluster
+    is handed out as a slice of that run, a view that does not copy anything. Noise points
+    (label -1) are left out. Within a cluster the points keep their original order.
+    """
+
+    def __init__(self, labels, point_x, point_y):
+        labels = np.asarray(labels)
+        clustered = np.flatnonzero(labels >= 0)
+        self._order = clustered[np.argsort(labels[clustered], kind="stable")]
+        self._sizes = np.bincount(labels[clustered], minlength=labels.max() + 1 if labels.shape[0] > 0 else 0)
+        self._offsets = np.concatenate(([0], np.cumsum(self._sizes)))
+        self._points = np.empty((self._order.shape[0], 2), dtype=np.float64)
+        self._points[:, 0] = np.asarray(point_x)[self._order]
+        self._points[:, 1] = np.asarray(point_y)[self._order]
+        self._bounding_boxes = None
+
+    def __len__(self):
+        return self._sizes.shape[0]
+
+    def __getitem__(self, cluster):
+        """The points of a cluster
+
+        Args:
+            cluster (int): the cluster label
+
+        Returns:
+            np.array: n x 2 view of the x, y of the cluster's points
+        """
+        return self._points[self._offsets[cluster]:self._offsets[cluster + 1]]
+
+    def __iter__(self):
+        for cluster in range(len(self)):
+            yield self[cluster]
+
+    @property
+    def sizes(self):
+        """the number of points in every cluster"""
+        return self._sizes
+
+    @property
+    def offsets(self):
+        """where every cluster starts in the sorted points, with the total at the end"""
+        return self._offsets
+
+    @property
+    def points(self):
+        """the x, y of all clustered points, sorted by cluster"""
+        return self._points
+
+    @property
+    def bounding_boxes(self):
+        """(min_x, min_y, max_x, max_y) of every cluster, nan for empty labels"""
+        if self._bounding_boxes is None:
+            self._bounding_boxes = np.full((len(self), 4), np.nan)
+            filled = self._sizes > 0
+            if np.any(filled):
+                starts = self._offsets[:-1][filled]
+                self._bounding_boxes[filled, :2] = np.minimum.reduceat(self._points, starts, axis=0)
+                self._bounding_boxes[filled, 2:] = np.maximum.reduceat(self._points, starts, axis=0)
+        return self._bounding_boxes
+
+    def indices(self, cluster):
+        """Index of the points of a cluster in the arrays the index was built from
+
+        Args:
+            cluster (int): the cluster label
+
+        Returns:
+            np.array: view of the point indices
+        """
+        return self._order[self._offsets[cluster]:self._offsets[cluster + 1]]
+
+
+class SweepResult:
+    """Clusters found with one eps and min_samples setting of a DBSCAN sweep"""
+
+    def __init__(self, eps, min_samples):
+        self._eps = eps
+        self._min_samples = min_samples
+        self.labels = None
+        self.cluster_count = 0
+        self.noise_fraction = 0.0
+        self.polygon_areas = np.array([])
+        self.labels_time = 0.0
+
+    @property
+    def eps(self):
+        return self._eps
+
+    @property
+    def min_samples(self):
+        return self._min_samples
+
+    def area_summary(self):
+        """count, total, mean, median and largest area of the cluster outlines, 0 for clusters too thin to enclose an area"""
+        areas = self.polygon_areas[self.polygon_areas > 0]
+        if areas.shape[0] == 0:
+            return {"polygons": 0, "total": 0.0, "mean": 0.0, "median": 0.0, "max": 0.0}
+        return {
+            "polygons": int(areas.shape[0]),
+            "total": float(areas.sum()),
+            "mean": float(areas.mean()),
+            "median": float(np.median(areas)),
+            "max": float(areas.max()),
+        }
+
+    def to_dict(self):
+        return {
+            "eps": self._eps,
+            "min_samples": self._min_samples,
+            "cluster_count": self.cluster_count,
+            "noise_fraction": self.noise_fraction,
+            "area": self.area_summary(),
+            "labels_time_s": self.labels_time,
+        }
+
+
+class DBSCANSweep:
+    """DBSCAN labels of the same points for any eps up to max_eps and any min_samples,
+    from a neighbour graph built once.
+
+    The pairs of points within max_eps of each other are found once on the grid index and
+    sorted by their squared distance, so the neighbour graph of a smaller eps is a prefix of
+    the pairs. A point is a core point of an eps when its core distance, the distance to its
+    min_samples - 1 th nearest neighbour, is within eps, and two core points are linked when
+    their mutual reachability distance, the largest of their distance and both core distances,
+    is within eps. Going through the eps of a sweep from the smallest, the clusters of an eps
+    are the clusters of the previous eps linked by the pairs whose mutual reachability distance
+    falls in between, so every pair is linked once per min_samples instead of once per setting.
+    The labels are the labels of sklearn.cluster.DBSCAN, as for the grid backend.
+    """
+
+    def __init__(self, point_x, point_y, max_eps, key=None):
+        """Build the neighbour graph
+
+        Args:
+            point_x (np.array): x of the points
+            point_y (np.array): y of the points
+            max_eps (float): the largest eps of the sweep
+            key (str, optional): identifies the points, e.g. their artifact hash. Defaults to None.
+        """
+        self._point_x = np.asarray(point_x)
+        self._point_y = np.asarray(point_y)
+        self._max_eps = max_eps
+        self._key = key
+        first, second, squared_distance = grid_neighbour_pairs(point_x, point_y, max_eps)
+        # the order of pairs at the same distance does not matter, they are always cut together
+        order = np.argsort(squared_distance)
+        self._first = first[order]
+        self._second = second[order]
+        self._squared_distance = squared_distance[order]
+        # the distances of every point to its neighbours, nearest first, for the core distances.
+        # Sorting the ends and positions packed into one integer is much faster than a stable argsort
+        ends = np.column_stack((self._first, self._second)).ravel()
+        positions = np.sort(ends.astype(np.int64) * ends.shape[0] + np.arange(ends.shape[0])) % max(ends.shape[0], 1)
+        self._neighbour_distances = self._squared_distance[positions // 2]
+        self._neighbour_start = np.concatenate(([0], np.cumsum(np.bincount(ends, minlength=len(self)))))
+
+    @property
+    def max_eps(self):
+        return self._max_eps
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def pair_count(self):
+        """the number of neighbouring pairs within max_eps"""
+        return self._first.shape[0]
+
+    def __len__(self):
+        return self._point_x.shape[0]
+
+    def covers(self, eps, key=None):
+        """Whether the labels of an eps can be derived from this sweep
+
+        Args:
+            eps (float): the neighbourhood radius
+            key (str, optional): the key of the points to cluster, not checked if None. Defaults to None.
+
+        Returns:
+            bool: eps is within max_eps and the points are the same
+        """
+        return eps <= self._max_eps and (key is None or key == self._key)
+
+    def core_distances(self, min_samples):
+        """Squared distance of every point to its min_samples - 1 th nearest neighbour
+
+        Args:
+            min_samples (int): the number of points, itself included, in the neighbourhood of a core point
+
+        Returns:
+            np.array: the squared core distances, inf for points that are no core point within max_eps
+        """
+        if min_samples <= 1:
+            return np.zeros(len(self))
+        core_distances = np.full(len(self), np.inf)
+        enough = np.diff(self._neighbour_start) >= min_samples - 1
+        core_distances[enough] = self._neighbour_distances[
+            self._neighbour_start[:-1][enough] + min_samples - 2]
+        return core_distances
+
+    def labels(self, eps, min_samples):
+        """DBSCAN labels of one setting
+
+        Args:
+            eps (float): the neighbourhood radius, at most max_eps
+            min_samples (int): the number of points, itself included, in the neighbourhood of a core point
+
+        Raises:
+            ValueError: eps is larger than the radius of the neighbour graph
+
+        Returns:
+            np.array: cluster label of every point, -1 for noise
+        """
+        if eps > self._max_eps:
+            raise ValueError("eps %s is larger than the %s the neighbour graph was built with" %
+                             (eps, self._max_eps))
+        # the same squared distance comparison as the grid index, so the labels are identical
+        count = np.searchsorted(self._squared_distance, eps ** 2, side="right")
+        return labels_from_neighbour_pairs(
+            len(self), self._first[:count], self._second[:count], min_samples)
+
+    def __iter_labels(self, eps_values, min_samples):
+        """the eps and the labels of every eps of a min_samples, from the smallest eps"""
+        eps_values = sorted(set(eps_values))
+        if eps_values[-1] > self._max_eps:
+            raise ValueError("eps %s is larger than the %s the neighbour graph was built with" %
+                             (eps_values[-1], self._max_eps))
+        # the same squared distance comparison as the grid index, so the labels are identical
+        squared_eps = np.array(eps_values, dtype=np.float64) ** 2
+        core_distances = self.core_distances(min_samples)
+        reachability = np.maximum(self._squared_distance, np.maximum(
+            core_distances[self._first], core_distances[self._second]))
+        # the pairs linking core points of every eps and not of the eps before
+        step = np.searchsorted(squared_eps, reachability).astype(np.int16)
+        order = np.argsort(step, kind="stable")
+        step_start = np.searchsorted(step[order], np.arange(len(eps_values) + 1))
+        component = np.arange(len(self))
+        for index, eps in enumerate(eps_values):
+            pairs = order[step_start[index]:step_start[index + 1]]
+            first, second = component[self._first[pairs]], component[self._second[pairs]]
+            linking = first != second
+            if np.any(linking):
+                _, merged = connected_components(
+                    coo_matrix((np.ones(np.count_nonzero(linking), dtype=np.int8),
+                                (first[linking], second[linking])), shape=(len(self), len(self))),
+                    directed=False)
+                component = merged[component]
+            is_core = core_distances <= squared_eps[index]
+            if not np.any(is_core):
+                yield eps, np.full(len(self), -1, dtype=np.int64)
+                continue
+            labels = _number_core_clusters(is_core, component)
+            count = np.searchsorted(self._squared_distance, squared_eps[index], side="right")
+            _label_border_points(labels, is_core, self._first[:count], self._second[:count])
+            yield eps, labels
+
+    def sweep(self, eps_values, min_samples_values, keep_labels=False):
+        """Cluster every combination of eps and min_samples
+
+        The polygon areas are the areas of the convex hulls of the clusters, the upper bound of
+        the concave hulls of the pipeline, which are too slow to build for every setting.
+
+        Args:
+            eps_values (iterable): the eps of the grid, each at most max_eps
+            min_samples_values (iterable): the min_samples of the grid
+            keep_labels (bool, optional): keep the labels of every setting. Defaults to False.
+
+        Returns:
+            list: a SweepResult per setting, eps major
+        """
+        eps_values = list(eps_values)
+        results = {}
+        for min_samples in min_samples_values:
+            start_time = time.perf_counter()
+            for eps, labels in self.__iter_labels(eps_values, min_samples):
+                result = SweepResult(eps, min_samples)
+                result.labels_time = time.perf_counter() - start_time
+                result.cluster_count = int(labels.max()) + 1 if labels.shape[0] > 0 else 0
+                result.noise_fraction = float(np.count_nonzero(labels < 0)) / max(len(self), 1)
+                result.polygon_areas = self.__hull_areas(labels)
+                if keep_labels:
+                    result.labels = labels
+                results[(eps, min_samples)] = result
+                start_time = time.perf_counter()
+        return [results[(eps, min_samples)] for eps in eps_values for min_samples in min_samples_values]
+
+    def __hull_areas(self, labels):
+        """convex hull area of every cluster"""
+        areas = np.zeros(int(labels.max()) + 1 if labels.shape[0] > 0 else 0)
+        for cluster, points in enumerate(ClusterIndex(labels, self._point_x, self._point_y)):
+            if points.shape[0] < 3:
+                continue
+            try:
+                # the volume of a 2d hull is its area
+                areas[cluster] = ConvexHull(points).volume
+            except QhullError:
+                # all the points on a line
+                areas[cluster] = 0.0
+        return areas
+
+
+def sweep_summary(results):
+    """human readable table of a sweep
+
+    Args:
+        results (list): SweepResult of every setting
+
+    Returns:
+        str: one line per setting
+    """
+    lines = ["%10s %12s %9s %8s %10s %14s %14s" % (
+        "eps", "min_samples", "clusters", "noise", "polygons", "mean area", "total area")]
+    for result in results:
+        area = result.area_summary()
+        lines.append("%10g %12d %9d %7.1f%% %10d %14.0f %14.0f" % (
+            result.eps, result.min_samples, result.cluster_count, 100 * result.noise_fraction,
+            area["polygons"], area["mean"], area["total"]))
+    return "\n".join(lines)
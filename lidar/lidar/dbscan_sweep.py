@@ -0,0 +1,45 @@
+import argparse
+import json
+import os
+import time
+from processing import ProcessingPipeline
+from clustering import sweep_summary
+from config import configure
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="TREESAP DBSCAN parameter sweep",
+        description="Cluster the campus points with every combination of eps and min_sample, "
+        "the neighbour graph is built once for the largest eps",
+    )
+    parser.add_argument("--eps", type=float, nargs="+", default=[200, 300, 400, 500],
+                        help="the eps to try, in cm")
+    parser.add_argument("--min-sample", type=int, nargs="+", default=[5, 10, 20],
+                        help="the min_sample to try")
+    parser.add_argument("--test", action="store_true",
+                        help="sweep the test tile instead of the whole campus")
+    args = parser.parse_args()
+
+    pipeline = ProcessingPipeline(notebook=True)
+    pipeline.pre_process_las_files(configure["Test" if args.test else "Download"]["dest_dir_path"])
+    pipeline.collect_points_from_map()
+    results = pipeline.sweep_dbscan_parameters(args.eps, args.min_sample)
+    print(sweep_summary(results))
+
+    # the sweep is kept next to the run reports
+    report_dir = pipeline.settings.paths.run_report_dir
+    os.makedirs(report_dir, exist_ok=True)
+    file_path = os.path.join(report_dir, "dbscan_sweep_%s.json" % time.strftime("%Y%m%dT%H%M%S"))
+    with open(file_path, "w") as out_file:
+        json.dump({
+            "points": int(pipeline.whole_campus_x.shape[0]),
+            "points_key": pipeline.points_key,
+            "results": [result.to_dict() for result in results],
+        }, out_file, indent=4)
+    print("sweep written to %s" % file_path)
+    pipeline.write_run_report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import json
+
+HEADER = b'{"type": "FeatureCollection", "features": [\n'
+FOOTER = b"\n]}\n"
+SEPARATOR = b",\n"
+
+
+class GeoJSONStreamWriter:
+    """Write a GeoJSON FeatureCollection one feature at a time.
+
+    The closing brackets are written after every feature and overwritten by the next one,
+    so whatever has been written so far is a valid FeatureCollection on disk, even if the
+    process dies halfway. Coordinates are rounded to a fixed number of decimals.
+    """
+
+    def __init__(self, file_path, precision=6):
+        self._file_path = file_path
+        self._precision = precision
+        self._count = 0
+        self._file = open(file_path, "wb")
+        self._file.write(HEADER)
+        self._end = self._file.tell()
+        self.__write_footer()
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    @property
+    def count(self):
+        """the number of features written"""
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, feature):
+        """Append a feature
+
+        Args:
+            feature (dict): geojson feature
+        """
+        feature = dict(feature)
+        feature["geometry"] = dict(
+            feature["geometry"], coordinates=self.__round(feature["geometry"]["coordinates"]))
+        text = json.dumps(feature, separators=(",", ":")).encode("utf-8")
+        self._file.seek(self._end)
+        if self._count > 0:
+            self._file.write(SEPARATOR)
+        self._file.write(text)
+        self._end = self._file.tell()
+        self._count += 1
+        self.__write_footer()
+
+    def write_all(self, features):
+        """Append every feature of an iterable, e.g. a generator
+
+        Args:
+            features (iterable): geojson features
+
+        Returns:
+            int: the number of features written so far
+        """
+        for feature in features:
+            self.write(feature)
+        return self._count
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __write_footer(self):
+        self._file.write(FOOTER)
+        self._file.truncate()
+        self._file.flush()
+
+    def __round(self, coordinates):
+        if isinstance(coordinates, (list, tuple)):
+            return [self.__round(coordinate) for coordinate in coordinates]
+        return round(coordinates, self._precision)
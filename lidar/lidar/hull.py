@@ -0,0 +1,215 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.ndimage import binary_erosion, binary_fill_holes
+from scipy.spatial import Delaunay
+from shapely.geometry import MultiPoint, Point
+from shapely.prepared import prep
+from shapely.ops import polygonize, unary_union
+
+# width in cells of the band of boundary candidates kept along the outline
+BOUNDARY_BAND_CELLS = 2
+# number of dropped interior points checked to be inside the reduced hull
+INTERIOR_PROBES = 64
+
+
+def concave_hull(points, alpha=None):
+    """Concave hull of 2d points from a single Delaunay triangulation.
+
+    The shape is the union of the triangles whose circumradius is below 1 / alpha, the same
+    shape alphashape builds. Without an alpha, the smallest radius that still keeps every
+    point and keeps the triangles connected into one polygon is picked, which is what
+    alphashape's optimizer searches for, but found by bisection over the sorted circumradii
+    of the one triangulation instead of triangulating again for every alpha tried.
+
+    Args:
+        points (np.array): n x 2 points
+        alpha (float, optional): the alpha parameter, 0 for the convex hull. Defaults to None, the tightest single polygon.
+
+    Returns:
+        shapely geometry: the hull, a Polygon for any cluster that is not degenerate
+    """
+    points = _unique_points(np.asarray(points, dtype=np.float64))
+    if points.shape[0] < 4 or (alpha is not None and alpha <= 0):
+        return MultiPoint(points).convex_hull
+    if np.linalg.matrix_rank(points - points[0]) < 2:
+        # every point on one line, there is nothing to triangulate
+        return MultiPoint(points).convex_hull
+    triangulation = Delaunay(points)
+
+    simplices = triangulation.simplices
+    radii = circumradii(points, simplices)
+    if alpha is not None:
+        keep = radii < 1.0 / alpha
+    else:
+        keep = np.zeros(simplices.shape[0], dtype=bool)
+        keep[np.argsort(radii, kind="stable")[:_tightest_triangle_count(
+            simplices, triangulation.neighbors, radii)]] = True
+    if not np.any(keep):
+        return MultiPoint(points).convex_hull
+    return triangles_outline(points, simplices, triangulation.neighbors, keep)
+
+
+def _unique_points(points):
+    """the distinct points, a lexsort is much faster than np.unique(axis=0)"""
+    if points.shape[0] == 0:
+        return points
+    points = points[np.lexsort((points[:, 1], points[:, 0]))]
+    distinct = np.ones(points.shape[0], dtype=bool)
+    distinct[1:] = np.any(points[1:] != points[:-1], axis=1)
+    return points[distinct]
+
+
+def circumradii(points, simplices):
+    """Circumradius of every triangle, inf for flat ones
+
+    Args:
+        points (np.array): n x 2 points
+        simplices (np.array): m x 3 point index of the triangles
+
+    Returns:
+        np.array: the radius of every triangle
+    """
+    a = points[simplices[:, 0]]
+    b = points[simplices[:, 1]]
+    c = points[simplices[:, 2]]
+    ab = np.hypot(*(a - b).T)
+    bc = np.hypot(*(b - c).T)
+    ca = np.hypot(*(c - a).T)
+    double_area = np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) -
+                         (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        radii = ab * bc * ca / (2 * double_area)
+    radii[double_area == 0] = np.inf
+    return radii
+
+
+def triangles_outline(points, simplices, neighbors, keep):
+    """Polygons outlining a subset of the triangles of a triangulation
+
+    An edge is on the outline when the triangle across it is not kept. The outline edges are
+    polygonized and merged, so like alphashape any hole inside the shape is filled.
+
+    Args:
+        points (np.array): n x 2 points
+        simplices (np.array): m x 3 point index of the triangles
+        neighbors (np.array): m x 3 triangle across the edge opposite each vertex, -1 on the hull
+        keep (np.array): boolean mask of the triangles in the shape
+
+    Returns:
+        shapely geometry: Polygon or MultiPolygon
+    """
+    edges = []
+    for vertex in range(3):
+        across = neighbors[:, vertex]
+        outline = keep & ((across < 0) | ~keep[np.maximum(across, 0)])
+        # the edge opposite a vertex joins the two other vertices
+        edges.append(simplices[outline][:, [(vertex + 1) % 3, (vertex + 2) % 3]])
+    edges = np.vstack(edges)
+    return unary_union(list(polygonize(points[edges].tolist())))
+
+
+def _tightest_triangle_count(simplices, neighbors, radii):
+    """How many of the triangles, smallest circumradius first, make the tightest valid shape.
+
+    A shape is valid when every point is a corner of one of its triangles and its triangles
+    are connected through shared edges, so it is one polygon.
+    """
+    triangle_count = simplices.shape[0]
+    rank = np.empty(triangle_count, dtype=np.int64)
+    rank[np.argsort(radii, kind="stable")] = np.arange(triangle_count)
+
+    # every point needs at least its smallest triangle
+    first_triangle = np.full(simplices.max() + 1, triangle_count, dtype=np.int64)
+    np.minimum.at(first_triangle, simplices.ravel(), np.repeat(rank, 3))
+    low = int(np.max(first_triangle[first_triangle < triangle_count])) + 1
+
+    triangle = np.repeat(np.arange(triangle_count), 3)
+    across = neighbors.ravel()
+    shared = across >= 0
+    triangle, across = triangle[shared], across[shared]
+
+    def is_connected(count):
+        keep = rank < count
+        link = keep[triangle] & keep[across]
+        _, component = connected_components(
+            coo_matrix((np.ones(np.count_nonzero(link), dtype=np.int8),
+                        (triangle[link], across[link])),
+                       shape=(triangle_count, triangle_count)), directed=False)
+        return np.unique(component[keep]).shape[0] == 1
+
+    # all the triangles of a Delaunay triangulation are always connected
+    high = triangle_count
+    while low < high:
+        middle = (low + high) // 2
+        if is_connected(middle):
+            high = middle
+        else:
+            low = middle + 1
+    return high
+
+
+def boundary_mask(points, cell_size, max_points=None, band_cells=BOUNDARY_BAND_CELLS):
+    """Find the points that can be on the outline of a cluster
+
+    The points are binned into a grid, and only the points within a couple of cells of the
+    empty cells around the cluster are candidates. Gaps inside the cluster are filled by the
+    hull anyway, so the points around them are dropped along with the interior. If more than max_points
+    are candidates, the grid is coarsened until they fit.
+
+    Args:
+        points (np.array): n x 2 points of the cluster
+        cell_size (float): side of the grid cells
+        max_points (int, optional): the most candidates to keep. Defaults to None, no limit.
+        band_cells (int, optional): how many cells deep the band of candidates is. Defaults to BOUNDARY_BAND_CELLS.
+
+    Returns:
+        np.array: boolean mask of the boundary candidates
+    """
+    points = np.asarray(points)
+    while True:
+        cells = np.floor((points - points.min(axis=0)) / cell_size).astype(np.int64) + 1
+        # an empty border around the grid, the outermost cells always touch it
+        occupied = np.zeros(tuple(cells.max(axis=0) + 2), dtype=bool)
+        occupied[cells[:, 0], cells[:, 1]] = True
+        # the hull fills the gaps inside the cluster, so only the outer edge matters
+        occupied = binary_fill_holes(occupied)
+        interior = binary_erosion(occupied, structure=np.ones((3, 3), dtype=bool),
+                                  iterations=band_cells)
+        candidates = ~interior[cells[:, 0], cells[:, 1]]
+        if max_points is None or np.count_nonzero(candidates) <= max_points or not np.any(interior):
+            return candidates
+        cell_size *= 2
+
+
+def reduced_concave_hull(points, cell_size, max_points=None):
+    """Concave hull of a cluster built from its boundary candidates only
+
+    The tightest hull is picked on the candidates alone, then a sample of the dropped interior
+    points is checked to be inside it. Without the interior a thin band of candidates can be
+    wrapped by a hull that does not close around the cluster, the band is then made deeper
+    until it does, which in the end keeps every point.
+
+    Args:
+        points (np.array): n x 2 points of the cluster
+        cell_size (float): side of the grid cells of the boundary candidates
+        max_points (int, optional): the most candidates to keep. Defaults to None, no limit.
+
+    Returns:
+        shapely geometry: the hull
+    """
+    points = np.asarray(points)
+    band_cells = BOUNDARY_BAND_CELLS
+    while points.shape[0] >= 4:
+        candidates = boundary_mask(points, cell_size, max_points, band_cells)
+        interior = points[~candidates]
+        if interior.shape[0] == 0:
+            break
+        hull = concave_hull(points[candidates])
+        covered = prep(hull)
+        probes = interior[np.linspace(0, interior.shape[0] - 1,
+                                      min(INTERIOR_PROBES, interior.shape[0])).astype(np.int64)]
+        if all(covered.intersects(Point(probe)) for probe in probes):
+            return hull
+        band_cells *= 2
+    return concave_hull(points)
@@ -0,0 +1,289 @@
+import json
+import os
+import platform
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # resource is unix only, without it the cpu time only covers this process and there is no peak rss
+    resource = None
+
+REPORT_VERSION = 2
+PROC_STATUS = "/proc/self/status"
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+
+
+def _cpu_time():
+    """user and system cpu seconds of this process and of its finished worker processes"""
+    if resource is None:
+        return time.process_time()
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _process_peak_rss_mb():
+    """the peak resident set size over the lifetime of this process and of its largest worker process, in MB"""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in kB on linux and in bytes on macOS
+    unit = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit)
+
+
+def _high_water_mark_mb():
+    """the peak resident set size of this process since the high water mark was last reset, in MB"""
+    try:
+        with open(PROC_STATUS) as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_high_water_mark():
+    """reset the peak resident set size of this process to its current size, linux only
+
+    Returns:
+        bool: whether the high water mark could be reset
+    """
+    try:
+        with open(PROC_CLEAR_REFS, "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageRecord:
+    """Measurements of one pipeline stage, added up over every time the stage ran"""
+
+    def __init__(self, name):
+        self._name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.calls = 0
+        self.points_in = 0
+        self.points_out = 0
+        self.cache_hits = 0
+        # the peak rss over the lifetime of this process and of its largest worker when the stage last ended
+        self.process_peak_rss_mb = None
+        self.process_peak_worker_rss_mb = None
+        # the peak rss of this process, not of its workers, while the stage ran, only measured on request
+        self.peak_rss_mb = None
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def points_per_second(self):
+        """points in per second of wall time, the points out when the stage has no input points"""
+        points = self.points_in if self.points_in > 0 else self.points_out
+        if self.wall_time == 0:
+            return None
+        return points / self.wall_time
+
+    def to_dict(self):
+        return {
+            "name": self._name,
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "wall_time_s": self.wall_time,
+            "cpu_time_s": self.cpu_time,
+            "peak_rss_mb": self.peak_rss_mb,
+            "process_peak_rss_mb": self.process_peak_rss_mb,
+            "process_peak_worker_rss_mb": self.process_peak_worker_rss_mb,
+            "points_in": self.points_in,
+            "points_out": self.points_out,
+            "points_per_second": self.points_per_second,
+        }
+
+
+class RunInstrumentation:
+    """Wall time, cpu time, peak memory and point throughput of the stages of a pipeline run.
+
+    Stages can be nested, the time of a nested stage is only counted in the nested stage, so
+    the time of a consumer such as the export does not include the stages producing its input.
+    A stage entered several times, e.g. once per tile or per batch, adds up into one record.
+    Every stage records the peak rss over the lifetime of the process and of its largest worker.
+    With stage_peak_rss, the peak rss of the stage itself is measured as well: the high water mark
+    of the process is reset when the stage starts, so it only covers the stage and the stages
+    nested in it. It does not cover the worker processes. The reset is process wide, other code
+    reading the high water mark of the process sees it too, so it is only done on request, e.g. by
+    the benchmarks, and only possible on linux.
+    """
+
+    def __init__(self, pipeline_name, stage_peak_rss=False):
+        self._pipeline_name = pipeline_name
+        self._started = time.time()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = _cpu_time()
+        self._stages = {}
+        self._active = []
+        self._track_peak_rss = stage_peak_rss and _high_water_mark_mb() is not None and os.access(
+            PROC_CLEAR_REFS, os.W_OK)
+        # resetting the high water mark also lowers ru_maxrss, so the peak before each reset is kept
+        self._process_peak_rss_mb = 0.0
+        self.metadata = {}
+
+    @property
+    def pipeline_name(self):
+        return self._pipeline_name
+
+    @property
+    def stages(self):
+        """list of the stage records in the order the stages first ran"""
+        return list(self._stages.values())
+
+    def record(self, name):
+        """The record of a stage, created if the stage did not run yet
+
+        Args:
+            name (str): name of the stage
+
+        Returns:
+            StageRecord: the record
+        """
+        record = self._stages.get(name)
+        if record is None:
+            record = self._stages[name] = StageRecord(name)
+        return record
+
+    @contextmanager
+    def stage(self, name, points_in=0):
+        """Measure a stage
+
+        Args:
+            name (str): name of the stage
+            points_in (int, optional): the number of points going into the stage. Defaults to 0.
+
+        Yields:
+            StageRecord: the record of the stage, to add the points out or count a cache hit
+        """
+        record = self.record(name)
+        record.calls += 1
+        record.points_in += int(points_in)
+        now_wall, now_cpu = time.perf_counter(), _cpu_time()
+        if len(self._active) > 0:
+            # the outer stage is paused while this one runs
+            self.__charge(self._active[-1], now_wall, now_cpu)
+            self.__sample_peak_rss(self._active[-1])
+        self.__reset_peak_rss()
+        self._active.append([record, now_wall, now_cpu, 0.0])
+        try:
+            yield record
+        finally:
+            now_wall, now_cpu = time.perf_counter(), _cpu_time()
+            active = self._active.pop()
+            self.__charge(active, now_wall, now_cpu)
+            self.__sample_peak_rss(active)
+            if self._track_peak_rss:
+                record.peak_rss_mb = max(record.peak_rss_mb or 0.0, active[3])
+            record.process_peak_rss_mb, record.process_peak_worker_rss_mb = self.__process_peak_rss_mb()
+            if len(self._active) > 0:
+                self._active[-1][1:3] = [now_wall, now_cpu]
+                # the memory of a nested stage is held while the outer stage runs
+                self._active[-1][3] = max(self._active[-1][3], active[3])
+
+    def iterate(self, name, iterable):
+        """Measure the time spent producing the items of an iterable, e.g. a generator stage
+
+        Args:
+            name (str): name of the stage
+            iterable (iterable): the items
+
+        Yields:
+            the items of the iterable
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self):
+        """The run report
+
+        Returns:
+            dict: json serializable report of the run and of every stage
+        """
+        process_peak_rss_mb, process_peak_worker_rss_mb = self.__process_peak_rss_mb()
+        return {
+            "version": REPORT_VERSION,
+            "pipeline": self._pipeline_name,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._started)),
+            "host": platform.node(),
+            "metadata": self.metadata,
+            "wall_time_s": time.perf_counter() - self._start_wall,
+            "cpu_time_s": _cpu_time() - self._start_cpu,
+            "process_peak_rss_mb": process_peak_rss_mb,
+            "process_peak_worker_rss_mb": process_peak_worker_rss_mb,
+            "stages": [record.to_dict() for record in self._stages.values()],
+        }
+
+    def summary(self):
+        """human readable table of the stages. The rss is the peak of the stage when it is measured,
+        otherwise the peak of the process up to the end of the stage
+
+        Returns:
+            str: one line per stage
+        """
+        lines = ["%-22s %9s %9s %9s %12s %12s %14s" % (
+            "stage", "wall s", "cpu s", "rss MB", "points in", "points out", "points/s")]
+        for record in self._stages.values():
+            rss_mb = record.process_peak_rss_mb if record.peak_rss_mb is None else record.peak_rss_mb
+            lines.append("%-22s %9.3f %9.3f %9s %12d %12d %14s" % (
+                record.name + (" (cached)" if record.cache_hits == record.calls else ""), record.wall_time, record.cpu_time,
+                "-" if rss_mb is None else "%.0f" % rss_mb,
+                record.points_in, record.points_out,
+                "-" if record.points_per_second is None else "%.0f" % record.points_per_second))
+        return "\n".join(lines)
+
+    def write_report(self, report_dir):
+        """Write the run report as json, named after the pipeline and the start of the run
+
+        Args:
+            report_dir (str): folder of the reports
+
+        Returns:
+            str: path of the written report
+        """
+        os.makedirs(report_dir, exist_ok=True)
+        file_path = os.path.join(report_dir, "%s_%s.json" % (
+            self._pipeline_name, time.strftime("%Y%m%dT%H%M%S", time.localtime(self._started))))
+        with open(file_path, "w") as out_file:
+            json.dump(self.report(), out_file, indent=4)
+        return file_path
+
+    def __process_peak_rss_mb(self):
+        process_peak_rss_mb, process_peak_worker_rss_mb = _process_peak_rss_mb()
+        if self._track_peak_rss:
+            process_peak_rss_mb = max(process_peak_rss_mb or 0.0, self._process_peak_rss_mb,
+                                      _high_water_mark_mb() or 0.0)
+        return process_peak_rss_mb, process_peak_worker_rss_mb
+
+    def __sample_peak_rss(self, active):
+        if self._track_peak_rss:
+            active[3] = max(active[3], _high_water_mark_mb() or 0.0)
+
+    def __reset_peak_rss(self):
+        if self._track_peak_rss:
+            self._process_peak_rss_mb = max(self._process_peak_rss_mb, _high_water_mark_mb() or 0.0)
+            self._track_peak_rss = _reset_high_water_mark()
+
+    @staticmethod
+    def __charge(active, now_wall, now_cpu):
+        record, start_wall, start_cpu, _ = active
+        record.wall_time += now_wall - start_wall
+        record.cpu_time += now_cpu - start_cpu
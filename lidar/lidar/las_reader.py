@@ -0,0 +1,242 @@
+import shutil
+import struct
+import subprocess
+import numpy as np
+
+LAZ_EXT = ".laz"
+LASZIP_BINARIES = ("laszip", "laszip-cli", "laszip.exe", "laszip-cli.exe")
+# size of the part of the public header block shared by every LAS version
+PUBLIC_HEADER_SIZE = 227
+LAS_1_4_HEADER_SIZE = 375
+
+
+class LasHeader:
+    """The fields of the LAS public header block the pipeline needs, parsed without laspy."""
+
+    def __init__(self, raw_header):
+        if raw_header[:4] != b"LASF":
+            raise ValueError("Not a LAS file")
+        self._version = struct.unpack_from("<BB", raw_header, 24)
+        self._header_size = struct.unpack_from("<H", raw_header, 94)[0]
+        self._data_offset = struct.unpack_from("<I", raw_header, 96)[0]
+        # the two high bits flag compressed points in LAZ files
+        self._point_format = struct.unpack_from("<B", raw_header, 104)[0] & 0x3F
+        self._record_length = struct.unpack_from("<H", raw_header, 105)[0]
+        self._point_count = struct.unpack_from("<I", raw_header, 107)[0]
+        if self._point_count == 0 and len(raw_header) >= LAS_1_4_HEADER_SIZE:
+            self._point_count = struct.unpack_from("<Q", raw_header, 247)[0]
+        self._scale = struct.unpack_from("<3d", raw_header, 131)
+        self._offset = struct.unpack_from("<3d", raw_header, 155)
+        max_x, min_x, max_y, min_y, max_z, min_z = struct.unpack_from(
+            "<6d", raw_header, 179)
+        self._min = (min_x, min_y, min_z)
+        self._max = (max_x, max_y, max_z)
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def header_size(self):
+        return self._header_size
+
+    @property
+    def data_offset(self):
+        return self._data_offset
+
+    @property
+    def point_format(self):
+        return self._point_format
+
+    @property
+    def record_length(self):
+        return self._record_length
+
+    @property
+    def point_count(self):
+        return self._point_count
+
+    @property
+    def scale(self):
+        return self._scale
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @property
+    def min(self):
+        return self._min
+
+    @property
+    def max(self):
+        return self._max
+
+    def projected_dtype(self, return_number=False):
+        """Build a numpy dtype that only exposes the dimensions the pipeline reads.
+
+        The offsets follow the point data record formats of the LAS specification,
+        so numpy skips every other dimension while reading the records.
+
+        Args:
+            return_number (bool, optional): also expose the byte holding the return number. Defaults to False.
+
+        Returns:
+            np.dtype: dtype with X, Y, Z, the classification byte and optionally the return byte
+        """
+        names = ["X", "Y", "Z", "classification"]
+        formats = ["<i4", "<i4", "<i4", "u1"]
+        # format 6-10 store classification in its own byte after the flags
+        offsets = [0, 4, 8, 16 if self._point_format >= 6 else 15]
+        if return_number:
+            names.append("return_byte")
+            formats.append("u1")
+            offsets.append(14)
+        return np.dtype(
+            {"names": names, "formats": formats, "offsets": offsets,
+             "itemsize": self._record_length}
+        )
+
+    @staticmethod
+    def read(file_path):
+        """Read the header of a LAS or LAZ file
+
+        Args:
+            file_path (str): path to the las file
+
+        Returns:
+            LasHeader: the parsed header
+        """
+        with open(file_path, "rb") as in_file:
+            return LasHeader(in_file.read(LAS_1_4_HEADER_SIZE))
+
+
+class LasChunkReader:
+    """Stream the points of a LAS/LAZ file in fixed size chunks.
+
+    Only X, Y, Z, classification and optionally the return number are kept from each
+    record, so the memory stays bounded by the chunk size no matter how big the tile is.
+    LAZ files are decompressed on the fly by the laszip executable.
+    """
+
+    def __init__(self, file_path, chunk_size=1000000, return_number=False):
+        self._file_path = file_path
+        self._chunk_size = chunk_size
+        self._return_number = return_number
+        self._header = None
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._header = LasHeader.read(self._file_path)
+        return self._header
+
+    def __iter__(self):
+        """Walk the file chunk by chunk
+
+        Yields:
+            dict: "X", "Y", "Z" raw integer coordinates and "classification" of the chunk,
+            plus "return_number" if requested
+        """
+        stream, process = self.__open_stream()
+        try:
+            raw_header = stream.read(PUBLIC_HEADER_SIZE)
+            if raw_header[24:26] == b"\x01\x04":
+                raw_header += stream.read(LAS_1_4_HEADER_SIZE - PUBLIC_HEADER_SIZE)
+            header = LasHeader(raw_header)
+            self._header = header
+            # skip the variable length records, pipes can only be read forward
+            stream.read(header.data_offset - stream.tell())
+            dtype = header.projected_dtype(self._return_number)
+            remaining = header.point_count
+            while remaining > 0:
+                buffer = stream.read(
+                    min(self._chunk_size, remaining) * header.record_length)
+                count = len(buffer) // header.record_length
+                if count == 0:
+                    break
+                remaining -= count
+                yield self.__decode(np.frombuffer(buffer, dtype=dtype, count=count), header)
+        finally:
+            stream.close()
+            if process is not None:
+                process.kill()
+                process.wait()
+
+    def iter_classified(self, index_types):
+        """Walk the file and only keep the points in the given classes
+
+        Args:
+            index_types (iterable): LiDARIndexType values to keep
+
+        Yields:
+            dict: the chunk with the points of other classes removed
+        """
+        index_types = np.array(list(index_types), dtype=np.uint8)
+        for chunk in self:
+            mask = np.isin(chunk["classification"], index_types)
+            if not np.any(mask):
+                continue
+            yield {dimension: values[mask] for dimension, values in chunk.items()}
+
+    def __decode(self, records, header):
+        chunk = {
+            "X": records["X"],
+            "Y": records["Y"],
+            "Z": records["Z"],
+            "classification": records["classification"]
+            if header.point_format >= 6 else records["classification"] & 0x1F,
+        }
+        if self._return_number:
+            chunk["return_number"] = records["return_byte"] & (
+                0x0F if header.point_format >= 6 else 0x07)
+        return chunk
+
+    def __open_stream(self):
+        if not self._file_path.lower().endswith(LAZ_EXT):
+            return _CountingReader(open(self._file_path, "rb")), None
+        laszip_binary = next(
+            (binary for binary in LASZIP_BINARIES if shutil.which(binary)), None)
+        if laszip_binary is None:
+            raise FileNotFoundError(
+                "laszip executable (%s) was not found in PATH" % ", ".join(LASZIP_BINARIES))
+        process = subprocess.Popen(
+            [laszip_binary, "-olas", "-stdout", "-i", self._file_path],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        return _CountingReader(process.stdout), process
+
+
+class _CountingReader:
+    """File-like wrapper that keeps track of the position in pipes that cannot tell()."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._position = 0
+
+    def read(self, size):
+        data = self._stream.read(size)
+        if len(data) < size:
+            # pipes can return less than asked before the end of the stream
+            blocks = [data]
+            while size > 0 and data:
+                size -= len(data)
+                data = self._stream.read(size)
+                blocks.append(data)
+            data = b"".join(blocks)
+        self._position += len(data)
+        return data
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        self._stream.close()
@@ -1,13 +1,13 @@
 import plotly.graph_objects as go
 from PIL import Image
 import numpy as np
-from sklearn.cluster import DBSCAN, OPTICS
 from progress.bar import Bar
 import plotly.io as pio
 
 # too many points, cannot render embedded
 # https://plotly.com/python/renderers/
 from config import configure
+from clustering import ClusterIndex, DBSCANSweep
 
 
 class GraphGUI:
@@ -124,13 +124,11 @@ class GraphGUI:
         if not self.__data_checker(pcd_2d=True, pcd_label=True):
             return
         fig = go.Figure()
-        for i in np.arange(np.amax(self._label)):
-            x_cluster = self._x[np.where(self._label == i)]
-            y_cluster = self._y[np.where(self._label == i)]
+        for cluster in ClusterIndex(self._label, self._x, self._y):
             fig.add_trace(
                 go.Scattergl(
-                    x=x_cluster,
-                    y=y_cluster,
+                    x=cluster[:, 0],
+                    y=cluster[:, 1],
                     mode="markers",
                     marker=dict(
                         size=3, colorscale="Viridis", opacity=0.8  # choose a colorscale
@@ -232,6 +230,14 @@ class GraphGUI:
         return validated
 
     def DBSCAN_2d_tuner(self, esp_range=[500, 1000], min_sample=20, render="browser"):
+        """Plot the clusters of every eps step of a range on a slider. The neighbour graph is
+        built once at the end of the range, every step only relinks it.
+
+        Args:
+            esp_range (list, optional): first and last eps, in steps of 100. Defaults to [500, 1000].
+            min_sample (int, optional): DBSCAN min_samples. Defaults to 20.
+            render (str, optional): plotly renderer. Defaults to "browser".
+        """
         if not self.__data_checker(pcd_2d=True):
             return
         pio.renderers.default = render
@@ -239,49 +245,50 @@ class GraphGUI:
         # Create figure
         fig = go.Figure()
 
+        eps_steps = np.arange(esp_range[0], esp_range[1], 100)
         bar = Bar(
             "Loading",
             fill="@",
             suffix="%(percent)d%% time: %(elapsed)ds",
-            max=int((esp_range[1] - esp_range[0]) / 100),
+            max=len(eps_steps),
         )
+        sweep = DBSCANSweep(self._x, self._y, eps_steps.max())
+        results = sweep.sweep(eps_steps, [min_sample], keep_labels=True)
 
         # Add traces, one for each slider step
-        for esp_step in np.arange(esp_range[0], esp_range[1], 100):
+        for result in results:
             bar.next()
-            points = np.vstack((self._x, self._y)).T
-            clustering = OPTICS(
-                max_eps=esp_step, min_samples=min_sample, n_jobs=-1
-            ).fit(points)
-            for i in np.arange(np.amax(clustering.labels_)):
-                x_cluster = self._x[np.where(self._label == i)]
-                y_cluster = self._y[np.where(self._label == i)]
-                fig.add_trace(
-                    go.Scattergl(
-                        x=x_cluster,
-                        y=y_cluster,
-                        mode="markers",
-                        marker=dict(
-                            size=3,
-                            colorscale="Viridis",  # choose a colorscale
-                            opacity=0.8,
-                        ),
-                    )
+            clustered = result.labels >= 0
+            fig.add_trace(
+                go.Scattergl(
+                    x=self._x[clustered],
+                    y=self._y[clustered],
+                    mode="markers",
+                    visible=False,
+                    name="eps %d" % result.eps,
+                    marker=dict(
+                        size=3,
+                        color=result.labels[clustered],
+                        colorscale="Viridis",  # choose a colorscale
+                        opacity=0.8,
+                    ),
                 )
+            )
 
         bar.finish()
 
-        # Make 10th trace visible
         fig.data[0].visible = True
 
         # Create and add slider
         steps = []
-        for i in range(len(fig.data)):
+        for i, result in enumerate(results):
             step = dict(
                 method="update",
+                label="%d" % result.eps,
                 args=[
                     {"visible": [False] * len(fig.data)},
-                    {"title": "Slider switched to step: " + str(i)},
+                    {"title": "eps %d: %d clusters, %.1f%% noise" % (
+                        result.eps, result.cluster_count, 100 * result.noise_fraction)},
                 ],  # layout attribute
             )
             # Toggle i'th trace to "visible"
@@ -291,22 +298,20 @@ class GraphGUI:
         sliders = [
             dict(
                 active=0,
-                currentvalue={"prefix": "Frequency: "},
+                currentvalue={"prefix": "eps: "},
                 pad={"t": 50},
                 steps=steps,
             )
         ]
 
-        fig.update_layout(sliders=sliders)
+        fig.update_layout(sliders=sliders, title=steps[0]["args"][1]["title"])
 
         fig.show()
 
 
 # from processing import ProcessingPipeline
 # pipeline = ProcessingPipeline()
-# points = pipeline.load_points_from_pkl()
-# all_point_x = points[:, 0].T
-# all_point_y = points[:, 1].T
+# all_point_x, all_point_y, _ = PointStore(configure.get("Constants", "point_store_path")).load()
 
 # print(all_point_x.shape)
 
@@ -0,0 +1,71 @@
+import json
+import os
+import numpy as np
+
+METADATA_FILE_NAME = "metadata.json"
+STORE_VERSION = 1
+
+
+class PointStore:
+    """Uncompressed columnar store of the whole map's points.
+
+    Each coordinate is a plain .npy file that is memory mapped on load, so the points are
+    available as array views without decompressing or copying them. A small json header
+    records the frame of the points and the parameters they were produced with.
+    """
+
+    def __init__(self, store_dir):
+        self._store_dir = store_dir
+
+    @property
+    def store_dir(self):
+        return self._store_dir
+
+    def exists(self):
+        return os.path.exists(os.path.join(self._store_dir, METADATA_FILE_NAME))
+
+    def save(self, point_x, point_y, metadata):
+        """Save the points. Every file is written to a temporary file and moved into place, so the
+        points memory mapped by an earlier load keep their content, and the metadata is written
+        last, so a store interrupted while saving is never picked up by load.
+
+        Args:
+            point_x (np.array): x of the points in the relative frame
+            point_y (np.array): y of the points in the relative frame
+            metadata (dict): json serializable description of the points, e.g. min_east, min_north, units, parameters
+        """
+        os.makedirs(self._store_dir, exist_ok=True)
+        metadata_path = os.path.join(self._store_dir, METADATA_FILE_NAME)
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+        # the relative frame is in whole centimetres, so int32 holds it without loss
+        for name, values in (("x", point_x), ("y", point_y)):
+            file_path = os.path.join(self._store_dir, name + ".npy")
+            temp_file_path = "%s.%d.tmp.npy" % (file_path[:-len(".npy")], os.getpid())
+            np.save(temp_file_path, np.asarray(values).astype(np.int32))
+            os.replace(temp_file_path, file_path)
+        temp_file_path = "%s.%d.tmp" % (metadata_path, os.getpid())
+        with open(temp_file_path, "w") as out_file:
+            json.dump(dict(metadata, version=STORE_VERSION,
+                           count=int(np.asarray(point_x).shape[0])), out_file, indent=4)
+        os.replace(temp_file_path, metadata_path)
+
+    def load(self):
+        """Memory map the points
+
+        Raises:
+            LookupError: the store does not exist or is incomplete
+
+        Returns:
+            np.array, np.array, dict: read only views of x and y, and the metadata
+        """
+        if not self.exists():
+            raise LookupError
+        with open(os.path.join(self._store_dir, METADATA_FILE_NAME)) as in_file:
+            metadata = json.load(in_file)
+        point_x = np.load(os.path.join(self._store_dir, "x.npy"), mmap_mode="r")
+        point_y = np.load(os.path.join(self._store_dir, "y.npy"), mmap_mode="r")
+        if metadata.get("version") != STORE_VERSION or point_x.shape[0] != metadata["count"] \
+                or point_y.shape[0] != metadata["count"]:
+            raise LookupError
+        return point_x, point_y, metadata
@@ -0,0 +1,270 @@
+import struct
+import zlib
+import numpy as np
+
+BINARY_EXTENSION = ".plyb"
+MAGIC = b"PLYB"
+FORMAT_VERSION = 1
+# magic, version, precision, feature, polygon, ring and vertex counts, quantised bbox
+HEADER = struct.Struct("<4sHHIIII4q")
+SECTION_LENGTH = struct.Struct("<I")
+
+POLYGON = 0
+MULTI_POLYGON = 1
+GEOMETRY_TYPES = {"Polygon": POLYGON, "MultiPolygon": MULTI_POLYGON}
+
+
+def is_binary_path(file_path):
+    """Whether a file path asks for the binary polygon format rather than GeoJSON
+
+    Args:
+        file_path (str): output file path
+
+    Returns:
+        bool: True when the path ends with BINARY_EXTENSION
+    """
+    return file_path.lower().endswith(BINARY_EXTENSION)
+
+
+def write_polygon_features(file_path, features, precision=6):
+    """Save polygon features in the compact binary format.
+
+    The file is a fixed header with the counts and the bounding box of all the features, a
+    bounding box per feature so a reader can find the features of an area without decoding any
+    coordinates, the offsets of the polygons, rings and vertices, the coordinates and the ids.
+    Coordinates are quantised to precision decimals and stored as deltas from the previous
+    vertex, the closing vertex of every ring is left out. Every section is zlib compressed.
+    Only the id of the feature properties is kept.
+
+    Args:
+        file_path (str): path to output file
+        features (iterable): list or generator of geojson Polygon or MultiPolygon features
+        precision (int, optional): decimals kept of the coordinates. Defaults to 6.
+
+    Raises:
+        ValueError: the extent at this precision or the number of features does not fit the format
+
+    Returns:
+        int: the number of features written
+    """
+    scale = 10 ** precision
+    geometry_types = []
+    polygon_offsets = [0]
+    ring_offsets = [0]
+    vertex_offsets = [0]
+    rings = []
+    ids = []
+    for feature in features:
+        geometry = feature["geometry"]
+        geometry_type = GEOMETRY_TYPES[geometry["type"]]
+        polygons = [geometry["coordinates"]] if geometry_type == POLYGON else geometry["coordinates"]
+        for polygon in polygons:
+            for ring in polygon:
+                ring = np.round(np.asarray(ring, dtype=np.float64)[:, :2] * scale).astype(np.int64)
+                if ring.shape[0] > 1 and np.array_equal(ring[0], ring[-1]):
+                    ring = ring[:-1]
+                rings.append(ring)
+                vertex_offsets.append(vertex_offsets[-1] + ring.shape[0])
+            ring_offsets.append(len(vertex_offsets) - 1)
+        polygon_offsets.append(len(ring_offsets) - 1)
+        geometry_types.append(geometry_type)
+        properties = feature.get("properties") or {}
+        ids.append(str(properties.get("id", feature.get("id", ""))).encode("utf-8"))
+
+    coordinates = np.vstack(rings) if len(rings) > 0 else np.zeros((0, 2), dtype=np.int64)
+    vertex_offsets = np.asarray(vertex_offsets, dtype=np.int64)
+    if coordinates.shape[0] > 0:
+        origin = coordinates.min(axis=0)
+        bbox = np.concatenate([origin, coordinates.max(axis=0)])
+    else:
+        origin = np.zeros(2, dtype=np.int64)
+        bbox = np.zeros(4, dtype=np.int64)
+
+    # bounding box of every feature, relative to the origin
+    feature_vertex_offsets = vertex_offsets[np.asarray(ring_offsets)[polygon_offsets]]
+    feature_bboxes = np.zeros((len(geometry_types), 4), dtype=np.int64)
+    has_vertices = feature_vertex_offsets[1:] > feature_vertex_offsets[:-1]
+    if np.any(has_vertices):
+        starts = feature_vertex_offsets[:-1][has_vertices]
+        relative = coordinates - origin
+        feature_bboxes[has_vertices, :2] = np.minimum.reduceat(relative, starts, axis=0)
+        feature_bboxes[has_vertices, 2:] = np.maximum.reduceat(relative, starts, axis=0)
+
+    deltas = np.diff(coordinates - origin, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    id_offsets = np.cumsum([0] + [len(feature_id) for feature_id in ids])
+    # the sections are narrowed to 32 bits, refuse what would wrap around instead of corrupting it
+    _check_range("feature bounding boxes, the extent times 10^precision", feature_bboxes, np.uint32)
+    _check_range("vertex deltas, the extent times 10^precision", deltas, np.int32)
+    for name, offsets in (("polygon offsets", polygon_offsets), ("ring offsets", ring_offsets),
+                          ("vertex offsets", vertex_offsets), ("id offsets", id_offsets)):
+        _check_range(name, offsets, np.uint32)
+
+    with open(file_path, "wb") as out_file:
+        out_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, precision, len(geometry_types),
+                                   len(ring_offsets) - 1, len(vertex_offsets) - 1,
+                                   coordinates.shape[0], *bbox.tolist()))
+        for section in (np.asarray(geometry_types, dtype=np.uint8),
+                        feature_bboxes.astype(np.uint32),
+                        np.asarray(polygon_offsets, dtype=np.uint32),
+                        np.asarray(ring_offsets, dtype=np.uint32),
+                        vertex_offsets.astype(np.uint32),
+                        deltas.astype(np.int32),
+                        id_offsets.astype(np.uint32),
+                        b"".join(ids)):
+            data = zlib.compress(np.ascontiguousarray(section).tobytes() if isinstance(section, np.ndarray) else section)
+            out_file.write(SECTION_LENGTH.pack(len(data)))
+            out_file.write(data)
+    return len(geometry_types)
+
+
+def _check_range(name, values, dtype):
+    """Raise a ValueError if values do not fit an integer dtype"""
+    values = np.asarray(values)
+    if values.size == 0:
+        return
+    limits = np.iinfo(dtype)
+    if values.min() < limits.min or values.max() > limits.max:
+        raise ValueError("the %s range from %d to %d, which does not fit the %s of the binary format, "
+                         "use a lower precision" % (name, values.min(), values.max(), np.dtype(dtype).name))
+
+
+def read_polygon_features(file_path):
+    """Load all the features of a binary polygon file
+
+    Args:
+        file_path (str): path to the binary file
+
+    Returns:
+        list: geojson style polygon features
+    """
+    return list(PolygonBinaryReader(file_path))
+
+
+class PolygonBinaryReader:
+    """Reader of the binary polygon format written by write_polygon_features.
+
+    The header, the feature bounding boxes, the offsets and the ids are decoded when the file is
+    opened, the coordinates only once a geometry is asked for.
+    """
+
+    def __init__(self, file_path):
+        with open(file_path, "rb") as in_file:
+            data = in_file.read()
+        header = HEADER.unpack_from(data, 0)
+        if header[0] != MAGIC:
+            raise ValueError("{} is not a binary polygon file".format(file_path))
+        if header[1] != FORMAT_VERSION:
+            raise ValueError("unsupported binary polygon format version {}".format(header[1]))
+        self._precision = header[2]
+        feature_count, polygon_count, ring_count, vertex_count = header[3:7]
+        self._quantised_bbox = np.asarray(header[7:11], dtype=np.int64)
+
+        sections = []
+        position = HEADER.size
+        while position < len(data):
+            (length,) = SECTION_LENGTH.unpack_from(data, position)
+            position += SECTION_LENGTH.size
+            sections.append(data[position:position + length])
+            position += length
+        self._geometry_types = np.frombuffer(zlib.decompress(sections[0]), dtype=np.uint8)
+        self._feature_bboxes = np.frombuffer(
+            zlib.decompress(sections[1]), dtype=np.uint32).reshape(feature_count, 4)
+        self._polygon_offsets = np.frombuffer(zlib.decompress(sections[2]), dtype=np.uint32)
+        self._ring_offsets = np.frombuffer(zlib.decompress(sections[3]), dtype=np.uint32)
+        self._vertex_offsets = np.frombuffer(zlib.decompress(sections[4]), dtype=np.uint32)
+        self._compressed_deltas = sections[5]
+        self._vertex_count = vertex_count
+        self._coordinates = None
+        id_offsets = np.frombuffer(zlib.decompress(sections[6]), dtype=np.uint32)
+        id_bytes = zlib.decompress(sections[7])
+        self._ids = [id_bytes[start:end].decode("utf-8")
+                     for start, end in zip(id_offsets[:-1], id_offsets[1:])]
+        assert self._polygon_offsets.shape[0] == feature_count + 1
+        assert self._ring_offsets.shape[0] == polygon_count + 1
+        assert self._vertex_offsets.shape[0] == ring_count + 1
+
+    def __len__(self):
+        return self._geometry_types.shape[0]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.feature(index)
+
+    @property
+    def precision(self):
+        return self._precision
+
+    @property
+    def ids(self):
+        """list of the feature ids"""
+        return self._ids
+
+    @property
+    def bbox(self):
+        """bounding box of all the features, min x, min y, max x, max y"""
+        return self._quantised_bbox / 10 ** self._precision
+
+    @property
+    def bounding_boxes(self):
+        """n x 4 bounding box of every feature, min x, min y, max x, max y"""
+        origin = np.tile(self._quantised_bbox[:2], 2)
+        return (self._feature_bboxes.astype(np.int64) + origin) / 10 ** self._precision
+
+    def features_in_bbox(self, min_x, min_y, max_x, max_y):
+        """Index of the features whose bounding box intersects a bounding box
+
+        Args:
+            min_x (float): west edge
+            min_y (float): south edge
+            max_x (float): east edge
+            max_y (float): north edge
+
+        Returns:
+            np.array: feature indices
+        """
+        boxes = self.bounding_boxes
+        return np.flatnonzero((boxes[:, 0] <= max_x) & (boxes[:, 2] >= min_x) &
+                              (boxes[:, 1] <= max_y) & (boxes[:, 3] >= min_y))
+
+    def polygons(self, index):
+        """The rings of every polygon of a feature, closed like in GeoJSON
+
+        Args:
+            index (int): feature index
+
+        Returns:
+            list: for every polygon, the list of its n x 2 rings
+        """
+        coordinates = self.__coordinates()
+        polygons = []
+        for polygon in range(self._polygon_offsets[index], self._polygon_offsets[index + 1]):
+            rings = []
+            for ring in range(self._ring_offsets[polygon], self._ring_offsets[polygon + 1]):
+                points = coordinates[self._vertex_offsets[ring]:self._vertex_offsets[ring + 1]]
+                rings.append(np.vstack([points, points[:1]]))
+            polygons.append(rings)
+        return polygons
+
+    def feature(self, index):
+        """A feature as a geojson style dict
+
+        Args:
+            index (int): feature index
+
+        Returns:
+            dict: the feature
+        """
+        polygons = [[ring.tolist() for ring in rings] for rings in self.polygons(index)]
+        if self._geometry_types[index] == POLYGON:
+            geometry = {"type": "Polygon", "coordinates": polygons[0]}
+        else:
+            geometry = {"type": "MultiPolygon", "coordinates": polygons}
+        return {"type": "Feature", "geometry": geometry, "properties": {"id": self._ids[index]}}
+
+    def __coordinates(self):
+        if self._coordinates is None:
+            deltas = np.frombuffer(zlib.decompress(self._compressed_deltas),
+                                   dtype=np.int32).reshape(self._vertex_count, 2)
+            self._coordinates = (np.cumsum(deltas, axis=0, dtype=np.int64) +
+                                 self._quantised_bbox[:2]) / 10 ** self._precision
+        return self._coordinates
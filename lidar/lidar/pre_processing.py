@@ -4,16 +4,17 @@ import os
 import ntpath
 import fnmatch
 import re
-import utm
 import numpy as np
-from laspy.file import File
-from config import configure
-import geopandas
-from shapely.strtree import STRtree
-from shapely.geometry import Polygon, Point
-from geopandas import GeoSeries
+from las_reader import LasChunkReader
+from tile_catalog import TileCatalog
+from tile_cache import TileCache
+from artifact_cache import ArtifactCache
+from boundary import CampusBoundary, TileBoundaryState
+from settings import LabelledSettings
+from dataclasses import asdict
 from pathlib import Path
 
+
 class LiDARIndexType(IntEnum):
     UNCLASSIFIED = 1
     BARE_EARTH_AND_LOW_GRASS = 2
@@ -40,6 +41,7 @@ class LasFile:
         self._point_y = np.array([])
         # self.point_z = None
         self.valid = False
+        self.boundary_state = TileBoundaryState.STRADDLING
 
     @property
     def point_x(self):
@@ -89,38 +91,63 @@ class PreProcessor:
     """preprocessing class that will extract point in x, y coordinate from the las file,
     and transform them relative to the tile at the corner, so that the whole map are using
     the same utm coordinate.
+
+    Args:
+        data_dir (str): folder with the las files
+        settings (LabelledSettings, optional): the settings of the run. Defaults to the labelled config.
     """
 
-    def __init__(self, data_dir):
+    def __init__(self, data_dir, settings=None):
+        # the settings are pickled with the pre processor, so the workers extract with the same settings
+        self.settings = LabelledSettings.from_config(configure) if settings is None else settings
         self.data_dir = data_dir
         self.lasfile_list = None
+        self.tile_catalog = None
         self.min_east = None  # the most west tile
         self.min_north = None  # the most south tile
         self.min_filepath = None
-        
+        self._campus_boundary = None
+        self.tile_cache = TileCache(self.settings.paths.tile_cache_dir)
+
         # check the folder structures
-        Path(configure.get("Constants", "data_folder_path")).mkdir(parents=True, exist_ok=True)
-        Path(configure.get("Constants", "tests_folder_path")).mkdir(parents=True, exist_ok=True)
+        Path(self.settings.paths.data_folder_path).mkdir(parents=True, exist_ok=True)
+        Path(self.settings.paths.tests_folder_path).mkdir(parents=True, exist_ok=True)
         
         self.collect_las_file_from_folder()
 
         self.__find_the_corner_tile()
 
     
+    @staticmethod
+    def open_tile_catalog(data_dir, paths):
+        """Open the tile catalog kept in a data folder
+
+        Args:
+            data_dir (str): folder with the las files
+            paths (PathSettings): the name of the catalog file and the extension of the las files
+
+        Returns:
+            TileCatalog: the catalog, call refresh() to bring it up to date with the folder
+        """
+        return TileCatalog(
+            data_dir,
+            catalog_file_name=paths.tile_catalog_file_name,
+            extension=paths.las_ext,
+        )
+
     def collect_las_file_from_folder(self, new_path=None):
         """Collect all the las file from the input folder. It will only look
-        for .las extension.
+        for .las extension. The headers are read once and kept in the folder's tile catalog,
+        so only new or modified files are opened.
         """
-        self.lasfile_list = []
         path = self.data_dir
         if new_path is not None:
             path = new_path
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                if file.endswith(configure.get("Constants", "las_ext")):
-                    file_path = os.path.join(root, file)
-                    self.lasfile_list.append(LasFile(file_path))
-        if configure.getboolean("Configure", "debug"):
+        self.tile_catalog = PreProcessor.open_tile_catalog(path, self.settings.paths)
+        self.tile_catalog.refresh()
+        self.lasfile_list = [LasFile(file_path)
+                             for file_path in self.tile_catalog.file_paths()]
+        if self.settings.debug:
             print("Found total of %d LAS files." % (len(self.lasfile_list)))
         return len(self.lasfile_list)
 
@@ -135,12 +162,128 @@ class PreProcessor:
                 self.min_filepath = las_file.file_path
                 self.min_east = las_file.east
                 self.min_north = las_file.north
-        if configure.getboolean("Configure", "debug"):
+        if self.settings.debug:
             print(
                 "The corner tile is file %s at %d %d"
                 % (self.min_filepath, self.min_east, self.min_north)
             )
 
+    @property
+    def campus_boundary(self):
+        """The campus boundary in the same relative frame as the extracted points"""
+        if self._campus_boundary is None:
+            self._campus_boundary = CampusBoundary(
+                self.settings.paths.boundary_geojson_file_path, self.min_east, self.min_north)
+        return self._campus_boundary
+
+    def points_key(self, lasfile_list):
+        """Key of the campus points extracted from tiles. It covers the content of the tiles and
+        of the boundary file, the down sampling parameters and the frame of the points.
+
+        Args:
+            lasfile_list (list): the LasFile objects the points are extracted from
+
+        Returns:
+            str: the artifact key of the points
+        """
+        return ArtifactCache.key(
+            "boundary_filter",
+            self.tile_catalog.content_hashes([las_file.file_path for las_file in lasfile_list]) +
+            [ArtifactCache.file_hash(self.settings.paths.boundary_geojson_file_path)],
+            {
+                "down_sample": self.__down_sample_parameters(),
+                "index_type": int(LiDARIndexType.HIGH_VEGETATION),
+                "min_east": int(self.min_east),
+                "min_north": int(self.min_north),
+            })
+
+    def tile_extent(self, las_file):
+        """The extent of a tile in the relative frame, from its catalogued header or else its file name
+
+        Args:
+            las_file (LasFile): the tile
+
+        Returns:
+            (float, float, float, float): min x, min y, max x, max y in the relative frame
+        """
+        frame = self.settings.frame
+        entry = self.tile_catalog.entry(las_file.file_path)
+        if entry is not None:
+            # header bounds are in metres, the frame is in centimetres from the corner tile
+            return (
+                entry["min"][0] * 100 - self.min_east * frame.tile_scale,
+                entry["min"][1] * 100 - self.min_north * frame.tile_scale,
+                entry["max"][0] * 100 - self.min_east * frame.tile_scale,
+                entry["max"][1] * 100 - self.min_north * frame.tile_scale,
+            )
+        min_x = (las_file.east - self.min_east) * frame.tile_scale
+        min_y = (las_file.north - self.min_north) * frame.tile_scale
+        return (
+            min_x,
+            min_y,
+            min_x + frame.tile_max_size,
+            min_y + frame.tile_max_size,
+        )
+
+    def classify_tiles_against_boundary(self):
+        """Classify every tile as inside, outside or straddling the campus boundary,
+        so that tiles outside are never read and tiles inside skip the per point test.
+
+        Returns:
+            list: the tiles that are not fully outside of the campus
+        """
+        tiles_on_campus = []
+        for las_file in self.lasfile_list:
+            las_file.boundary_state = self.campus_boundary.classify_extent(
+                *self.tile_extent(las_file))
+            if las_file.boundary_state == TileBoundaryState.OUTSIDE:
+                las_file.valid = False
+            else:
+                tiles_on_campus.append(las_file)
+
+        if self.settings.debug:
+            for state in TileBoundaryState:
+                print("%d tiles %s the campus boundary" % (
+                    len([las_file for las_file in self.lasfile_list if las_file.boundary_state == state]),
+                    state.name.lower()))
+        return tiles_on_campus
+
+    def filter_out_of_campus_tiles(self, lasfile_list):
+        """Collect the points of the pre processed tiles that are within campus.
+        Only the tiles straddling the boundary go through the point in polygon test.
+
+        Args:
+            lasfile_list (list): pre processed LasFile objects
+
+        Returns:
+            filtered_x, filtered_y: x, y array of all the tiles with out of campus points removed.
+        """
+        filtered_x, filtered_y = [np.array([], dtype=np.int32)], [np.array([], dtype=np.int32)]
+        skipped_points, tested_points = 0, 0
+        for las_file in lasfile_list:
+            if not las_file.valid:
+                continue
+            if las_file.boundary_state == TileBoundaryState.INSIDE:
+                skipped_points += las_file.point_x.shape[0]
+                filtered_x.append(las_file.point_x.astype(np.int32))
+                filtered_y.append(las_file.point_y.astype(np.int32))
+            else:
+                tested_points += las_file.point_x.shape[0]
+                point_x, point_y = self.filter_out_of_campus_points(
+                    las_file.point_x, las_file.point_y)
+                filtered_x.append(point_x)
+                filtered_y.append(point_y)
+
+        if self.settings.debug:
+            unread_points = sum(
+                self.tile_catalog.entry(las_file.file_path)["point_count"] for las_file in lasfile_list
+                if las_file.boundary_state == TileBoundaryState.OUTSIDE)
+            print("boundary pruning: %d points in tiles outside campus were never read, "
+                  "%d points in tiles inside campus skipped the boundary test, "
+                  "%d points in straddling tiles were tested" % (unread_points, skipped_points, tested_points))
+
+        return np.concatenate(filtered_x), np.concatenate(filtered_y)
+
     def filter_out_of_campus_points(self, whole_campus_x, whole_campus_y):
         """pre processing function to remove all the points that are not within campus. 
 
@@ -149,45 +292,17 @@ class PreProcessor:
             whole_campus_y (np.array): y "utm" coordinate in integer (north axis)
 
         Returns:
-            filtered_x, filtered_y: x, y array with out of campus points removed. 
+            filtered_x, filtered_y: x, y array with out of campus points removed, as int32 like the
+            points in the point store, so the artifacts keyed on them are shared by both
         """
-        if configure.getboolean("Configure", "debug"):
+        if self.settings.debug:
             print("filtering points that are not within campus...")
 
-        # open the campus boundary geojson file and read it as a polygon
-        file = open(configure.get("Constants", "boundary_geojson_file_path"))
-        df = geopandas.read_file(file)
-
-        # translate utm to geographic
-        lat = (whole_campus_x / 100.0) + self.min_east * 100
-        lon = (whole_campus_y / 100.0) + self.min_north * 100
-        raw_geo = utm.to_latlon(lat, lon, 10, "U")
-
-        # map 2d array to shapely points
-        stacked = np.vstack((raw_geo[1], raw_geo[0])).T
-        s = GeoSeries(map(Point, stacked))
-
-        # query the points for faster processing.
-        # according to https://stackoverflow.com/questions/62280398/checking-if-a-point-is-contained-in-a-polygon-multipolygon-for-many-points
-        tree = STRtree(s)
-        # we have to do a if check after query, according to the post
-        res = [o for o in tree.query(
-            df.geometry[0]) if df.geometry[0].contains(o)]
-
-        # translate from geographic to utm
-        filtered_stacked = np.zeros((len(res), 2))
-        count = 0
-        for point in res:
-            filtered_stacked[count, :] = np.asarray(point.xy).reshape(1, 2)
-            count += 1
-        raw_utm = utm.from_latlon(
-            filtered_stacked[:, 1], filtered_stacked[:, 0])
-        filtered_x = (raw_utm[0] - self.min_east * 100) * 100
-        filtered_y = (raw_utm[1] - self.min_north * 100) * 100
-        filtered_x = filtered_x.astype(int)
-        filtered_y = filtered_y.astype(int)
-
-        if configure.getboolean("Configure", "debug"):
+        mask = self.campus_boundary.contains(whole_campus_x, whole_campus_y)
+        filtered_x = whole_campus_x[mask].astype(np.int32)
+        filtered_y = whole_campus_y[mask].astype(np.int32)
+
+        if self.settings.debug:
             print("filtering completed.")
 
         return filtered_x, filtered_y
@@ -207,59 +322,176 @@ class PreProcessor:
         Returns:
             np.array, np.array: the transformed points in x frame, the transformed points in y frame.
         """
-        if configure.getboolean("Configure", "debug"):
-            print("Loading file %s." % (las_file.file_path))
+        x_transformed, y_transformed = self.extract_relative_las_data_by_class(
+            las_file, [index_type])[index_type]
+        if x_transformed.shape[0] == 0:
+            raise LookupError
+        return x_transformed, y_transformed
 
-        inFile = File(las_file.file_path, mode="r")
+    def extract_relative_las_data_by_class(self, las_file, index_types):
+        """Extract the points of several classes from a single read of the las file,
+        and transform them relative to the minium utm coordinate
 
-        I = inFile.Classification == index_type
+        Args:
+            las_file (LasFile): input las file object
+            index_types (iterable): the LiDARIndexType values to extract
 
-        test = inFile.points[I]
+        Returns:
+            dict: (x, y) transformed points keyed by the given index types, empty arrays for the classes not in the tile
+        """
+        index_types = list(index_types)
+
+        # the points of a class come from the cache as long as the tile and the down sampling did not change
+        content_hash = self.tile_catalog.content_hashes([las_file.file_path])[0]
+        cache_keys = {index_type: TileCache.key(content_hash, index_type, self.__down_sample_parameters())
+                      for index_type in index_types}
+        sampled = {}
+        for index_type in index_types:
+            cached = self.tile_cache.load(cache_keys[index_type])
+            if cached is not None:
+                sampled[index_type] = cached
+        missing_types = [
+            index_type for index_type in index_types if index_type not in sampled]
+
+        if len(missing_types) > 0:
+            if self.settings.debug:
+                print("Loading file %s." % (las_file.file_path))
+
+            # stream the tile in chunks and only keep the classified points of each chunk,
+            # so that the whole tile is never held in memory
+            reader = LasChunkReader(
+                las_file.file_path, chunk_size=self.settings.chunk_size)
+            x_chunks = {index_type: [] for index_type in missing_types}
+            y_chunks = {index_type: [] for index_type in missing_types}
+            for chunk in reader.iter_classified(missing_types):
+                for index_type in missing_types:
+                    mask = chunk["classification"] == index_type
+                    if np.any(mask):
+                        x_chunks[index_type].append(chunk["X"][mask])
+                        y_chunks[index_type].append(chunk["Y"][mask])
+
+            for index_type in missing_types:
+                x = np.concatenate(
+                    [np.array([], dtype=np.int32)] + x_chunks[index_type])
+                y = np.concatenate(
+                    [np.array([], dtype=np.int32)] + y_chunks[index_type])
+                sampled[index_type] = self.__down_sample(
+                    las_file, index_type, x, y)
+                self.tile_cache.save(
+                    cache_keys[index_type], *sampled[index_type])
+        elif self.settings.debug:
+            print("Loaded file %s from the tile cache." % (las_file.file_path))
+
+        return {index_type: self.__transform_to_relative(las_file, *sampled[index_type])
+                for index_type in index_types}
+
+    def __down_sample_parameters(self):
+        """Every parameter the down sampled points of a tile depend on"""
+        # as the ini text, so the keys of the tiles cached before the settings stay the same
+        return {name: str(value) for name, value in asdict(self.settings.down_sample).items()}
+
+    def __down_sample(self, las_file, index_type, x, y):
+        """Down sample the points of one class of a tile if there are too many points to speed up the processing
 
-        if test.shape[0] == 0:
-            raise LookupError
+        Args:
+            las_file (LasFile): the tile the points belong to
+            index_type (LiDARIndexType): the class of the points
+            x (np.array): raw X coordinate of the points
+            y (np.array): raw Y coordinate of the points
 
-        sample = test
-        if test.shape[0] > configure.getint("Parameters", "min_points_for_downsize"):
-            # down sample the point cloud if there are too many points to speed up the processing
-            sample = np.random.choice(
-                test, int(
-                    test.shape[0] / configure.getint("Parameters", "down_size"))
+        Returns:
+            np.array, np.array: the kept x and y
+        """
+        down_sample = self.settings.down_sample
+        if x.shape[0] <= down_sample.min_points_for_downsize:
+            return x, y
+        # seeded per tile and class so that the same tile always gives the same points
+        rng = np.random.default_rng(
+            [down_sample.downsample_seed, las_file.east, las_file.north, int(index_type)])
+        if down_sample.downsample_mode == "grid":
+            down_sample_index = grid_downsample_index(
+                x, y,
+                down_sample.grid_cell_size,
+                down_sample.max_points_per_cell,
+                rng,
+            )
+        else:
+            down_sample_index = rng.choice(
+                x.shape[0], int(x.shape[0] / down_sample.down_size), replace=False
             )
-        # if test.shape[0] > configure.getint('Parameters', 'MIN_POINTS_FOR_DOWNSIZE'):
-        #     # down sample the point cloud if there are too many points to speed up the processing
-        #     reduce_to_ideal_size = lambda x : int(x) if x <= configure.getint('Parameters', 'MIN_POINTS_FOR_DOWNSIZE') else reduce_to_ideal_size(x/10)
-        #     desired_size = reduce_to_ideal_size(test.shape[0])
-        #     print("Down size to %d from %d" % (desired_size, test.shape[0]))
-        #     sample = np.random.choice(test, desired_size)
-
-        x = np.zeros(sample.shape[0])
-        y = np.zeros(sample.shape[0])
-        z = np.zeros(sample.shape[0])
-
-        for i in np.arange(0, sample.shape[0]):
-            x[i] = sample[i][0][0]
-            y[i] = sample[i][0][1]
-            z[i] = sample[i][0][2]
+        return x[down_sample_index], y[down_sample_index]
+
+    def __transform_to_relative(self, las_file, x, y):
+        """Transform the raw integer LAS coordinates of a tile relative to the corner tile
+
+        Args:
+            las_file (LasFile): the tile the points belong to
+            x (np.array): raw X coordinate of the points
+            y (np.array): raw Y coordinate of the points
 
+        Returns:
+            np.array, np.array: the transformed points in x frame, the transformed points in y frame.
+        """
         # scale the map to 0-10k
         # the reason for scaling is to save points as integer, and avoid large number, so that the clustering is faster.
-        x_min = (
-            las_file.east - configure.getint("Constants", "east_offset")
-        ) * configure.getint("Constants", "tile_scale")
-        y_min = (
-            las_file.north - configure.getint("Constants", "north_offset")
-        ) * configure.getint("Constants", "tile_scale")
+        frame = self.settings.frame
+        x_min = (las_file.east - frame.east_offset) * frame.tile_scale
+        y_min = (las_file.north - frame.north_offset) * frame.tile_scale
 
-        x_scaled = x - x_min
-        y_scaled = y - y_min
+        x_scaled = x.astype(np.float64) - x_min
+        y_scaled = y.astype(np.float64) - y_min
 
         # transform the points relative to the min_east and north
-        x_transformed = x_scaled + (las_file.east - self.min_east) * configure.getint(
-            "Constants", "tile_scale"
-        )
-        y_transformed = y_scaled + (las_file.north - self.min_north) * configure.getint(
-            "Constants", "tile_scale"
-        )
+        x_transformed = x_scaled + (las_file.east - self.min_east) * frame.tile_scale
+        y_transformed = y_scaled + (las_file.north - self.min_north) * frame.tile_scale
 
         return x_transformed, y_transformed
+
+
+def grid_downsample_index(x, y, cell_size, max_points_per_cell, rng):
+    """Thin the points on a ground grid, keeping at most max_points_per_cell random points per cell.
+    Sparse areas keep all their points while dense canopy is capped to the target density.
+
+    Args:
+        x (np.array): x of the points
+        y (np.array): y of the points
+        cell_size (int): width of a grid cell, in the unit of the points
+        max_points_per_cell (int): the most points kept in a cell
+        rng (np.random.Generator): random generator picking the kept points within a cell
+
+    Returns:
+        np.array: sorted indices of the points to keep
+    """
+    cell_x = np.floor_divide(x, cell_size).astype(np.int64)
+    cell_y = np.floor_divide(y, cell_size).astype(np.int64)
+    cell_x -= cell_x.min()
+    cell_y -= cell_y.min()
+    cell = cell_x * (cell_y.max() + 1) + cell_y
+    # shuffle, then a stable sort by cell keeps the points of a cell in random order
+    shuffle = rng.permutation(x.shape[0])
+    order = shuffle[np.argsort(cell[shuffle], kind="stable")]
+    cell = cell[order]
+    new_cell = np.ones(x.shape[0], dtype=bool)
+    new_cell[1:] = cell[1:] != cell[:-1]
+    cell_start = np.flatnonzero(new_cell)
+    # rank of each point within its cell
+    rank = np.arange(x.shape[0]) - np.repeat(cell_start, np.diff(np.append(cell_start, x.shape[0])))
+    return np.sort(order[rank < max_points_per_cell])
+
+
+def extract_compact_las_data(pre_processor, las_file):
+    """Extract the relative points of one tile as compact arrays, used as the ingestion worker.
+
+    Args:
+        pre_processor (PreProcessor): pre processor holding the corner tile
+        las_file (LasFile): the tile to extract
+
+    Returns:
+        (np.array, np.array) or None: the relative x and y in int32 centimetres, None if the tile has no high vegetation
+    """
+    try:
+        point_x, point_y = pre_processor.extract_relative_las_data(las_file)
+    except LookupError:
+        return None
+    # the relative coordinates are whole centimetres within the map, so int32 is lossless
+    return point_x.astype(np.int32), point_y.astype(np.int32)
@@ -1,45 +1,79 @@
-from sklearn.cluster import DBSCAN
 import numpy as np
 import time
 import uuid
 import geojson
-import alphashape
-import utm
 from tqdm import tqdm
 from config import configure
-from pre_processing import PreProcessor
-import pandas as pd
-import os
+from pre_processing import PreProcessor, extract_compact_las_data
+from point_store import PointStore
+from clustering import dbscan_labels, ClusterIndex, DBSCANSweep
+from hull import concave_hull, reduced_concave_hull
+from projection import relative_rings_to_lonlat
+from geojson_writer import GeoJSONStreamWriter
+from polygon_binary import is_binary_path, write_polygon_features
+from simplification import SimplificationReport, simplify_polygons
+from artifact_cache import ArtifactCache, concatenate_polygon_arrays, polygons_from_arrays, polygons_to_arrays
+from instrumentation import RunInstrumentation
+from settings import LabelledSettings
 import argparse
+import multiprocessing
+from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
+
+# batches per worker of the polygon stage, more batches balance better but cost more overhead
+POLYGON_BATCHES_PER_WORKER = 4
+# polygons projected to geographic coordinates together
+FEATURE_BATCH_SIZE = 1000
 
 
 class ProcessingPipeline:
     """The main LiDAR processing pipeline that contains the preprocessing and processing stages.
 
+    Every stage reads its parameters from the settings the pipeline was made with, not from
+    the global config, so pipelines with different settings can run side by side.
+
     Args:
-        CONSTANT (class): Global constant class
+        notebook (bool, optional): do not parse the command line. Defaults to False.
+        settings (LabelledSettings, optional): the settings of the run. Defaults to the labelled config.
     """
 
-    def __init__(self, notebook=False):
+    def __init__(self, notebook=False, settings=None):
+        self.settings = LabelledSettings.from_config(configure) if settings is None else settings
         self.processing_time = 0
         self.pre_processor = None
         self.whole_campus_polygon_features = []
-        self.reload = True
+        self.reload = False
+        self.points_key = None
+        self.artifact_cache = ArtifactCache(self.settings.paths.artifact_cache_dir)
         self.whole_campus_x = np.array([])
         self.whole_campus_y = np.array([])
+        self.simplification_report = None
+        # keep the neighbour graph of the points, so a smaller eps or another min_sample only relinks it
+        self.reuse_neighbour_graph = False
+        self.dbscan_sweep = None
+        self.instrumentation = RunInstrumentation("labelled")
         if not notebook:
             parser = argparse.ArgumentParser(
                 prog="TREESAP labelled LiDAR processing pipeline",
                 description="Process indexed UBC LiDAR data",
             )
+            parser.add_argument(
+                "--rebuild",
+                help="Extract the points from the raw .las files again even if the point store holds the points of the current tiles and parameters. "
+                "By default the stored points are reused whenever they are current.",
+                action="store_true",
+            )
             parser.add_argument(
                 "--load",
-                help="Load points from .pkl file instead of from raw .las file. By default we will not load from .pkl file.",
+                help="Deprecated, the stored points are now reused by default. Kept so existing invocations still run.",
                 action="store_true",
             )
             args = parser.parse_args()
             parser.print_help()
-            self.reload = not args.load
+            if args.load:
+                print("--load is deprecated, the stored points are reused whenever they are current, use --rebuild to extract them again")
+            self.reload = args.rebuild
 
     def pre_process_las_files(self, data_dir):
         """preprocess the las file by extracting all the points, and save them into LasFile objects.
@@ -47,22 +81,42 @@ class ProcessingPipeline:
         Args:
             data_dir (str): the source directory path
         """
-        self.pre_processor = PreProcessor(data_dir)
-        # check if we don't need to reload and pkl file already exist
-        if not self.reload:
+        self.pre_processor = PreProcessor(data_dir, self.settings)
+        # tiles fully outside of campus are not even read
+        lasfile_list = self.pre_processor.classify_tiles_against_boundary()
+        # hash the tiles once up front, workers only look the hashes up to find their cached points
+        self.points_key = self.pre_processor.points_key(lasfile_list)
+        # the tiles are not read at all if the point store holds the points of these tiles and parameters
+        if not self.reload and self.stored_points_are_current(
+                PointStore(self.settings.paths.point_store_path)):
             return
-        for las_file in self.pre_processor.lasfile_list:
-            try:
-                (
-                    las_file.point_x,
-                    las_file.point_y,
-                ) = self.pre_processor.extract_relative_las_data(las_file)
-                las_file.valid = True
-            except LookupError:
-                if configure.getboolean("Configure", "DEBUG"):
-                    print("No trees are classified on the tile")
+        workers = self.settings.workers
+        # the classes are filtered and down sampled chunk by chunk while the tiles are read, so it is one stage
+        with self.instrumentation.stage("tile_read", points_in=sum(
+                self.pre_processor.tile_catalog.entry(las_file.file_path)["point_count"]
+                for las_file in lasfile_list)) as record:
+            if workers == 1 or len(lasfile_list) <= 1:
+                results = [extract_compact_las_data(
+                    self.pre_processor, las_file) for las_file in lasfile_list]
+            else:
+                # each worker extracts one tile, map keeps the results in the tile order.
+                # The workers are started like the polygon workers, fork is not safe from the GUI threads
+                context = multiprocessing.get_context(self.settings.start_method)
+                with ProcessPoolExecutor(max_workers=workers if workers > 0 else None, mp_context=context) as executor:
+                    results = list(executor.map(
+                        extract_compact_las_data, repeat(self.pre_processor), lasfile_list))
+            record.points_out += sum(result[0].shape[0] for result in results if result is not None)
+
+        for las_file, result in zip(lasfile_list, results):
+            if result is None:
+                if self.settings.debug:
+                    print("No trees are classified on the tile %s" %
+                          (las_file.file_path))
                 las_file.valid = False
-        if configure.getboolean("Configure", "debug"):
+            else:
+                las_file.point_x, las_file.point_y = result
+                las_file.valid = True
+        if self.settings.debug:
             print("Complete loading LAS files")
 
     def collect_points_from_map(self):
@@ -72,39 +126,141 @@ class ProcessingPipeline:
             [type]: [description]
         """
 
-        if not self.reload and os.path.exists(
-            configure.get("Constants", "pkl_file_path")
-        ):
-            # load the data from pkl if we choose not to reload, and the data file exists
-            points = self.load_points_from_pkl()
-            self.whole_campus_x = points[:, 0].T
-            self.whole_campus_y = points[:, 1].T
-            if configure.getboolean("Configure", "debug"):
+        point_store = PointStore(self.settings.paths.point_store_path)
+        if not self.reload and self.stored_points_are_current(point_store):
+            # map the stored points if they are current, the arrays are views of the files
+            with self.instrumentation.stage("boundary_filter") as record:
+                self.whole_campus_x, self.whole_campus_y = self.load_points(point_store)
+                record.cache_hits += 1
+                record.points_out += self.whole_campus_x.shape[0]
+            if self.settings.debug:
                 print("Loaded points from data file")
         else:
-            if configure.getboolean("Configure", "debug"):
+            if self.settings.debug:
                 print("Reloading points from LAS files")
-            all_point_x = np.array([])
-            all_point_y = np.array([])
-
-            # extract all the points from pre processed files
-            for las_file in self.pre_processor.lasfile_list:
-                if las_file.valid:
-                    all_point_x = np.append(all_point_x, las_file.point_x)
-                    all_point_y = np.append(all_point_y, las_file.point_y)
-
-            # remove points that are out of boundary
-            self.whole_campus_x, self.whole_campus_y = self.pre_processor.filter_out_of_campus_points(
-                all_point_x, all_point_y)
-            if configure.getboolean("Configure", "debug"):
+            # collect the points within campus, only tiles straddling the boundary are filtered point by point
+            with self.instrumentation.stage("boundary_filter", points_in=sum(
+                    las_file.point_x.shape[0] for las_file in self.pre_processor.lasfile_list
+                    if las_file.valid)) as record:
+                self.whole_campus_x, self.whole_campus_y = self.pre_processor.filter_out_of_campus_tiles(
+                    self.pre_processor.lasfile_list)
+                record.points_out += self.whole_campus_x.shape[0]
+            if self.settings.debug:
                 print("Saving points into data file")
-            self.save_points_as_pkl(
-                np.vstack((self.whole_campus_x, self.whole_campus_y)).T)
+            with self.instrumentation.stage("point_store_save", points_in=self.whole_campus_x.shape[0]):
+                self.save_points(point_store)
 
-            if configure.getboolean("Configure", "debug"):
+            if self.settings.debug:
                 print("Reloaded points from LAS file")
         return self.whole_campus_x, self.whole_campus_y
 
+    def stored_points_are_current(self, point_store):
+        """Whether the point store holds the points of the current tiles and parameters
+
+        Args:
+            point_store (PointStore): the store to check
+
+        Returns:
+            bool: True if the stored points can be used
+        """
+        try:
+            _, _, metadata = point_store.load()
+        except LookupError:
+            return False
+        if metadata.get("key") != self.points_key:
+            if self.settings.debug:
+                print("The stored points were extracted from other tiles or parameters")
+            return False
+        return True
+
+    def cluster_points(self, point_x, point_y):
+        """Cluster the points with DBSCAN on the configured backend. The labels are kept in the
+        artifact cache, so the same points are only clustered again when eps or min_sample change.
+
+        Args:
+            point_x (np.array): points in relative x frame
+            point_y (np.array): points in relative y frame
+
+        Returns:
+            np.array: cluster label of every point, -1 for noise
+        """
+        return self.__cluster_stage(point_x, point_y)[0]
+
+    def __cluster_stage(self, point_x, point_y):
+        """the cluster labels of the points and their artifact key"""
+        # every backend gives the same clusters, so only eps and min_sample are in the key
+        cluster = self.settings.cluster
+        points_hash = ArtifactCache.array_hash(point_x, point_y)
+        key = ArtifactCache.key(
+            "cluster_labels", [points_hash], {"eps": cluster.eps, "min_sample": cluster.min_sample})
+        with self.instrumentation.stage("clustering", points_in=point_x.shape[0]) as record:
+            cached = self.artifact_cache.load("cluster_labels", key)
+            if cached is not None:
+                if self.settings.debug:
+                    print("Loaded the cluster labels from the artifact cache")
+                labels = cached["labels"]
+                record.cache_hits += 1
+            elif self.reuse_neighbour_graph:
+                sweep = self.neighbour_graph(point_x, point_y, cluster.eps, points_hash)
+                labels = sweep.labels(cluster.eps, cluster.min_sample)
+                self.artifact_cache.save("cluster_labels", key, labels=labels)
+            else:
+                labels = dbscan_labels(
+                    point_x,
+                    point_y,
+                    eps=cluster.eps,
+                    min_samples=cluster.min_sample,
+                    backend=cluster.dbscan_backend,
+                    tile_size=cluster.cluster_tile_size,
+                    workers=self.settings.workers,
+                    start_method=self.settings.start_method,
+                )
+                self.artifact_cache.save("cluster_labels", key, labels=labels)
+            record.points_out += int(np.count_nonzero(labels >= 0))
+        return labels, key
+
+    def neighbour_graph(self, point_x, point_y, eps, points_hash=None):
+        """The DBSCAN sweep of the points, built again only if the points change or eps is larger
+        than the graph. A new graph is built up to sweep_max_eps, so the eps can be tuned without it.
+
+        Args:
+            point_x (np.array): points in relative x frame
+            point_y (np.array): points in relative y frame
+            eps (float): the largest eps the graph has to cover
+            points_hash (str, optional): the hash of the points if already known. Defaults to None.
+
+        Returns:
+            DBSCANSweep: the sweep of the points
+        """
+        if points_hash is None:
+            points_hash = ArtifactCache.array_hash(point_x, point_y)
+        if self.dbscan_sweep is None or not self.dbscan_sweep.covers(eps, points_hash):
+            with self.instrumentation.stage("neighbour_graph", points_in=point_x.shape[0]) as record:
+                self.dbscan_sweep = DBSCANSweep(
+                    point_x, point_y, max(eps, self.settings.cluster.sweep_max_eps), key=points_hash)
+                record.points_out += self.dbscan_sweep.pair_count
+        return self.dbscan_sweep
+
+    def sweep_dbscan_parameters(self, eps_values, min_sample_values, point_x=None, point_y=None):
+        """Cluster the points with every combination of eps and min_sample on one neighbour graph
+
+        Args:
+            eps_values (list): the eps to try
+            min_sample_values (list): the min_sample to try
+            point_x (np.array, optional): points in relative x frame. Defaults to the collected points.
+            point_y (np.array, optional): points in relative y frame. Defaults to the collected points.
+
+        Returns:
+            list: the SweepResult of every setting, with cluster counts, noise fraction and polygon areas
+        """
+        if point_x is None or point_y is None:
+            point_x, point_y = self.whole_campus_x, self.whole_campus_y
+        sweep = self.neighbour_graph(point_x, point_y, max(eps_values))
+        with self.instrumentation.stage("dbscan_sweep", points_in=point_x.shape[0]) as record:
+            results = sweep.sweep(eps_values, min_sample_values)
+            record.points_out += len(results)
+        return results
+
     def extract_polygon_features(self, point_x=None, point_y=None, callback=None):
         """Extract polygons from given p oints
 
@@ -115,6 +271,20 @@ class ProcessingPipeline:
         Returns:
             polygons (list): list of geojson polygon features
         """
+        return list(self.iter_polygon_features(point_x, point_y, callback))
+
+    def iter_polygon_features(self, point_x=None, point_y=None, callback=None):
+        """Extract polygons from given points, yielding the features in cluster order as soon
+        as their clusters are built, so they can be written out without holding all of them
+
+        Args:
+            point_x (np.array): points in relative x frame
+            point_y (np.array): points in relative y frame
+            callback (function, optional): called with the number of finished clusters and the total. Defaults to None.
+
+        Yields:
+            geojson.Feature: geojson polygon feature
+        """
         points = None
         if point_x is not None and point_y is not None:
             points = np.vstack((point_x, point_y)).T
@@ -124,71 +294,110 @@ class ProcessingPipeline:
         start_time = time.perf_counter()
 
         # Cluster the points based on paramters
-        clustering = DBSCAN(
-            eps=configure.getfloat("Parameters", "eps"),
-            min_samples=configure.getfloat("Parameters", "min_sample"),
-            n_jobs=-1,
-        ).fit(points)
+        labels, cluster_key = self.__cluster_stage(points[:, 0], points[:, 1])
 
         end_time = time.perf_counter()
         self.processing_time += end_time - start_time
 
-        if configure.getboolean("Configure", "debug"):
+        with self.instrumentation.stage("cluster_index"):
+            clusters = ClusterIndex(labels, points[:, 0], points[:, 1])
+        if self.settings.debug:
             print(
                 "Clustering took %f seconds, found %d clusters"
-                % (self.processing_time, np.amax(clustering.labels_))
+                % (self.processing_time, len(clusters))
             )
 
-        polygons = []
-
-        # set up a progress bar
-        for i in tqdm(np.arange(np.amax(clustering.labels_))):
+        self.simplification_report = self.__new_simplification_report()
+        polygon_key = ArtifactCache.key("polygons", [cluster_key], asdict(self.settings.hull))
+        with self.instrumentation.stage("hull") as record:
+            cached = self.artifact_cache.load("polygons", polygon_key)
+            if cached is not None:
+                coordinates, offsets = cached["coordinates"], cached["offsets"]
+                record.cache_hits += 1
+                record.points_in += int(clusters.sizes.sum())
+                record.points_out += offsets.shape[0] - 1
+        if cached is not None:
+            if self.settings.debug:
+                print("Loaded the polygons from the artifact cache")
             if callback is not None:
-                callback(i, np.amax(clustering.labels_))
-            x_cluster = points[:, 0][np.where(clustering.labels_ == i)]
-            y_cluster = points[:, 1][np.where(clustering.labels_ == i)]
-            sample = np.vstack((x_cluster, y_cluster)).T
-
-            alpha_opt = configure.getfloat("Constants", "default_alpha_shape")
-            alpha_shape = alphashape.alphashape(sample, alpha_opt)
+                callback(len(clusters), len(clusters))
+            # only a batch of the polygons is unpacked at a time
+            for start in range(0, offsets.shape[0] - 1, FEATURE_BATCH_SIZE):
+                yield from self.__get_polygon_features(
+                    polygons_from_arrays(coordinates, offsets[start:start + FEATURE_BATCH_SIZE + 1]))
+        else:
+            # the polygons are packed batch by batch, so only the flat arrays of the cache are kept
+            packed = []
+            batch = []
+            for cluster, polygons_of_cluster in self.instrumentation.iterate(
+                    "hull", self.iter_cluster_polygons(clusters, callback)):
+                batch.extend(polygons_of_cluster)
+                if len(batch) >= FEATURE_BATCH_SIZE:
+                    packed.append(polygons_to_arrays(batch))
+                    yield from self.__get_polygon_features(batch)
+                    batch = []
+            packed.append(polygons_to_arrays(batch))
+            yield from self.__get_polygon_features(batch)
+            arrays = concatenate_polygon_arrays(packed)
+            record = self.instrumentation.record("hull")
+            record.points_in += int(clusters.sizes.sum())
+            record.points_out += arrays["offsets"].shape[0] - 1
+            # only a run that built every polygon is cached
+            self.artifact_cache.save("polygons", polygon_key, **arrays)
+        self.__record_simplification_report()
+
+    def iter_cluster_polygons(self, clusters, callback=None):
+        """Build the polygons of every cluster on a pool of worker processes.
+
+        The clusters are cut into batches of about the same number of points, and the batches
+        with the largest clusters are submitted first so they do not finish last. Finished
+        clusters are held back until every cluster before them is done, so the polygons
+        always come out in cluster order.
+        The workers get the hull settings explicitly instead of from the globals, so they can be
+        spawned rather than forked, which is the only safe start method while the Qt GUI runs its threads.
 
-            # # ignore the polygons that are too big
-            if alpha_shape.area > configure.getint("Parameters", "max_polygon_area"):
-                continue
+        Args:
+            clusters (ClusterIndex): the clustered points
+            callback (function, optional): called with the number of finished clusters and the total. Defaults to None.
 
-            # optimize the alpha for polygons in fitting size
-            if alpha_shape.area > configure.getint("Parameters", "min_polygon_area"):
-                sample_size = sample.shape[0]
-                """
-                if polygon's area is bigger than an single estimated tree area, that means there are more than one tree in the cluster 
-                In this case, we want to use optimized alpha, and downscale the points to speed up the process
-                """
-                if sample_size > configure.getint("Parameters", "alphashape_reduction"):
-                    reduce_shape_size = (
-                        lambda x: int(x) if x <= configure.getint(
-                            "Parameters", "alphashape_reduction") else reduce_shape_size(x / 10)
-                    )
-                    desired_size = reduce_shape_size(sample_size)
-                    down_sample_index = np.random.choice(
-                        np.arange(sample_size), desired_size
-                    )
-                    # use optimized alpha shape value
-                    alpha_shape = alphashape.alphashape(
-                        sample[down_sample_index])
-
-            if alpha_shape.geom_type == configure.get(
-                "Constants", "alpha_shape_multipolygon_type"
-            ):
-                # sometimes there will be more than one polygons from alpha shape.
-                for each_polyon in alpha_shape:
-                    polygons.append(
-                        self.__get_polygon_from_feature(each_polyon))
-            elif alpha_shape.geom_type == configure.get(
-                "Constants", "alpha_shape_polygon_type"
-            ):
-                polygons.append(self.__get_polygon_from_feature(alpha_shape))
-
-        return polygons
+        Yields:
+            int, list: the cluster label and its shapely polygons
+        """
+        hull = self.settings.hull
+        total = len(clusters)
+        workers = self.settings.workers
+        progress = tqdm(total=total)
+        if workers == 1 or total <= 1:
+            for cluster, sample in enumerate(clusters):
+                polygons = cluster_polygons(sample, hull)
+                progress.update(1)
+                if callback is not None:
+                    callback(cluster + 1, total)
+                yield cluster, polygons
+        else:
+            workers = workers if workers > 0 else multiprocessing.cpu_count()
+            batches = balanced_batches(clusters.sizes, workers * POLYGON_BATCHES_PER_WORKER)
+            context = multiprocessing.get_context(self.settings.start_method)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = [
+                    executor.submit(extract_cluster_polygons,
+                                    [(cluster, clusters[cluster]) for cluster in batch], hull)
+                    for batch in batches
+                ]
+                finished = 0
+                pending = {}
+                next_cluster = 0
+                for future in as_completed(futures):
+                    batch_results = future.result()
+                    pending.update(batch_results)
+                    finished += len(batch_results)
+                    progress.update(len(batch_results))
+                    if callback is not None:
+                        callback(finished, total)
+                    while next_cluster in pending:
+                        yield next_cluster, pending.pop(next_cluster)
+                        next_cluster += 1
+        progress.close()
 
     def extract_forest_polygons_features(self, point_x, point_y):
         """extract only the large forest from the whole map, use manually tuned parameters
@@ -205,119 +414,234 @@ class ProcessingPipeline:
         start_time = time.perf_counter()
 
         # Cluster the points based on paramters
-        clustering = DBSCAN(
-            eps=configure.getfloat("Parameters", "eps"),
-            min_samples=configure.getfloat("Parameters", "min_sample"),
-            n_jobs=-1,
-        ).fit(points)
+        labels = self.cluster_points(points[:, 0], points[:, 1])
 
         end_time = time.perf_counter()
         self.processing_time += end_time - start_time
 
-        if configure.getboolean("Configure", "debug"):
+        clusters = ClusterIndex(labels, points[:, 0], points[:, 1])
+        if self.settings.debug:
             print(
                 "Clustering took %f seconds, found %d clusters"
-                % (self.processing_time, np.amax(clustering.labels_))
+                % (self.processing_time, len(clusters))
             )
 
-        polygons = []
-
         shapely_polygons = []
+        hull = self.settings.hull
 
         # set up a progress bar
 
         max = 0
-        for i in tqdm(np.arange(np.amax(clustering.labels_))):
-            x_cluster = points[:, 0][np.where(clustering.labels_ == i)]
-            y_cluster = points[:, 1][np.where(clustering.labels_ == i)]
-            sample = np.vstack((x_cluster, y_cluster)).T
-
-            if np.unique(sample, axis=0).shape[0] <= configure.getint(
-                "Parameters", "min_size"
-            ):
+        for i in tqdm(np.arange(len(clusters))):
+            sample = clusters[i]
+
+            if np.unique(sample, axis=0).shape[0] <= self.settings.min_size:
                 continue
 
-            alpha_opt = configure.getfloat("Constants", "default_alpha_shape")
-            alpha_shape = alphashape.alphashape(sample, alpha_opt)
+            alpha_opt = hull.default_alpha_shape
+            alpha_shape = concave_hull(sample, alpha_opt)
 
             if alpha_shape.area > max:
                 max = alpha_shape.area
             #                    104204026795
             if alpha_shape.area > 5000000000:
-                sample_size = sample.shape[0]
-                # 6000
-                reduce_to_1000 = (
-                    lambda x: int(x) if x <= 500 else reduce_to_1000(x / 10)
-                )
-                desired_size = reduce_to_1000(sample_size)
-                down_sample_index = np.random.choice(
-                    np.arange(sample_size), desired_size
-                )
-                # use optimized alpha shape value
+                # use optimized alpha shape value on the points along the outline
                 # TODO: don't use optimze, instead use pre-defined alpha
-                alpha_shape = alphashape.alphashape(sample[down_sample_index])
+                alpha_shape = reduced_concave_hull(
+                    sample, hull.hull_cell_size, 500)
 
                 # save these polygons to a pkl file
 
-                if alpha_shape.geom_type == configure.get(
-                    "Constants", "alpha_shape_multipolygon_type"
-                ):
+                if alpha_shape.geom_type == hull.multipolygon_type:
                     # sometimes there will be more than one polygons from alpha shape.
-                    for each_polyon in alpha_shape:
-                        polygons.append(
-                            self.__get_polygon_from_feature(each_polyon))
-                        shapely_polygons.append(each_polyon)
-                elif alpha_shape.geom_type == configure.get(
-                    "Constants", "alpha_shape_polygon_type"
-                ):
-                    polygons.append(
-                        self.__get_polygon_from_feature(alpha_shape))
+                    shapely_polygons.extend(alpha_shape.geoms)
+                elif alpha_shape.geom_type == hull.polygon_type:
                     shapely_polygons.append(alpha_shape)
-        print("max is ", max)
+        self.simplification_report = self.__new_simplification_report()
+        polygons = self.__get_polygon_features(shapely_polygons)
+        self.__record_simplification_report()
+
+        if self.settings.debug:
+            print("max is ", max)
         return polygons, shapely_polygons
 
-    def save_points_as_pkl(self, points):
-        data = pd.DataFrame(data=points)
-        data.to_pickle(configure.get(
-            "Constants", "pkl_file_path"), compression="zip")
+    def save_points(self, point_store):
+        """Save the collected points with the frame and the parameters they were produced with
 
-    def load_points_from_pkl(self):
-        return pd.read_pickle(
-            configure.get("Constants", "pkl_file_path"), compression="zip"
-        ).to_numpy()
+        Args:
+            point_store (PointStore): the store to write
+        """
+        point_store.save(self.whole_campus_x, self.whole_campus_y, {
+            "key": self.points_key,
+            "min_east": self.pre_processor.min_east,
+            "min_north": self.pre_processor.min_north,
+            "units": "cm",
+            "parameters": self.settings.parameters(),
+        })
+
+    def load_points(self, point_store):
+        """Memory map the stored points
+
+        Args:
+            point_store (PointStore): the store to read
+
+        Raises:
+            ValueError: the points were stored in the frame of another set of tiles
+
+        Returns:
+            np.array, np.array: read only views of x and y
+        """
+        point_x, point_y, metadata = point_store.load()
+        if (metadata["min_east"], metadata["min_north"]) != (
+                self.pre_processor.min_east, self.pre_processor.min_north):
+            raise ValueError(
+                "The stored points are relative to %d, %d and not to the current tiles, reload them"
+                % (metadata["min_east"], metadata["min_north"]))
+        return point_x, point_y
 
     def export_polygon_features_to_file(self, output_file, polygon_features):
-        """Save list of geojson features into a file
+        """Save geojson features into a file, feature by feature, so the file is a valid
+        FeatureCollection even while the features are still being produced.
+        A file ending with the binary polygon extension is written in the compact binary format instead.
 
         Args:
             output_file (str): path to output file
-            polygon_features (list): list of geojson features
+            polygon_features (iterable): list or generator of geojson features
+
+        Returns:
+            int: the number of features written
         """
-        with open(output_file, mode="w") as out_file:
-            geojson.dump(geojson.FeatureCollection(polygon_features), out_file)
+        precision = self.settings.geojson_precision
+        # the stages producing the features are nested in the export, they are measured on their own
+        with self.instrumentation.stage("export") as record:
+            if is_binary_path(output_file):
+                record.points_out += write_polygon_features(output_file, polygon_features, precision)
+            else:
+                with GeoJSONStreamWriter(output_file, precision) as writer:
+                    record.points_out += writer.write_all(polygon_features)
+        return record.points_out
+
+    def write_run_report(self):
+        """Write the stage measurements of the run as a json report and print them
 
-    def __get_polygon_from_feature(self, raw_polygon):
-        """translate the shapely polygon format to geojson, and also from utm coordinate to Geographic coordinate
+        Returns:
+            str: path of the written report
+        """
+        self.instrumentation.metadata.update({
+            "tiles": 0 if self.pre_processor is None else len(self.pre_processor.lasfile_list),
+            "points_key": self.points_key,
+            "parameters": self.settings.parameters(),
+            "workers": self.settings.workers,
+        })
+        if self.settings.debug:
+            print(self.instrumentation.summary())
+        return self.instrumentation.write_report(self.settings.paths.run_report_dir)
+
+    def __get_polygon_features(self, raw_polygons):
+        """translate the shapely polygon format to geojson, and also from utm coordinate to Geographic coordinate.
+        The polygons are simplified first, then the exterior rings of all polygons are projected together in one call.
 
         Args:
-            raw_polygon (shapely.polygon): polygons in shapely format
+            raw_polygons (list): polygons in shapely format, in the relative frame
 
         Returns:
-            geojson.Feature: geojson format polygon
+            list: geojson format polygon features
+        """
+        with self.instrumentation.stage("simplification", points_in=len(raw_polygons)) as record:
+            raw_polygons = simplify_polygons(
+                raw_polygons, 100 * self.settings.simplify_tolerance,
+                self.simplification_report)
+            record.points_out += len(raw_polygons)
+        with self.instrumentation.stage("projection") as record:
+            rings = [np.asarray(raw_polygon.exterior.coords) for raw_polygon in raw_polygons]
+            record.points_in += sum(ring.shape[0] for ring in rings)
+            polygon_features = []
+            for geo_points in relative_rings_to_lonlat(
+                    rings, self.pre_processor.min_east, self.pre_processor.min_north):
+                polygon = geojson.Polygon([geo_points.tolist()])
+                polygon_feature = geojson.Feature(geometry=polygon)
+                polygon_feature["properties"]["id"] = "L-YEAR" + str(uuid.uuid4())
+                polygon_features.append(polygon_feature)
+            record.points_out += len(polygon_features)
+
+        return polygon_features
+
+    def __new_simplification_report(self):
+        """the report of a run, the tolerance is given in metres and the relative frame is in cm"""
+        return SimplificationReport(self.settings.simplify_tolerance)
+
+    def __record_simplification_report(self):
+        """keep the simplification report of the run in the run report"""
+        self.instrumentation.metadata["simplification"] = self.simplification_report.to_dict()
+        if self.settings.debug:
+            print(self.simplification_report.summary())
+
+def balanced_batches(sizes, batch_count):
+    """Group clusters into batches of about the same number of points, largest clusters first
+
+    Args:
+        sizes (np.array): the number of points of every cluster
+        batch_count (int): the number of batches to aim for
+
+    Returns:
+        list: lists of cluster labels, the batch holding the largest cluster first
+    """
+    order = np.argsort(-np.asarray(sizes), kind="stable")
+    target = max(np.sum(sizes) / max(batch_count, 1), 1)
+    batches, batch, batch_size = [], [], 0
+    for cluster in order:
+        batch.append(int(cluster))
+        batch_size += sizes[cluster]
+        if batch_size >= target:
+            batches.append(batch)
+            batch, batch_size = [], 0
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+def extract_cluster_polygons(batch, hull):
+    """Worker of the polygon stage
+
+    Args:
+        batch (list): (cluster label, n x 2 points) of the clusters to build
+        hull (HullSettings): the polygon parameters
+
+    Returns:
+        list: (cluster label, list of shapely polygons) of every cluster of the batch
+    """
+    return [(cluster, cluster_polygons(sample, hull)) for cluster, sample in batch]
+
+
+def cluster_polygons(sample, hull):
+    """Wrap the points of one cluster into polygons with alpha shape
+
+    Args:
+        sample (np.array): n x 2 points of the cluster
+        hull (HullSettings): the polygon parameters
+
+    Returns:
+        list: shapely polygons of the cluster, empty if it is too big
+    """
+    alpha_shape = concave_hull(sample, hull.default_alpha_shape)
+
+    # # ignore the polygons that are too big
+    if alpha_shape.area > hull.max_polygon_area:
+        return []
+
+    # optimize the alpha for polygons in fitting size
+    if alpha_shape.area > hull.min_polygon_area:
+        """
+        if polygon's area is bigger than an single estimated tree area, that means there are more than one tree in the cluster 
+        In this case, we want to use optimized alpha, and only keep the points along the outline to speed up the process
         """
-        raw_contour = np.array(list(raw_polygon.exterior.coords))
-
-        # add utm coordinate to the data. Don't ask me how I translated it.
-        raw_contour[:, 0] /= 100.0
-        raw_contour[:, 0] += self.pre_processor.min_east * 100
-        raw_contour[:, 1] /= 100.0
-        raw_contour[:, 1] += self.pre_processor.min_north * 100
-
-        # translate utm to geographic
-        raw_geo = utm.to_latlon(raw_contour[:, 0], raw_contour[:, 1], 10, "U")
-        geo_points = np.vstack((raw_geo[1], raw_geo[0])).T
-        polygon = geojson.Polygon([geo_points.tolist()])
-        polygon_feature = geojson.Feature(geometry=polygon)
-        polygon_feature["properties"]["id"] = "L-YEAR" + str(uuid.uuid4())
-
-        return polygon_feature
+        # the tightest concave hull that keeps the cluster in one polygon
+        alpha_shape = reduced_concave_hull(
+            sample, hull.hull_cell_size, hull.alphashape_reduction)
+
+    if alpha_shape.geom_type == hull.multipolygon_type:
+        # sometimes there will be more than one polygons from alpha shape.
+        return list(alpha_shape.geoms)
+    elif alpha_shape.geom_type == hull.polygon_type:
+        return [alpha_shape]
+    return []
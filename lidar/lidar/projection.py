@@ -0,0 +1,49 @@
+import numpy as np
+from pyproj import Transformer
+
+UTM_ZONE_10N = "EPSG:32610"
+WGS84 = "EPSG:4326"
+
+_transformers = {}
+
+
+def get_transformer(source_crs, target_crs):
+    """Transformer between two coordinate systems, built once per pair and then reused
+
+    Args:
+        source_crs (str): the source coordinate system, e.g. "EPSG:32610"
+        target_crs (str): the target coordinate system
+
+    Returns:
+        pyproj.Transformer: transformer taking and giving x, y (longitude, latitude) order
+    """
+    key = (source_crs, target_crs)
+    if key not in _transformers:
+        _transformers[key] = Transformer.from_crs(
+            source_crs, target_crs, always_xy=True)
+    return _transformers[key]
+
+
+def relative_rings_to_lonlat(rings, min_east, min_north):
+    """Project rings from the pipeline's relative centimetre frame to longitude, latitude.
+
+    Every ring is laid into one flat coordinate buffer, projected with a single call, and
+    split back at the ring offsets.
+
+    Args:
+        rings (list): n x 2 arrays of x, y in the relative frame
+        min_east (int): east of the corner tile, in 100 metres
+        min_north (int): north of the corner tile, in 100 metres
+
+    Returns:
+        list: n x 2 arrays of longitude, latitude, one per ring
+    """
+    if len(rings) == 0:
+        return []
+    offsets = np.cumsum([len(ring) for ring in rings])[:-1]
+    buffer = np.vstack(rings).astype(np.float64)
+    # centimetres to metres, then shift by the corner tile
+    east = buffer[:, 0] / 100.0 + min_east * 100
+    north = buffer[:, 1] / 100.0 + min_north * 100
+    longitude, latitude = get_transformer(UTM_ZONE_10N, WGS84).transform(east, north)
+    return np.split(np.vstack((longitude, latitude)).T, offsets)
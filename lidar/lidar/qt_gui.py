@@ -7,17 +7,17 @@ from PyQt5 import uic
 import sys
 import os
 import json
-import time
 import numpy as np
-from sklearn.cluster import DBSCAN
 import cv2
 import scipy.ndimage as ndimage
 from math import ceil
 from download import download_lidar_dataset, unzip_files
 from config import configure, LABELLED_CONFIG_PATH, unlabelled_configure, UNLABELLED_CONFIG_PATH, orthophoto_configure, ORTHOPHOTO_CONFIG_PATH
 from processing import ProcessingPipeline
+from pre_processing import PreProcessor
 from plotter import GraphGUI
 from segmentation import SegmentationProcessor
+from settings import LabelledSettings, UnlabelledSettings
 # https://stackoverflow.com/questions/5160577/ctrl-c-doesnt-work-with-pyqt
 signal.signal(signal.SIGINT, signal.SIG_DFL)
 
@@ -28,6 +28,8 @@ class MainWindow(QMainWindow):
         uic.loadUi("../pipeline.ui", self)
         self.labelled_pipeline = None
         self.unlabelled_pipeline = None
+        # the neighbour graph of the test points, kept while the parameters are tuned
+        self.dbscan_sweep = None
         self.plotter = GraphGUI()
         self.timer = QElapsedTimer()
 
@@ -35,9 +37,6 @@ class MainWindow(QMainWindow):
         self.shortcut_close = QShortcut(QKeySequence("Ctrl+Q"), self)
         self.shortcut_close.activated.connect(self.__close_app)
 
-        self.labelled_parameter_update = False
-        self.unlabelled_parameter_update = False
-
         self.tabWidget.setCurrentIndex(0)
         self.__on_click_reset()
         self.tabWidget.setCurrentIndex(1)
@@ -50,6 +49,9 @@ class MainWindow(QMainWindow):
         self.pushButton_down_size_update.clicked.connect(
             self.__on_click_dbscan_update
         )
+        self.comboBox_downsample_mode.currentTextChanged.connect(
+            self.__on_downsample_mode_changed
+        )
         self.pushButton_dbscan_update.clicked.connect(
             self.__on_click_dbscan_update
         )
@@ -141,33 +143,33 @@ class MainWindow(QMainWindow):
 
         self.timer.restart()
 
-        self.labelled_pipeline = ProcessingPipeline(notebook=True)
+        # the settings are read once from the config as the parameters fields left it
+        self.labelled_pipeline = ProcessingPipeline(
+            notebook=True, settings=LabelledSettings.from_config(configure))
+        # a new eps or min_sample only relinks the neighbour graph of the previous run
+        self.labelled_pipeline.reuse_neighbour_graph = True
+        self.labelled_pipeline.dbscan_sweep = self.dbscan_sweep
         self.labelled_pipeline.pre_process_las_files(
             configure["Test"]["dest_dir_path"])
         points_x, points_y = self.labelled_pipeline.collect_points_from_map()
-        whole_campus_polygon_features = self.labelled_pipeline.extract_polygon_features(
+        whole_campus_polygon_features = self.labelled_pipeline.iter_polygon_features(
             points_x, points_y, callback=self.__set_progressbar_value
         )
         self.labelled_pipeline.export_polygon_features_to_file(
             configure.get("Test", "output_map_file_path"),
             whole_campus_polygon_features,
         )
+        self.labelled_pipeline.write_run_report()
+        self.dbscan_sweep = self.labelled_pipeline.dbscan_sweep
 
-        points = np.vstack((points_x, points_y)).T
-
-        start_time = time.perf_counter()
-        clustering = DBSCAN(
-            eps=configure.getfloat("Parameters", "eps"),
-            min_samples=configure.getfloat("Parameters", "min_sample"),
-            n_jobs=-1,
-        ).fit(points)
-        end_time = time.perf_counter()
+        # the labels of the polygon stage come back from the artifact cache
+        labels = self.labelled_pipeline.cluster_points(points_x, points_y)
 
         self.plotter.plot_path = configure.get(
             "Constants", "plot_html_file_path")
         self.plotter.x = points_x
         self.plotter.y = points_y
-        self.plotter.label = clustering.labels_
+        self.plotter.label = labels
         self.plotter.display_2d_labelled_pcd(
             100000, save_file=True, render="png")
         self.webEngineView.reload()
@@ -181,14 +183,14 @@ class MainWindow(QMainWindow):
         )
 
         self.__test_output_update(
-            cluster_time=(end_time - start_time),
-            number_of_clusters=np.amax(clustering.labels_),
+            cluster_time=self.labelled_pipeline.instrumentation.record("clustering").wall_time,
+            number_of_clusters=np.amax(labels) + 1,
             total_time=self.timer.elapsed(),
         )
         data_path = configure.get("Download", "dest_dir_path")
         self.__process_output_update(
             self.timer.elapsed()
-            * self.labelled_pipeline.pre_processor.collect_las_file_from_folder(new_path=data_path),
+            * PreProcessor.open_tile_catalog(data_path, self.labelled_pipeline.settings.paths).refresh(),
             estimated=True
         )
 
@@ -199,30 +201,13 @@ class MainWindow(QMainWindow):
         self.statusBar().showMessage("Processing")
         self.timer.restart()
 
-        self.unlabelled_pipeline = SegmentationProcessor()
-
-        self.unlabelled_pipeline.uniform_down_k_point = unlabelled_configure.getint(
-            "Parameters", "uniform_down_k_point")
-        self.unlabelled_pipeline.distance_threshold = unlabelled_configure.getfloat(
-            "Parameters", "distance_threshold")
-        self.unlabelled_pipeline.ransac_n = unlabelled_configure.getint(
-            "Parameters", "ransac_n")
-        self.unlabelled_pipeline.num_iterations = unlabelled_configure.getint(
-            "Parameters", "num_iterations")
-        self.unlabelled_pipeline.ground_threshold = unlabelled_configure.getfloat(
-            "Parameters", "ground_threshold")
-        self.unlabelled_pipeline.eps = unlabelled_configure.getfloat(
-            "Parameters", "eps")
-        self.unlabelled_pipeline.min_points = unlabelled_configure.getint(
-            "Parameters", "min_points")
-        self.unlabelled_pipeline.rgbvi_threshold = unlabelled_configure.getfloat(
-            "Parameters", "rgbvi_threshold")
-
-        if self.unlabelled_parameter_update:
-            self.unlabelled_parameter_update = False
-            self.unlabelled_pipeline.pre_process_pc()
+        self.unlabelled_pipeline = SegmentationProcessor(UnlabelledSettings.from_config(unlabelled_configure))
+
+        # the ground removal is cached by its inputs and parameters, it only runs again when they change
+        self.unlabelled_pipeline.pre_process_pc()
 
         self.unlabelled_pipeline.process_pc()
+        self.unlabelled_pipeline.write_run_report()
 
         self.plotter.plot_path = unlabelled_configure.get(
             "Constants", "plot_html_file_path")
@@ -358,9 +343,18 @@ class MainWindow(QMainWindow):
         self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_eps").setToolTip(
             configure.get("ToolTips", "eps")
         )
+        self.scrollAreaWidget_lidar_labelled.findChild(QComboBox, "comboBox_downsample_mode").setToolTip(
+            configure.get("ToolTips", "downsample_mode")
+        )
         self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_down_size").setToolTip(
             configure.get("ToolTips", "down_size")
         )
+        self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_grid_cell_size").setToolTip(
+            configure.get("ToolTips", "grid_cell_size")
+        )
+        self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_max_points_per_cell").setToolTip(
+            configure.get("ToolTips", "max_points_per_cell")
+        )
         self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_min_sample").setToolTip(
             configure.get("ToolTips", "min_sample")
         )
@@ -419,22 +413,31 @@ class MainWindow(QMainWindow):
         )
 
     def __configure_dbscan_update(self):
-        down_size_value = int(self.scrollAreaWidget_lidar_labelled.findChild(
-            QLineEdit, "lineEdit_down_size").text())
-        if down_size_value is not configure.getint("Parameters", "down_size"):
-            self.labelled_parameter_update = True
+        downsample_mode = self.scrollAreaWidget_lidar_labelled.findChild(
+            QComboBox, "comboBox_downsample_mode").currentText()
+        configure.set("Parameters", "downsample_mode", downsample_mode)
+
+        # only the fields of the selected down sample mode are editable, the others keep the config values
+        if downsample_mode == "random":
+            down_size_value = int(self.scrollAreaWidget_lidar_labelled.findChild(
+                QLineEdit, "lineEdit_down_size").text())
             configure.set("Parameters", "down_size", "%s" % down_size_value)
+        else:
+            grid_cell_size_value = int(self.scrollAreaWidget_lidar_labelled.findChild(
+                QLineEdit, "lineEdit_grid_cell_size").text())
+            configure.set("Parameters", "grid_cell_size", "%s" % grid_cell_size_value)
+            max_points_per_cell_value = int(self.scrollAreaWidget_lidar_labelled.findChild(
+                QLineEdit, "lineEdit_max_points_per_cell").text())
+            configure.set("Parameters", "max_points_per_cell", "%s" % max_points_per_cell_value)
 
         eps_value = int(self.scrollAreaWidget_lidar_labelled.findChild(
             QLineEdit, "lineEdit_eps").text())
         if eps_value is not configure.getint("Parameters", "eps"):
-            self.labelled_parameter_update = True
             configure.set("Parameters", "eps", "%s" % eps_value)
 
         min_sample_value = int(self.scrollAreaWidget_lidar_labelled.findChild(
             QLineEdit, "lineEdit_min_sample").text())
         if min_sample_value is not configure.getint("Parameters", "min_sample"):
-            self.labelled_parameter_update = True
             configure.set("Parameters", "min_sample", "%s" % min_sample_value)
 
     def __configure_alphashape_update(self):
@@ -443,21 +446,18 @@ class MainWindow(QMainWindow):
         min_area_value = int(self.scrollAreaWidget_lidar_labelled.findChild(
             QLineEdit, "lineEdit_min_area").text())
         if min_area_value is not configure.getint("Parameters", "min_polygon_area"):
-            self.labelled_parameter_update = True
             configure.set("Parameters", "min_polygon_area",
                           "%s" % min_area_value)
 
         reduction_value = int(self.scrollAreaWidget_lidar_labelled.findChild(
             QLineEdit, "lineEdit_alpha").text())
         if reduction_value is not configure.getint("Parameters", "alphashape_reduction"):
-            self.labelled_parameter_update = True
             configure.set("Parameters", "alphashape_reduction",
                           "%s" % reduction_value)
 
         max_area_value = int(self.scrollAreaWidget_lidar_labelled.findChild(
             QLineEdit, "lineEdit_max_area").text())
         if max_area_value is not configure.getint("Parameters", "max_polygon_area"):
-            self.labelled_parameter_update = True
             configure.set("Parameters", "max_polygon_area",
                           "%s" % max_area_value)
 
@@ -465,21 +465,18 @@ class MainWindow(QMainWindow):
         min_points_value = int(self.scrollAreaWidget_lidar_unlabelled.findChild(
             QLineEdit, "lineEdit_uniform_k_points").text())
         if min_points_value is not unlabelled_configure.getint("Parameters", "uniform_down_k_point"):
-            self.unlabelled_parameter_update = True
             unlabelled_configure.set(
                 "Parameters", "uniform_down_k_point", "%s" % min_points_value)
 
         distance_threshold_value = float(self.scrollAreaWidget_lidar_unlabelled.findChild(
             QLineEdit, "lineEdit_distance_threshold").text())
         if distance_threshold_value is not unlabelled_configure.getfloat("Parameters", "distance_threshold"):
-            self.unlabelled_parameter_update = True
             unlabelled_configure.set(
                 "Parameters", "distance_threshold", "%s" % distance_threshold_value)
 
         ground_threshold_value = float(self.scrollAreaWidget_lidar_unlabelled.findChild(
             QLineEdit, "lineEdit_ground_diff").text())
         if ground_threshold_value is not unlabelled_configure.getfloat("Parameters", "ground_threshold"):
-            self.unlabelled_parameter_update = True
             unlabelled_configure.set(
                 "Parameters", "ground_threshold", "%s" % ground_threshold_value)
 
@@ -544,6 +541,16 @@ class MainWindow(QMainWindow):
 
     # labelled pipeline buttons slots
 
+    @pyqtSlot(str)
+    def __on_downsample_mode_changed(self, downsample_mode):
+        # down_size only applies to the random mode, the grid cell size and cap only to the grid mode
+        self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_down_size").setEnabled(
+            downsample_mode == "random")
+        self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_grid_cell_size").setEnabled(
+            downsample_mode == "grid")
+        self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_max_points_per_cell").setEnabled(
+            downsample_mode == "grid")
+
     @pyqtSlot()
     def __on_click_dbscan_update(self):
         self.__configure_dbscan_update()
@@ -608,6 +615,13 @@ class MainWindow(QMainWindow):
             configure.read(LABELLED_CONFIG_PATH)
             self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_down_size").setText(
                 configure.get("Parameters", "down_size"))
+            self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_grid_cell_size").setText(
+                configure.get("Parameters", "grid_cell_size"))
+            self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_max_points_per_cell").setText(
+                configure.get("Parameters", "max_points_per_cell"))
+            self.scrollAreaWidget_lidar_labelled.findChild(QComboBox, "comboBox_downsample_mode").setCurrentText(
+                configure.get("Parameters", "downsample_mode"))
+            self.__on_downsample_mode_changed(configure.get("Parameters", "downsample_mode"))
             self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_eps").setText(
                 configure.get("Parameters", "eps"))
             self.scrollAreaWidget_lidar_labelled.findChild(QLineEdit, "lineEdit_min_sample").setText(
@@ -677,18 +691,17 @@ class MainWindow(QMainWindow):
             self.timer.restart()
 
             data_path = configure["Download"]["dest_dir_path"]
-            self.labelled_pipeline = ProcessingPipeline(notebook=True)
-            if self.labelled_parameter_update:
-                self.labelled_pipeline.reload = True
-                self.labelled_parameter_update = False
+            self.labelled_pipeline = ProcessingPipeline(
+                notebook=True, settings=LabelledSettings.from_config(configure))
             self.labelled_pipeline.pre_process_las_files(data_path)
             self.labelled_pipeline.collect_points_from_map()
-            whole_campus_polygon_features = self.labelled_pipeline.extract_polygon_features(
+            whole_campus_polygon_features = self.labelled_pipeline.iter_polygon_features(
                 callback=self.__set_progressbar_value)
             self.labelled_pipeline.export_polygon_features_to_file(
                 configure.get("Constants", "OUTPUT_MAP_FILE_PATH"),
                 whole_campus_polygon_features,
             )
+            self.labelled_pipeline.write_run_report()
 
             self.__process_output_update(self.timer.elapsed(), estimated=False)
             self.statusBar().showMessage("Complete data processing")
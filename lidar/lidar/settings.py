@@ -0,0 +1,278 @@
+"""Typed, validated snapshots of the pipeline configs.
+
+The settings are read from the ini files once and handed to every stage and worker, so no
+stage parses config strings in its loops, and two pipelines with different settings can run
+side by side in one process or pool. The settings are frozen, a variant is made with
+dataclasses.replace, which validates it again.
+"""
+import multiprocessing
+from dataclasses import asdict, dataclass, field
+
+DOWNSAMPLE_MODES = ("random", "grid")
+DBSCAN_BACKENDS = ("sklearn", "tiled", "grid")
+
+
+def _check(condition, message, *args):
+    if not condition:
+        raise ValueError(message % args)
+
+
+@dataclass(frozen=True)
+class FrameSettings:
+    """The CoV tile layout, the raw LAS coordinates are centimetres from the offsets"""
+    east_offset: int = 4000
+    north_offset: int = 50000
+    # centimetres per tile index, a tile index is 100 m
+    tile_scale: int = 10000
+    # the width of a tile in centimetres
+    tile_max_size: int = 100000
+
+    def __post_init__(self):
+        _check(self.tile_scale > 0, "tile_scale must be positive, got %s", self.tile_scale)
+        _check(self.tile_max_size > 0, "tile_max_size must be positive, got %s", self.tile_max_size)
+
+
+@dataclass(frozen=True)
+class DownSampleSettings:
+    """How the points of a tile are thinned, see PreProcessor"""
+    min_points_for_downsize: int = 20000
+    downsample_mode: str = "random"
+    grid_cell_size: int = 100
+    max_points_per_cell: int = 1
+    down_size: int = 100
+    downsample_seed: int = 0
+
+    def __post_init__(self):
+        _check(self.downsample_mode in DOWNSAMPLE_MODES, "downsample_mode must be one of %s, got %s",
+               ", ".join(DOWNSAMPLE_MODES), self.downsample_mode)
+        _check(self.min_points_for_downsize >= 0, "min_points_for_downsize must not be negative, got %s",
+               self.min_points_for_downsize)
+        _check(self.grid_cell_size > 0, "grid_cell_size must be positive, got %s", self.grid_cell_size)
+        _check(self.max_points_per_cell >= 1, "max_points_per_cell must be at least 1, got %s",
+               self.max_points_per_cell)
+        _check(self.down_size >= 1, "down_size must be at least 1, got %s", self.down_size)
+
+
+@dataclass(frozen=True)
+class ClusterSettings:
+    """DBSCAN of the campus points, distances in centimetres"""
+    eps: float = 300.0
+    min_sample: int = 10
+    dbscan_backend: str = "grid"
+    cluster_tile_size: float = 50000.0
+    sweep_max_eps: float = 600.0
+
+    def __post_init__(self):
+        _check(self.eps > 0, "eps must be positive, got %s", self.eps)
+        _check(self.min_sample >= 1, "min_sample must be at least 1, got %s", self.min_sample)
+        _check(self.dbscan_backend in DBSCAN_BACKENDS, "dbscan_backend must be one of %s, got %s",
+               ", ".join(DBSCAN_BACKENDS), self.dbscan_backend)
+        # only the tiled backend cuts the points into tiles, each with a halo of 2 eps
+        _check(self.dbscan_backend != "tiled" or self.cluster_tile_size >= 2 * self.eps,
+               "cluster_tile_size must be at least 2 eps with the tiled backend, got %s", self.cluster_tile_size)
+
+
+@dataclass(frozen=True)
+class HullSettings:
+    """The polygon stage, sent to the workers with every batch. Areas in square centimetres"""
+    default_alpha_shape: float = 0.0
+    multipolygon_type: str = "MultiPolygon"
+    polygon_type: str = "Polygon"
+    max_polygon_area: int = 5000000000
+    min_polygon_area: int = 800
+    alphashape_reduction: int = 20000
+    hull_cell_size: float = 100.0
+
+    def __post_init__(self):
+        _check(0 <= self.min_polygon_area <= self.max_polygon_area,
+               "min_polygon_area must be between 0 and max_polygon_area, got %s", self.min_polygon_area)
+        _check(self.alphashape_reduction > 0, "alphashape_reduction must be positive, got %s",
+               self.alphashape_reduction)
+        _check(self.hull_cell_size > 0, "hull_cell_size must be positive, got %s", self.hull_cell_size)
+
+
+@dataclass(frozen=True)
+class PathSettings:
+    """Where the labelled pipeline reads and writes, relative to the source folder"""
+    data_folder_path: str = "../data"
+    tests_folder_path: str = "../tests/test_data"
+    boundary_geojson_file_path: str = "../tests/ubc_boundary.geojson"
+    point_store_path: str = "../data/point_store"
+    tile_cache_dir: str = "../data/tile_cache"
+    artifact_cache_dir: str = "../data/artifact_cache"
+    run_report_dir: str = "../data/run_reports"
+    tile_catalog_file_name: str = "tile_catalog.json"
+    las_ext: str = ".las"
+
+
+@dataclass(frozen=True)
+class LabelledSettings:
+    """Everything the labelled LiDAR pipeline reads from labelled_config.ini"""
+    frame: FrameSettings = field(default_factory=FrameSettings)
+    down_sample: DownSampleSettings = field(default_factory=DownSampleSettings)
+    cluster: ClusterSettings = field(default_factory=ClusterSettings)
+    hull: HullSettings = field(default_factory=HullSettings)
+    paths: PathSettings = field(default_factory=PathSettings)
+    # clusters with at most this many distinct points are skipped by the forest extraction
+    min_size: int = 20
+    # metres, polygons are simplified before projection
+    simplify_tolerance: float = 0.0
+    geojson_precision: int = 6
+    # 0 for one worker process per cpu
+    workers: int = 0
+    start_method: str = "spawn"
+    chunk_size: int = 1000000
+    debug: bool = False
+
+    def __post_init__(self):
+        _check(self.simplify_tolerance >= 0, "simplify_tolerance must not be negative, got %s",
+               self.simplify_tolerance)
+        _check(self.geojson_precision >= 0, "geojson_precision must not be negative, got %s",
+               self.geojson_precision)
+        _check(self.workers >= 0, "workers must not be negative, got %s", self.workers)
+        _check(self.start_method in multiprocessing.get_all_start_methods(),
+               "start_method must be one of %s, got %s",
+               ", ".join(multiprocessing.get_all_start_methods()), self.start_method)
+        _check(self.chunk_size > 0, "chunk_size must be positive, got %s", self.chunk_size)
+
+    @classmethod
+    def from_config(cls, config):
+        """Read and validate the settings of a labelled config
+
+        Args:
+            config (configparser.ConfigParser): the parsed labelled_config.ini
+
+        Raises:
+            ValueError: a value is malformed or out of range
+            configparser.Error: an option is missing
+
+        Returns:
+            LabelledSettings: the settings
+        """
+        return cls(
+            frame=FrameSettings(
+                east_offset=config.getint("Constants", "east_offset"),
+                north_offset=config.getint("Constants", "north_offset"),
+                tile_scale=config.getint("Constants", "tile_scale"),
+                tile_max_size=config.getint("Constants", "tile_max_size"),
+            ),
+            down_sample=DownSampleSettings(
+                min_points_for_downsize=config.getint("Parameters", "min_points_for_downsize"),
+                downsample_mode=config.get("Parameters", "downsample_mode"),
+                grid_cell_size=config.getint("Parameters", "grid_cell_size"),
+                max_points_per_cell=config.getint("Parameters", "max_points_per_cell"),
+                down_size=config.getint("Parameters", "down_size"),
+                downsample_seed=config.getint("Parameters", "downsample_seed"),
+            ),
+            cluster=ClusterSettings(
+                eps=config.getfloat("Parameters", "eps"),
+                min_sample=config.getint("Parameters", "min_sample"),
+                dbscan_backend=config.get("Parameters", "dbscan_backend"),
+                cluster_tile_size=config.getfloat("Configure", "cluster_tile_size"),
+                sweep_max_eps=config.getfloat("Configure", "sweep_max_eps"),
+            ),
+            hull=HullSettings(
+                default_alpha_shape=config.getfloat("Constants", "default_alpha_shape"),
+                multipolygon_type=config.get("Constants", "alpha_shape_multipolygon_type"),
+                polygon_type=config.get("Constants", "alpha_shape_polygon_type"),
+                max_polygon_area=config.getint("Parameters", "max_polygon_area"),
+                min_polygon_area=config.getint("Parameters", "min_polygon_area"),
+                alphashape_reduction=config.getint("Parameters", "alphashape_reduction"),
+                hull_cell_size=config.getfloat("Parameters", "hull_cell_size"),
+            ),
+            paths=PathSettings(**{
+                name: config.get("Constants", name) for name in PathSettings.__dataclass_fields__}),
+            min_size=config.getint("Parameters", "min_size"),
+            simplify_tolerance=config.getfloat("Parameters", "simplify_tolerance"),
+            geojson_precision=config.getint("Constants", "geojson_precision"),
+            workers=config.getint("Configure", "workers"),
+            start_method=config.get("Configure", "start_method"),
+            chunk_size=config.getint("Configure", "chunk_size"),
+            debug=config.getboolean("Configure", "debug"),
+        )
+
+    def parameters(self):
+        """the tunable parameters, for the run reports and the point store
+
+        Returns:
+            dict: the down sampling, clustering and polygon parameters
+        """
+        return {
+            "down_sample": asdict(self.down_sample),
+            "cluster": asdict(self.cluster),
+            "hull": asdict(self.hull),
+            "min_size": self.min_size,
+            "simplify_tolerance": self.simplify_tolerance,
+        }
+
+
+@dataclass(frozen=True)
+class UnlabelledSettings:
+    """Everything the unlabelled segmentation reads from unlabelled_config.ini"""
+    uniform_down_k_point: int = 20
+    distance_threshold: float = 1.0
+    ransac_n: int = 3
+    num_iterations: int = 1000
+    ground_threshold: float = 0.02
+    eps: float = 3.0
+    min_points: int = 3
+    rgbvi_threshold: float = 0.08
+    las_file_path: str = ""
+    pcd_output_path: str = ""
+    dem_path: str = ""
+    rgb_img_path: str = ""
+    las_file_output_path: str = ""
+    artifact_cache_dir: str = "../data/artifact_cache"
+    run_report_dir: str = "../data/run_reports"
+    plot_html_file_path: str = ""
+
+    def __post_init__(self):
+        _check(self.uniform_down_k_point >= 1, "uniform_down_k_point must be at least 1, got %s",
+               self.uniform_down_k_point)
+        _check(self.distance_threshold > 0, "distance_threshold must be positive, got %s",
+               self.distance_threshold)
+        _check(self.ransac_n >= 3, "ransac_n must be at least 3, got %s", self.ransac_n)
+        _check(self.num_iterations >= 1, "num_iterations must be at least 1, got %s", self.num_iterations)
+        _check(self.eps > 0, "eps must be positive, got %s", self.eps)
+        _check(self.min_points >= 1, "min_points must be at least 1, got %s", self.min_points)
+        _check(-1.0 <= self.rgbvi_threshold <= 1.0, "rgbvi_threshold must be between -1 and 1, got %s",
+               self.rgbvi_threshold)
+
+    @classmethod
+    def from_config(cls, config):
+        """Read and validate the settings of an unlabelled config
+
+        Args:
+            config (configparser.ConfigParser): the parsed unlabelled_config.ini
+
+        Raises:
+            ValueError: a value is malformed or out of range
+            configparser.Error: an option is missing
+
+        Returns:
+            UnlabelledSettings: the settings
+        """
+        return cls(
+            uniform_down_k_point=config.getint("Parameters", "uniform_down_k_point"),
+            distance_threshold=config.getfloat("Parameters", "distance_threshold"),
+            ransac_n=config.getint("Parameters", "ransac_n"),
+            num_iterations=config.getint("Parameters", "num_iterations"),
+            ground_threshold=config.getfloat("Parameters", "ground_threshold"),
+            eps=config.getfloat("Parameters", "eps"),
+            min_points=config.getint("Parameters", "min_points"),
+            rgbvi_threshold=config.getfloat("Parameters", "rgbvi_threshold"),
+            las_file_path=config.get("Test", "las_file_path"),
+            pcd_output_path=config.get("Test", "pcd_output_path"),
+            dem_path=config.get("Test", "dem_path"),
+            rgb_img_path=config.get("Test", "rgb_img_path"),
+            las_file_output_path=config.get("Test", "las_file_output_path"),
+            artifact_cache_dir=config.get("Constants", "artifact_cache_dir"),
+            run_report_dir=config.get("Constants", "run_report_dir"),
+            plot_html_file_path=config.get("Constants", "plot_html_file_path"),
+        )
+
+    def parameters(self):
+        """the tunable parameters, for the run reports"""
+        return {name: getattr(self, name) for name in (
+            "uniform_down_k_point", "distance_threshold", "ransac_n", "num_iterations",
+            "ground_threshold", "eps", "min_points", "rgbvi_threshold")}
@@ -0,0 +1,204 @@
+from shapely.geometry import Polygon
+from shapely.ops import polygonize, unary_union
+
+
+def vertex_count(geometry):
+    """Number of vertices of a Polygon or MultiPolygon, every ring counted
+
+    Args:
+        geometry (shapely geometry): the polygon
+
+    Returns:
+        int: the number of vertices
+    """
+    if geometry.geom_type == "MultiPolygon":
+        return sum(vertex_count(polygon) for polygon in geometry.geoms)
+    if geometry.geom_type != "Polygon":
+        return len(geometry.coords)
+    return len(geometry.exterior.coords) + sum(len(ring.coords) for ring in geometry.interiors)
+
+
+def repair_polygon(polygon):
+    """A valid version of a polygon, e.g. of a self touching contour, repaired with a zero buffer
+
+    Args:
+        polygon (shapely geometry): Polygon or MultiPolygon
+
+    Returns:
+        shapely geometry or None: the polygon itself if it is valid, None if the repair does not
+        give a valid geometry of the same type
+    """
+    if polygon.is_valid:
+        return polygon
+    repaired = polygon.buffer(0)
+    if repaired.is_empty or not repaired.is_valid or repaired.geom_type != polygon.geom_type:
+        return None
+    if polygon.geom_type == "Polygon":
+        # a zero buffer drops parts of a ring crossing itself, e.g. one lobe of a bow tie,
+        # the repair is refused unless it keeps every face the exterior ring encloses
+        enclosed = sum(face.area for face in polygonize(unary_union(polygon.exterior)))
+        if abs(Polygon(repaired.exterior).area - enclosed) > 1e-6 * enclosed:
+            return None
+    return repaired
+
+
+def simplify_polygon(polygon, tolerance):
+    """Simplify a polygon while keeping it valid.
+
+    The Douglas-Peucker simplification that preserves topology never lets rings cross, in the
+    rare case the result is still invalid it is repaired with a zero buffer. If the result is
+    empty, still invalid or of another geometry type, the polygon is kept as it is.
+
+    Args:
+        polygon (shapely geometry): Polygon or MultiPolygon
+        tolerance (float): the largest distance a vertex may move, in the units of the polygon
+
+    Returns:
+        shapely geometry: the simplified polygon
+    """
+    if tolerance <= 0 or polygon.is_empty:
+        return polygon
+    simplified = polygon.simplify(tolerance, preserve_topology=True)
+    if not simplified.is_valid:
+        simplified = simplified.buffer(0)
+    if simplified.is_empty or not simplified.is_valid or simplified.geom_type != polygon.geom_type:
+        return polygon
+    return simplified
+
+
+class SimplificationReport:
+    """Vertex count and area of the polygons before and after simplification over a run"""
+
+    def __init__(self, tolerance):
+        self._tolerance = tolerance
+        self._polygon_count = 0
+        self._repaired_count = 0
+        self._skipped_count = 0
+        self._vertices_before = 0
+        self._vertices_after = 0
+        self._area_before = 0.0
+        self._area_after = 0.0
+
+    @property
+    def tolerance(self):
+        return self._tolerance
+
+    @property
+    def polygon_count(self):
+        return self._polygon_count
+
+    @property
+    def repaired_count(self):
+        """number of invalid polygons repaired before they were simplified"""
+        return self._repaired_count
+
+    @property
+    def skipped_count(self):
+        """number of invalid polygons that could not be repaired and were kept as they were"""
+        return self._skipped_count
+
+    @property
+    def vertices_before(self):
+        return self._vertices_before
+
+    @property
+    def vertices_after(self):
+        return self._vertices_after
+
+    @property
+    def vertex_reduction(self):
+        """fraction of the vertices removed"""
+        if self._vertices_before == 0:
+            return 0.0
+        return 1 - self._vertices_after / self._vertices_before
+
+    @property
+    def area_change(self):
+        """relative change of the total area"""
+        if self._area_before == 0:
+            return 0.0
+        return self._area_after / self._area_before - 1
+
+    def add(self, before, after, repaired=False):
+        """Account for one simplified polygon
+
+        Args:
+            before (shapely geometry): the original polygon
+            after (shapely geometry): the simplified polygon
+            repaired (bool, optional): the original was invalid and repaired first. Defaults to False.
+        """
+        self._polygon_count += 1
+        self._repaired_count += int(repaired)
+        self._vertices_before += vertex_count(before)
+        self._vertices_after += vertex_count(after)
+        self._area_before += before.area
+        self._area_after += after.area
+
+    def skip(self):
+        """Account for an invalid polygon that could not be repaired, it is not simplified"""
+        self._skipped_count += 1
+
+    def merge(self, other):
+        """Add up the polygons of another report, e.g. of another tile
+
+        Args:
+            other (SimplificationReport): the report to add
+        """
+        self._polygon_count += other.polygon_count
+        self._repaired_count += other.repaired_count
+        self._skipped_count += other.skipped_count
+        self._vertices_before += other.vertices_before
+        self._vertices_after += other.vertices_after
+        self._area_before += other._area_before
+        self._area_after += other._area_after
+
+    def summary(self):
+        """one line summary of the run
+
+        Returns:
+            str: the summary
+        """
+        return ("Simplified %d polygons with tolerance %g: %d -> %d vertices (%.1f%% fewer), area changed by %+.3f%%, "
+                "%d invalid polygons repaired, %d skipped") % (
+            self._polygon_count, self._tolerance, self._vertices_before, self._vertices_after,
+            100 * self.vertex_reduction, 100 * self.area_change, self._repaired_count, self._skipped_count)
+
+    def to_dict(self):
+        """the report for the run report"""
+        return {
+            "tolerance": self._tolerance,
+            "polygons": self._polygon_count,
+            "repaired": self._repaired_count,
+            "skipped": self._skipped_count,
+            "vertices_before": self._vertices_before,
+            "vertices_after": self._vertices_after,
+            "vertex_reduction": self.vertex_reduction,
+            "area_change": self.area_change,
+        }
+
+
+def simplify_polygons(polygons, tolerance, report=None):
+    """Simplify polygons, see simplify_polygon. Invalid polygons are repaired first, those that
+    cannot be repaired are kept as they are and counted as skipped
+
+    Args:
+        polygons (iterable): shapely polygons
+        tolerance (float): the largest distance a vertex may move, in the units of the polygons
+        report (SimplificationReport, optional): accumulates the vertex and area change. Defaults to None.
+
+    Returns:
+        list: the simplified polygons
+    """
+    simplified = []
+    for polygon in polygons:
+        repaired = repair_polygon(polygon)
+        if repaired is None:
+            if report is not None:
+                report.skip()
+            simplified.append(polygon)
+            continue
+        result = simplify_polygon(repaired, tolerance)
+        if report is not None:
+            report.add(polygon, result, repaired=repaired is not polygon)
+        simplified.append(result)
+    return simplified
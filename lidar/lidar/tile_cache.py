@@ -0,0 +1,58 @@
+from artifact_cache import ArtifactCache
+
+TILE_POINTS_STAGE = "tile_points"
+
+
+class TileCache:
+    """Content addressed cache of the points extracted from each tile.
+
+    The key covers the tile's content hash, the classification and the down sampling
+    parameters, so a cached entry can never be served for a changed tile or setting.
+    The points are kept as artifacts of the tile_points stage of an ArtifactCache.
+    """
+
+    def __init__(self, cache_dir):
+        self._artifact_cache = ArtifactCache(cache_dir)
+
+    @property
+    def cache_dir(self):
+        return self._artifact_cache.cache_dir
+
+    @staticmethod
+    def key(content_hash, index_type, parameters):
+        """Build the cache key of the points of one class of a tile
+
+        Args:
+            content_hash (str): hash of the tile file content
+            index_type (int): the classification of the points
+            parameters (dict): every parameter the extracted points depend on
+
+        Returns:
+            str: the cache key
+        """
+        return ArtifactCache.key(
+            TILE_POINTS_STAGE, [content_hash], {"class": int(index_type), "down_sample": parameters})
+
+    def load(self, key):
+        """Load cached points
+
+        Args:
+            key (str): the cache key
+
+        Returns:
+            (np.array, np.array) or None: x and y of the points, None on a cache miss
+        """
+        cached = self._artifact_cache.load(TILE_POINTS_STAGE, key)
+        if cached is None or "x" not in cached or "y" not in cached:
+            return None
+        return cached["x"], cached["y"]
+
+    def save(self, key, x, y):
+        """Save points under a key, written atomically so concurrent workers never see partial files
+
+        Args:
+            key (str): the cache key
+            x (np.array): x of the points
+            y (np.array): y of the points
+        """
+        self._artifact_cache.save(TILE_POINTS_STAGE, key, x=x, y=y)
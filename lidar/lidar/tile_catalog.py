@@ -0,0 +1,194 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from las_reader import LasChunkReader, LasHeader
+from artifact_cache import ArtifactCache
+
+CATALOG_VERSION = 1
+
+
+class TileCatalog:
+    """Sidecar catalog of the LAS tiles in a folder.
+
+    Every tile is keyed by its path relative to the folder, and the entry is only trusted while
+    the file size and modification time still match. The entry holds the header bounds, scale,
+    offset and point count, and the point count per classification once it has been counted,
+    so queries on the catalog never have to open a LAS file again.
+    """
+
+    def __init__(self, data_dir, catalog_file_name="tile_catalog.json", extension=".las"):
+        self._data_dir = data_dir
+        self._catalog_file_path = os.path.join(data_dir, catalog_file_name)
+        self._extension = extension
+        self._tiles = {}
+        self._changed = False
+        self.__load()
+
+    @property
+    def catalog_file_path(self):
+        return self._catalog_file_path
+
+    @property
+    def tiles(self):
+        """dict of the tile entries keyed by the path relative to the data folder"""
+        return self._tiles
+
+    def file_paths(self):
+        """Full paths of all the catalogued tiles, in a stable order
+
+        Returns:
+            list: file paths
+        """
+        return [os.path.join(self._data_dir, path) for path in sorted(self._tiles)]
+
+    def refresh(self):
+        """Bring the catalog up to date with the folder. Only the headers of new or
+        modified tiles are read, deleted tiles are dropped.
+
+        Returns:
+            int: the number of tiles in the catalog
+        """
+        found = set()
+        for root, dirs, files in os.walk(self._data_dir):
+            for file in files:
+                if not file.endswith(self._extension):
+                    continue
+                file_path = os.path.join(root, file)
+                key = os.path.relpath(file_path, self._data_dir)
+                found.add(key)
+                stat = os.stat(file_path)
+                entry = self._tiles.get(key)
+                if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                    continue
+                self._tiles[key] = self.__read_entry(file_path, stat)
+                self._changed = True
+
+        for key in set(self._tiles) - found:
+            del self._tiles[key]
+            self._changed = True
+
+        self.save()
+        return len(self._tiles)
+
+    def entry(self, file_path):
+        """The catalog entry of a tile
+
+        Args:
+            file_path (str): full path of the tile
+
+        Returns:
+            dict: the entry, None if the tile is not catalogued
+        """
+        return self._tiles.get(os.path.relpath(file_path, self._data_dir))
+
+    def class_counts(self, file_path):
+        """Point count per classification of a tile, counted once and then kept in the catalog
+
+        Args:
+            file_path (str): full path of the tile
+
+        Returns:
+            dict: point count keyed by the classification value
+        """
+        entry = self.entry(file_path)
+        if entry["class_counts"] is None:
+            counts = np.zeros(256, dtype=np.int64)
+            for chunk in LasChunkReader(file_path):
+                counts += np.bincount(chunk["classification"], minlength=256)
+            entry["class_counts"] = {
+                str(index): int(count) for index, count in enumerate(counts) if count > 0}
+            self._changed = True
+        return {int(index): count for index, count in entry["class_counts"].items()}
+
+    def content_hashes(self, file_paths):
+        """SHA-1 of the content of tiles, hashed once and then kept in the catalog.
+        Tiles that were never hashed are read in parallel threads, hashlib releases the GIL.
+
+        Args:
+            file_paths (list): full paths of the tiles
+
+        Returns:
+            list: the hex digests, in the order of file_paths
+        """
+        missing = [file_path for file_path in file_paths
+                   if self.entry(file_path).get("sha1") is None]
+        if len(missing) > 0:
+            with ThreadPoolExecutor() as executor:
+                for file_path, digest in zip(missing, executor.map(ArtifactCache.file_hash, missing)):
+                    self.entry(file_path)["sha1"] = digest
+            self._changed = True
+            self.save()
+        return [self.entry(file_path)["sha1"] for file_path in file_paths]
+
+    def tiles_in_bbox(self, min_x, min_y, max_x, max_y):
+        """Tiles whose header bounds intersect a bounding box in the tiles' coordinate system
+
+        Args:
+            min_x (float): west edge
+            min_y (float): south edge
+            max_x (float): east edge
+            max_y (float): north edge
+
+        Returns:
+            list: full paths of the intersecting tiles
+        """
+        return [
+            os.path.join(self._data_dir, key) for key, entry in sorted(self._tiles.items())
+            if entry["min"][0] <= max_x and entry["max"][0] >= min_x
+            and entry["min"][1] <= max_y and entry["max"][1] >= min_y
+        ]
+
+    def point_count(self, index_type=None):
+        """Total number of points over all the tiles
+
+        Args:
+            index_type (int, optional): only count this classification. Defaults to None, every point.
+
+        Returns:
+            int: the number of points
+        """
+        if index_type is None:
+            return sum(entry["point_count"] for entry in self._tiles.values())
+        total = sum(self.class_counts(file_path).get(int(index_type), 0)
+                    for file_path in self.file_paths())
+        self.save()
+        return total
+
+    def save(self):
+        """Write the catalog next to the tiles if anything changed"""
+        if not self._changed:
+            return
+        temp_file_path = self._catalog_file_path + ".tmp"
+        with open(temp_file_path, "w") as out_file:
+            json.dump({"version": CATALOG_VERSION, "tiles": self._tiles}, out_file)
+        os.replace(temp_file_path, self._catalog_file_path)
+        self._changed = False
+
+    def __load(self):
+        if not os.path.exists(self._catalog_file_path):
+            return
+        try:
+            with open(self._catalog_file_path) as in_file:
+                catalog = json.load(in_file)
+        except ValueError:
+            # a broken catalog is rebuilt on the next refresh
+            return
+        if catalog.get("version") == CATALOG_VERSION:
+            self._tiles = catalog["tiles"]
+
+    @staticmethod
+    def __read_entry(file_path, stat):
+        header = LasHeader.read(file_path)
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "min": list(header.min),
+            "max": list(header.max),
+            "scale": list(header.scale),
+            "offset": list(header.offset),
+            "point_format": header.point_format,
+            "point_count": header.point_count,
+            "class_counts": None,
+            "sha1": None,
+        }
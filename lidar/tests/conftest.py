@@ -0,0 +1,65 @@
+import dataclasses
+import json
+import os
+import sys
+import numpy as np
+import pytest
+import utm
+
+# the pipeline modules import their siblings by name, as they are run from the source folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lidar"))
+
+# offsets of the CoV tiles, the raw X/Y of a tile are centimetres from them
+EAST_OFFSET = 4000
+NORTH_OFFSET = 50000
+
+
+@pytest.fixture
+def write_las_tile():
+    """Write a LAS tile in the CoV layout, from points in metres relative to its south west corner"""
+    import laspy
+    from laspy.file import File
+
+    def write(dir_path, east, north, points, classification):
+        file_path = os.path.join(str(dir_path), "%dE_%dN.las" % (east, north))
+        out_file = File(file_path, mode="w", header=laspy.header.Header(point_format=1))
+        out_file.header.scale = [0.01, 0.01, 0.01]
+        out_file.header.offset = [EAST_OFFSET * 100, NORTH_OFFSET * 100, 0]
+        out_file.X = np.floor((points[:, 0] + (east - EAST_OFFSET) * 100) * 100).astype(np.int64)
+        out_file.Y = np.floor((points[:, 1] + (north - NORTH_OFFSET) * 100) * 100).astype(np.int64)
+        out_file.Z = np.zeros(points.shape[0], dtype=np.int64)
+        out_file.Classification = np.asarray(classification, dtype=np.uint8)
+        out_file.close()
+        return file_path
+    return write
+
+
+@pytest.fixture
+def write_boundary():
+    """Write a GeoJSON boundary from a ring in UTM 10 metres"""
+    def write(file_path, ring):
+        ring = np.asarray(ring, dtype=np.float64)
+        latitude, longitude = utm.to_latlon(ring[:, 0], ring[:, 1], 10, "U")
+        coordinates = np.column_stack((longitude, latitude)).tolist()
+        with open(str(file_path), "w") as out_file:
+            json.dump({"type": "FeatureCollection", "features": [{
+                "type": "Feature", "properties": {},
+                "geometry": {"type": "Polygon", "coordinates": [coordinates + coordinates[:1]]}}]},
+                out_file)
+        return str(file_path)
+    return write
+
+
+@pytest.fixture
+def labelled_settings(tmp_path):
+    """Labelled settings with every path the pipeline writes to in the test's folder"""
+    def settings(boundary_path, **changes):
+        from lidar.settings import LabelledSettings
+
+        defaults = LabelledSettings()
+        return dataclasses.replace(defaults, **dict({"paths": dataclasses.replace(
+            defaults.paths, data_folder_path=str(tmp_path / "data"), tests_folder_path=str(tmp_path / "tests"),
+            boundary_geojson_file_path=str(boundary_path), point_store_path=str(tmp_path / "point_store"),
+            tile_cache_dir=str(tmp_path / "tile_cache"), artifact_cache_dir=str(tmp_path / "artifact_cache"))},
+            **changes))
+    return settings
@@ -0,0 +1,62 @@
+import numpy as np
+from shapely.geometry import Polygon
+from lidar.artifact_cache import ArtifactCache, concatenate_polygon_arrays, polygons_from_arrays, polygons_to_arrays
+from lidar.processing import ProcessingPipeline
+
+
+def test_artifacts_are_keyed_on_inputs_and_parameters(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    points = np.arange(10, dtype=np.int32)
+    key = ArtifactCache.key("cluster_labels", [ArtifactCache.array_hash(points)], {"eps": 300})
+    assert cache.load("cluster_labels", key) is None
+    cache.save("cluster_labels", key, labels=points % 3)
+    assert np.array_equal(cache.load("cluster_labels", key)["labels"], points % 3)
+
+    # another parameter, other input points or another stage never get the artifact
+    assert key != ArtifactCache.key("cluster_labels", [ArtifactCache.array_hash(points)], {"eps": 200})
+    assert key != ArtifactCache.key("cluster_labels", [ArtifactCache.array_hash(points + 1)], {"eps": 300})
+    assert key != ArtifactCache.key("polygons", [ArtifactCache.array_hash(points)], {"eps": 300})
+    assert ArtifactCache.array_hash(points) != ArtifactCache.array_hash(points.astype(np.int64))
+    assert cache.load("polygons", key) is None
+
+
+def test_polygons_round_trip():
+    polygons = [Polygon([[0, 0], [0, 10], [10, 10]]), Polygon([[20, 20], [20, 30], [30, 30], [30, 20]])]
+    arrays = polygons_to_arrays(polygons)
+    assert [polygon.equals(original) for polygon, original in zip(
+        polygons_from_arrays(arrays["coordinates"], arrays["offsets"]), polygons)] == [True, True]
+
+    # polygons packed batch by batch join into the arrays of all of them, and unpack batch by batch
+    joined = concatenate_polygon_arrays([polygons_to_arrays(polygons[:1]), polygons_to_arrays([]),
+                                         polygons_to_arrays(polygons[1:])])
+    assert np.array_equal(joined["coordinates"], arrays["coordinates"])
+    assert np.array_equal(joined["offsets"], arrays["offsets"])
+    assert polygons_from_arrays(joined["coordinates"], joined["offsets"][1:])[0].equals(polygons[1])
+
+
+def test_stored_points_hit_the_cluster_labels_of_the_extracted_points(tmp_path, write_las_tile, write_boundary, labelled_settings):
+    rng = np.random.default_rng(0)
+    crowns = np.vstack([centre + rng.normal(0, 3, (300, 2)) for centre in ((200, 300), (500, 500), (800, 700))])
+    ground = rng.uniform(0, 1000, (500, 2))
+    tile_dir = tmp_path / "tiles"
+    tile_dir.mkdir()
+    write_las_tile(tile_dir, 4810, 54560, np.vstack((crowns, ground)), [5] * crowns.shape[0] + [2] * 500)
+    boundary = write_boundary(tmp_path / "boundary.geojson", [
+        (480900, 5455900), (482100, 5455900), (482100, 5457100), (480900, 5457100)])
+    settings = labelled_settings(boundary, workers=1)
+
+    labels = []
+    features = []
+    for run in ("extracted", "stored"):
+        pipeline = ProcessingPipeline(notebook=True, settings=settings)
+        pipeline.pre_process_las_files(str(tile_dir))
+        labels.append(pipeline.cluster_points(*pipeline.collect_points_from_map()))
+        # the second run maps the point store and gets the labels clustered from the extracted points
+        expected = (0, 0) if run == "extracted" else (1, 1)
+        assert (pipeline.instrumentation.record("boundary_filter").cache_hits,
+                pipeline.instrumentation.record("clustering").cache_hits) == expected
+        features.append([feature["geometry"] for feature in pipeline.iter_polygon_features()])
+        assert pipeline.instrumentation.record("hull").cache_hits == expected[0]
+    assert np.array_equal(labels[0], labels[1]) and labels[0].max() == 2
+    # the polygons packed while streaming are the ones served from the cache
+    assert len(features[0]) == 3 and features[0] == features[1]
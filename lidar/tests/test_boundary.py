@@ -0,0 +1,24 @@
+import numpy as np
+from shapely.geometry import Point
+from lidar.boundary import CampusBoundary, TileBoundaryState
+
+
+def test_tiles_are_classified_inside_outside_or_straddling(tmp_path, write_boundary):
+    # a 800 m square boundary, 100 m into the 4810E_54560N tile
+    ring = [[481100, 5456100], [481900, 5456100], [481900, 5456900], [481100, 5456900]]
+    boundary = CampusBoundary(write_boundary(tmp_path / "boundary.geojson", ring), 4810, 54560)
+    min_x, min_y, max_x, max_y = boundary.bounds
+    assert np.allclose([min_x, min_y, max_x, max_y], [10000, 10000, 90000, 90000], atol=1)
+
+    assert boundary.classify_extent(20000, 20000, 30000, 30000) == TileBoundaryState.INSIDE
+    assert boundary.classify_extent(-20000, 20000, -10000, 30000) == TileBoundaryState.OUTSIDE
+    assert boundary.classify_extent(100000, 100000, 110000, 110000) == TileBoundaryState.OUTSIDE
+    assert boundary.classify_extent(5000, 20000, 15000, 30000) == TileBoundaryState.STRADDLING
+    assert boundary.classify_extent(0, 0, 100000, 100000) == TileBoundaryState.STRADDLING
+
+    # the points of a straddling tile are filtered one by one, the same way shapely would
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(5000, 15000, 500), rng.uniform(20000, 30000, 500)
+    expected = [boundary.polygon.contains(Point(point_x, point_y)) for point_x, point_y in zip(x, y)]
+    assert np.array_equal(boundary.contains(x, y), expected)
+    assert 0 < np.count_nonzero(expected) < 500
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from sklearn.cluster import DBSCAN
+from lidar.clustering import dbscan_labels, ClusterIndex, DBSCANSweep
+
+
+def clustered_points(seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(0, 20000, (80, 2))
+    crowns = centres[:, None, :] + rng.normal(0, 200, (80, 40, 2))
+    noise = rng.uniform(0, 20000, (1000, 2))
+    return np.vstack((crowns.reshape(-1, 2), noise)).round()
+
+
+def test_tiled_dbscan_matches_sklearn():
+    points = clustered_points()
+    expected = DBSCAN(eps=300, min_samples=10).fit(points).labels_
+    for tile_size in (600, 2500, 50000):
+        labels = dbscan_labels(points[:, 0], points[:, 1], 300, 10,
+                               backend="tiled", tile_size=tile_size, workers=1)
+        assert np.array_equal(labels, expected)
+    # the tiles are clustered in spawned processes, like from the GUI
+    labels = dbscan_labels(points[:, 0], points[:, 1], 300, 10, backend="tiled", tile_size=2500,
+                           workers=2, start_method="spawn")
+    assert np.array_equal(labels, expected)
+
+
+def test_grid_dbscan_matches_sklearn():
+    points = clustered_points(1)
+    # points exactly eps apart are neighbours in both
+    points = np.vstack((points, [[-300, -300], [-300, 0], [-300, 300], [0, -300]]))
+    for min_samples in (2, 10):
+        expected = DBSCAN(eps=300, min_samples=min_samples).fit(points).labels_
+        labels = dbscan_labels(points[:, 0], points[:, 1], 300, min_samples, backend="grid")
+        assert np.array_equal(labels, expected)
+
+
+def test_cluster_index_groups_points_by_label():
+    labels = np.array([2, -1, 0, 2, 0, 2, -1])
+    point_x = np.arange(7) * 10
+    point_y = np.arange(7) * -10
+    clusters = ClusterIndex(labels, point_x, point_y)
+    assert len(clusters) == 3
+    assert clusters.sizes.tolist() == [2, 0, 3]
+    assert clusters[0][:, 0].tolist() == [20, 40]
+    assert clusters[1].shape == (0, 2)
+    assert clusters.indices(2).tolist() == [0, 3, 5]
+    assert np.shares_memory(clusters[2], clusters.points)
+    assert clusters.bounding_boxes[2].tolist() == [0, -50, 50, 0]
+    assert np.all(np.isnan(clusters.bounding_boxes[1]))
+
+
+def test_dbscan_sweep_matches_grid_dbscan():
+    points = clustered_points(2)
+    # points on top of each other are at distance 0
+    points = np.vstack((points, points[:50]))
+    sweep = DBSCANSweep(points[:, 0], points[:, 1], 400)
+    results = sweep.sweep([300, 150, 400], [1, 5, 10], keep_labels=True)
+    assert [(result.eps, result.min_samples) for result in results][:2] == [(300, 1), (300, 5)]
+    for result in results:
+        expected = dbscan_labels(points[:, 0], points[:, 1], result.eps, result.min_samples, backend="grid")
+        assert np.array_equal(result.labels, expected)
+        assert result.cluster_count == expected.max() + 1
+        assert result.noise_fraction == np.mean(expected < 0)
+        assert result.area_summary()["polygons"] <= result.cluster_count
+    assert np.array_equal(sweep.labels(300, 10), results[2].labels)
+    with pytest.raises(ValueError):
+        sweep.labels(500, 10)
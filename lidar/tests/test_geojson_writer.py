@@ -0,0 +1,35 @@
+import json
+from lidar.geojson_writer import GeoJSONStreamWriter
+
+
+def feature(index, size):
+    ring = [[-123.25 + index * 1e-9, 49.26], [-123.25, 49.26 + size], [-123.25 + size, 49.26], [-123.25, 49.26]]
+    return {"type": "Feature", "properties": {"id": index},
+            "geometry": {"type": "Polygon", "coordinates": [ring]}}
+
+
+def read(file_path):
+    with open(file_path) as in_file:
+        return json.load(in_file)
+
+
+def test_streamed_file_is_a_feature_collection_when_empty_and_partial(tmp_path):
+    file_path = str(tmp_path / "map.geojson")
+    with GeoJSONStreamWriter(file_path) as writer:
+        assert read(file_path) == {"type": "FeatureCollection", "features": []}
+    assert read(file_path) == {"type": "FeatureCollection", "features": []}
+
+    writer = GeoJSONStreamWriter(file_path, precision=6)
+    writer.write(feature(0, 0.001))
+    # a long feature followed by a short one, the footer of the long one must not be left behind
+    writer.write_all([feature(1, 0.123456789), feature(2, 0.1)])
+    # read while the writer is still open, as if the process died here
+    partial = read(file_path)
+    assert partial["type"] == "FeatureCollection" and writer.count == 3
+    assert [item["properties"]["id"] for item in partial["features"]] == [0, 1, 2]
+    assert partial["features"][1]["geometry"]["coordinates"][0][1] == [-123.25, 49.383457]
+    assert partial["features"][0]["geometry"]["coordinates"][0][0] == [-123.25, 49.26]
+
+    writer.write(feature(3, 0.2))
+    writer.close()
+    assert [item["properties"]["id"] for item in read(file_path)["features"]] == [0, 1, 2, 3]
@@ -0,0 +1,32 @@
+import numpy as np
+from shapely.geometry import MultiPoint
+from lidar.hull import concave_hull, reduced_concave_hull, boundary_mask
+
+
+def test_concave_hull_is_one_polygon_around_every_point():
+    rng = np.random.default_rng(0)
+    # two crowns side by side, the hull should follow the gap between them
+    points = np.vstack((rng.normal(0, 300, (500, 2)),
+                        rng.normal(0, 300, (500, 2)) + [1000, 0])).round()
+    hull = concave_hull(points)
+    assert hull.geom_type == "Polygon" and hull.is_valid
+    assert hull.buffer(1e-6).contains(MultiPoint(points))
+    assert hull.area < MultiPoint(points).convex_hull.area
+
+
+def test_concave_hull_degenerate_clusters():
+    assert concave_hull(np.array([[0, 0], [1, 1], [2, 2], [3, 3]])).geom_type == "LineString"
+    square = np.array([[0, 0], [0, 10], [10, 0], [10, 10], [5, 5]])
+    assert concave_hull(square, 0).area == 100
+
+
+def test_reduced_concave_hull_follows_the_full_outline():
+    rng = np.random.default_rng(1)
+    # a dense canopy patch, 10 points per square metre
+    points = rng.uniform(0, 3000, (90000, 2)).round()
+    points = points[np.hypot(*(points - 1500).T) < 1500]
+    candidates = boundary_mask(points, 100)
+    assert np.count_nonzero(candidates) < points.shape[0] / 3
+    reduced = reduced_concave_hull(points, 100)
+    full = concave_hull(points)
+    assert reduced.symmetric_difference(full).area < full.area * 1e-3
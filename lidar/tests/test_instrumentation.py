@@ -0,0 +1,59 @@
+import json
+import time
+import numpy as np
+import pytest
+from lidar.instrumentation import RunInstrumentation
+
+
+def test_nested_stages_are_measured_on_their_own(tmp_path):
+    instrumentation = RunInstrumentation("test")
+
+    def produce():
+        for item in range(3):
+            time.sleep(0.02)
+            yield item
+
+    with instrumentation.stage("export") as export:
+        for _ in instrumentation.iterate("hull", produce()):
+            with instrumentation.stage("projection", points_in=10) as projection:
+                projection.points_out += 1
+            export.points_out += 1
+
+    hull, projection = instrumentation.record("hull"), instrumentation.record("projection")
+    assert hull.wall_time >= 0.06 and export.wall_time < 0.03
+    assert projection.calls == 3 and projection.points_in == 30 and projection.points_out == 3
+    assert export.points_out == 3 and export.points_per_second > 0
+
+    report = json.load(open(instrumentation.write_report(str(tmp_path))))
+    assert [stage["name"] for stage in report["stages"]] == ["export", "hull", "projection"]
+    assert report["pipeline"] == "test" and report["wall_time_s"] >= hull.wall_time
+
+
+def test_peak_rss_of_the_process_and_on_request_of_the_stage():
+    # by default the stages get the peaks of the process, the high water mark is left alone
+    instrumentation = RunInstrumentation("test")
+    with instrumentation.stage("read") as record:
+        pass
+    assert record.peak_rss_mb is None and record.process_peak_rss_mb > 0
+    report = instrumentation.report()
+    assert report["process_peak_rss_mb"] >= record.process_peak_rss_mb
+    assert "process_peak_worker_rss_mb" in report["stages"][0]
+
+    instrumentation = RunInstrumentation("test", stage_peak_rss=True)
+    with instrumentation.stage("outer"):
+        with instrumentation.stage("large"):
+            large = np.ones(40 * 1024 * 1024 // 8)
+            large[::512] = 2.0
+            del large
+    with instrumentation.stage("small"):
+        small = np.ones(1024)
+        del small
+
+    outer, large, small = (instrumentation.record(name) for name in ("outer", "large", "small"))
+    if large.peak_rss_mb is None:
+        pytest.skip("the high water mark cannot be reset on this platform")
+    # the 40 MB of the large stage are not charged to the stage running after it
+    assert large.peak_rss_mb - small.peak_rss_mb > 30
+    assert outer.peak_rss_mb >= large.peak_rss_mb
+    report = instrumentation.report()
+    assert report["process_peak_rss_mb"] >= large.peak_rss_mb
@@ -0,0 +1,35 @@
+import numpy as np
+from laspy.file import File
+from lidar.las_reader import LasChunkReader
+
+
+def concatenate(chunks):
+    chunks = list(chunks)
+    return {dimension: np.concatenate([chunk[dimension] for chunk in chunks]) for dimension in chunks[0]}
+
+
+def test_chunked_reads_equal_a_whole_file_read(tmp_path, write_las_tile):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 100, (1003, 2))
+    classification = rng.choice([1, 2, 5], 1003)
+    file_path = write_las_tile(tmp_path, 4810, 54560, points, classification)
+
+    whole = concatenate(LasChunkReader(file_path))
+    in_file = File(file_path, mode="r")
+    assert np.array_equal(whole["X"], in_file.X) and np.array_equal(whole["Y"], in_file.Y)
+    assert np.array_equal(whole["Z"], in_file.Z)
+    assert np.array_equal(whole["classification"], in_file.Classification)
+    in_file.close()
+
+    # a chunk size that does not divide the point count leaves a short last chunk
+    reader = LasChunkReader(file_path, chunk_size=97)
+    chunks = list(reader)
+    assert len(chunks) == 11 and reader.header.point_count == 1003
+    chunked = concatenate(chunks)
+    for dimension in whole:
+        assert np.array_equal(chunked[dimension], whole[dimension])
+
+    vegetation = concatenate(LasChunkReader(file_path, chunk_size=97).iter_classified([5]))
+    mask = whole["classification"] == 5
+    assert np.array_equal(vegetation["X"], whole["X"][mask])
+    assert np.array_equal(vegetation["Y"], whole["Y"][mask])
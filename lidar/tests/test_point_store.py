@@ -0,0 +1,55 @@
+import json
+import os
+import numpy as np
+import pytest
+from lidar.point_store import METADATA_FILE_NAME, PointStore
+
+
+def test_points_round_trip_and_stale_stores_are_rejected(tmp_path):
+    store = PointStore(str(tmp_path / "points"))
+    assert not store.exists()
+    with pytest.raises(LookupError):
+        store.load()
+
+    x = np.array([0, 150, -20, 2 ** 30], dtype=np.int64)
+    y = np.array([7, 0, 99, -5], dtype=np.int64)
+    store.save(x, y, {"key": "abc", "min_east": 4810, "min_north": 54560, "units": "cm"})
+    point_x, point_y, metadata = store.load()
+    assert point_x.dtype == np.int32 and np.array_equal(point_x, x) and np.array_equal(point_y, y)
+    assert not point_x.flags.writeable
+    assert metadata["key"] == "abc" and metadata["count"] == 4 and metadata["min_east"] == 4810
+    del point_x, point_y
+
+    metadata_path = os.path.join(store.store_dir, METADATA_FILE_NAME)
+    # metadata of another store version
+    with open(metadata_path, "w") as out_file:
+        json.dump(dict(metadata, version=metadata["version"] + 1), out_file)
+    with pytest.raises(LookupError):
+        store.load()
+
+    # points that do not match the count of the metadata, e.g. replaced by another run
+    with open(metadata_path, "w") as out_file:
+        json.dump(metadata, out_file)
+    np.save(os.path.join(store.store_dir, "y.npy"), y[:3].astype(np.int32))
+    with pytest.raises(LookupError):
+        store.load()
+
+    # a save interrupted before the metadata was written
+    os.remove(metadata_path)
+    assert not store.exists()
+    with pytest.raises(LookupError):
+        store.load()
+
+
+def test_saving_over_a_store_keeps_the_loaded_points(tmp_path):
+    store = PointStore(str(tmp_path / "points"))
+    x = np.arange(100000, dtype=np.int32)
+    store.save(x, x * 2, {"key": "first"})
+    point_x, point_y, _ = store.load()
+
+    # a second run saves fewer points over the store while the first map is still in use
+    store.save(x[:10] + 7, x[:10], {"key": "second"})
+    assert np.array_equal(point_x, x) and np.array_equal(point_y, x * 2)
+    new_x, _, metadata = store.load()
+    assert metadata["key"] == "second" and np.array_equal(new_x, x[:10] + 7)
+    assert sorted(os.listdir(store.store_dir)) == [METADATA_FILE_NAME, "x.npy", "y.npy"]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from lidar.polygon_binary import PolygonBinaryReader, read_polygon_features, write_polygon_features
+
+
+def _features():
+    rng = np.random.default_rng(0)
+    features = []
+    for index in range(50):
+        center = rng.uniform([-123.26, 49.25], [-123.24, 49.27])
+        angles = np.sort(rng.uniform(0, 2 * np.pi, 30))
+        ring = center + 1e-4 * np.column_stack((np.cos(angles), np.sin(angles)))
+        ring = np.vstack([ring, ring[:1]]).tolist()
+        features.append({"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [ring]},
+                         "properties": {"id": "L-YEAR{}".format(index)}})
+    # a multipolygon with a hole, as the intersections of the orthophoto pipeline can be
+    square = [[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]
+    hole = [[0.25, 0.25], [0.75, 0.25], [0.75, 0.75], [0.25, 0.75], [0.25, 0.25]]
+    features.append({"type": "Feature", "geometry": {"type": "MultiPolygon", "coordinates": [
+        [square, hole], [[[2, 2], [2, 3], [3, 3], [2, 2]]]]}, "properties": {"id": "O-0"}})
+    return features
+
+
+def test_round_trip(tmp_path):
+    features = _features()
+    file_path = str(tmp_path / "polygons.plyb")
+    assert write_polygon_features(file_path, iter(features), precision=6) == len(features)
+
+    read = read_polygon_features(file_path)
+    assert [feature["properties"]["id"] for feature in read] == [
+        feature["properties"]["id"] for feature in features]
+    for original, copy in zip(features, read):
+        assert copy["geometry"]["type"] == original["geometry"]["type"]
+        original_rings = original["geometry"]["coordinates"]
+        copy_rings = copy["geometry"]["coordinates"]
+        if original["geometry"]["type"] == "Polygon":
+            original_rings, copy_rings = [original_rings], [copy_rings]
+        assert len(copy_rings) == len(original_rings)
+        for original_polygon, copy_polygon in zip(original_rings, copy_rings):
+            assert len(copy_polygon) == len(original_polygon)
+            for original_ring, copy_ring in zip(original_polygon, copy_polygon):
+                assert np.allclose(copy_ring, np.round(original_ring, 6), rtol=0, atol=1e-9)
+
+
+def test_bounding_boxes(tmp_path):
+    features = _features()
+    file_path = str(tmp_path / "polygons.plyb")
+    write_polygon_features(file_path, features)
+    reader = PolygonBinaryReader(file_path)
+    assert len(reader) == len(features)
+    assert reader.bbox == pytest.approx([-123.2601, 0, 3, 49.2701], abs=1e-3)
+    first = np.asarray(features[0]["geometry"]["coordinates"][0])
+    assert reader.bounding_boxes[0] == pytest.approx(
+        [*first.min(axis=0), *first.max(axis=0)], abs=1e-6)
+    assert list(reader.features_in_bbox(1.5, 1.5, 4, 4)) == [len(features) - 1]
+
+
+def test_extents_that_overflow_the_format_are_refused(tmp_path):
+    # 10 degrees wide at 9 decimals is 10^10 quantised units, more than 32 bits hold
+    features = [{"type": "Feature", "properties": {"id": "L-YEAR0"}, "geometry": {"type": "Polygon", "coordinates": [
+        [[-128.0, 49.0], [-118.0, 49.0], [-118.0, 49.5], [-128.0, 49.0]]]}}]
+    file_path = tmp_path / "polygons.plyb"
+    with pytest.raises(ValueError, match="precision"):
+        write_polygon_features(str(file_path), features, precision=9)
+    assert not file_path.exists()
+
+    assert write_polygon_features(str(file_path), features, precision=6) == 1
+    assert read_polygon_features(str(file_path))[0]["geometry"]["coordinates"][0][1] == [-118.0, 49.0]
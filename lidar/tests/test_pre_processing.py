@@ -0,0 +1,118 @@
+import dataclasses
+import os
+import numpy as np
+import pytest
+from lidar import pre_processing
+from lidar.boundary import TileBoundaryState
+from lidar.pre_processing import PreProcessor, extract_compact_las_data, grid_downsample_index
+
+
+def test_grid_downsample_caps_every_cell_and_is_deterministic():
+    rng = np.random.default_rng(1)
+    # a dense canopy of 2000 points in a 2 x 2 m square and a sparse tree of 2 points
+    x = np.concatenate((rng.integers(0, 200, 2000), [1000, 1090])).astype(np.int32)
+    y = np.concatenate((rng.integers(0, 200, 2000), [1000, 1020])).astype(np.int32)
+
+    index = grid_downsample_index(x, y, 100, 3, np.random.default_rng(7))
+    assert np.all(np.diff(index) > 0)
+    cells, counts = np.unique(np.column_stack((x[index] // 100, y[index] // 100)), axis=0, return_counts=True)
+    # the 4 canopy cells are capped and the sparse cell keeps all of its points
+    assert len(cells) == 5 and counts.tolist() == [3, 3, 3, 3, 2]
+    assert {2000, 2001} <= set(index.tolist())
+
+    # the same seed keeps the same points, another seed picks others within the cap
+    assert np.array_equal(index, grid_downsample_index(x, y, 100, 3, np.random.default_rng(7)))
+    other = grid_downsample_index(x, y, 100, 3, np.random.default_rng(8))
+    assert other.shape == index.shape and not np.array_equal(index, other)
+
+
+# a boundary around the 4810E tile and half of the 4811E tile, far from the 4813E tile
+BOUNDARY = [(480950, 5455950), (481150, 5455950), (481150, 5456150), (480950, 5456150)]
+
+
+def opened_files(monkeypatch):
+    """record the tiles the pre processor reads points from"""
+    opened = []
+
+    class RecordingReader(pre_processing.LasChunkReader):
+        def __init__(self, file_path, *args, **kwargs):
+            opened.append(os.path.basename(file_path))
+            super().__init__(file_path, *args, **kwargs)
+
+    monkeypatch.setattr(pre_processing, "LasChunkReader", RecordingReader)
+    return opened
+
+
+def test_boundary_pruning_skips_outside_and_inside_tiles(
+        tmp_path, monkeypatch, write_las_tile, write_boundary, labelled_settings):
+    rng = np.random.default_rng(0)
+    tile_dir = tmp_path / "tiles"
+    tile_dir.mkdir()
+    for east in (4810, 4811, 4813):
+        write_las_tile(tile_dir, east, 54560, rng.uniform(0, 100, (300, 2)), [5] * 300)
+    settings = labelled_settings(write_boundary(tmp_path / "boundary.geojson", BOUNDARY))
+    opened = opened_files(monkeypatch)
+    pre_processor = PreProcessor(str(tile_dir), settings)
+
+    tiles = pre_processor.classify_tiles_against_boundary()
+    states = {os.path.basename(las_file.file_path): las_file.boundary_state for las_file in pre_processor.lasfile_list}
+    assert states == {"4810E_54560N.las": TileBoundaryState.INSIDE, "4811E_54560N.las": TileBoundaryState.STRADDLING,
+                      "4813E_54560N.las": TileBoundaryState.OUTSIDE}
+    for las_file in tiles:
+        las_file.point_x, las_file.point_y = extract_compact_las_data(pre_processor, las_file)
+        las_file.valid = True
+    assert sorted(opened) == ["4810E_54560N.las", "4811E_54560N.las"]
+
+    tested = []
+    filter_points = pre_processor.filter_out_of_campus_points
+    monkeypatch.setattr(pre_processor, "filter_out_of_campus_points",
+                        lambda x, y: tested.append(x.shape[0]) or filter_points(x, y))
+    point_x, point_y = pre_processor.filter_out_of_campus_tiles(pre_processor.lasfile_list)
+    # only the straddling tile goes through the point in polygon test
+    assert tested == [300]
+
+    # the same points as testing every point of the tiles on campus
+    expected_x, expected_y = filter_points(np.concatenate([las_file.point_x for las_file in tiles]),
+                                           np.concatenate([las_file.point_y for las_file in tiles]))
+    assert np.array_equal(point_x, expected_x) and np.array_equal(point_y, expected_y)
+    assert 300 < point_x.shape[0] < 600
+
+
+def test_one_read_extracts_several_classes_like_one_read_per_class(
+        tmp_path, monkeypatch, write_las_tile, write_boundary, labelled_settings):
+    rng = np.random.default_rng(0)
+    tile_dir = tmp_path / "tiles"
+    tile_dir.mkdir()
+    classification = rng.choice([2, 3, 5], 3000, p=[0.3, 0.2, 0.5])
+    write_las_tile(tile_dir, 4810, 54560, rng.uniform(0, 100, (3000, 2)), classification)
+    write_las_tile(tile_dir, 4811, 54560, rng.uniform(0, 100, (100, 2)), [2] * 100)
+    boundary = write_boundary(tmp_path / "boundary.geojson", BOUNDARY)
+    opened = opened_files(monkeypatch)
+
+    for mode in ("random", "grid"):
+        settings = labelled_settings(boundary)
+        # the classes are down sampled, so the seeded sampling has to match as well
+        settings = dataclasses.replace(settings, down_sample=dataclasses.replace(
+            settings.down_sample, min_points_for_downsize=100, downsample_mode=mode, down_size=4))
+        extracted = {}
+        for run, index_types in (("together", [5, 2, 6]), ("alone", [5]), ("alone", [2]), ("alone", [6])):
+            # a fresh tile cache for every read
+            settings = dataclasses.replace(settings, paths=dataclasses.replace(
+                settings.paths, tile_cache_dir=str(tmp_path / ("cache_%s_%s_%d" % (mode, run, index_types[0])))))
+            pre_processor = PreProcessor(str(tile_dir), settings)
+            las_file = pre_processor.lasfile_list[0]
+            del opened[:]
+            extracted[run, tuple(index_types)] = pre_processor.extract_relative_las_data_by_class(las_file, index_types)
+            assert opened == ["4810E_54560N.las"]
+
+        together = extracted["together", (5, 2, 6)]
+        for index_type in (5, 2, 6):
+            alone = extracted["alone", (index_type,)][index_type]
+            assert np.array_equal(together[index_type][0], alone[0])
+            assert np.array_equal(together[index_type][1], alone[1])
+        assert 0 < together[2][0].shape[0] < np.count_nonzero(classification == 2)
+        assert together[6][0].shape[0] == 0 and together[6][1].shape[0] == 0
+
+    # the single class wrapper still raises for a tile without the class
+    with pytest.raises(LookupError):
+        pre_processor.extract_relative_las_data(pre_processor.lasfile_list[1])
@@ -0,0 +1,102 @@
+import dataclasses
+from concurrent.futures import Future
+import numpy as np
+from lidar import processing
+from lidar.clustering import ClusterIndex
+from lidar.processing import ProcessingPipeline, balanced_batches
+
+# a boundary around the 4810E to 4812E tiles of the 54560N row
+BOUNDARY = [(480900, 5455900), (481400, 5455900), (481400, 5456200), (480900, 5456200)]
+
+
+def write_tiles(tile_dir, write_las_tile):
+    rng = np.random.default_rng(0)
+    tile_dir.mkdir()
+    for east, vegetation in ((4810, 400), (4811, 0), (4812, 250)):
+        classification = [5] * vegetation + [2] * 300
+        write_las_tile(tile_dir, east, 54560, rng.uniform(0, 100, (vegetation + 300, 2)), classification)
+
+
+def test_pool_ingest_keeps_the_tile_order(tmp_path, write_las_tile, write_boundary, labelled_settings):
+    write_tiles(tmp_path / "tiles", write_las_tile)
+    boundary = write_boundary(tmp_path / "boundary.geojson", BOUNDARY)
+
+    tiles = {}
+    for workers in (1, 2):
+        settings = labelled_settings(boundary, workers=workers, start_method="spawn")
+        # each run extracts the tiles itself instead of getting them from the tile cache
+        settings = dataclasses.replace(settings, paths=dataclasses.replace(
+            settings.paths, tile_cache_dir=str(tmp_path / ("tile_cache_%d" % workers))))
+        pipeline = ProcessingPipeline(notebook=True, settings=settings)
+        pipeline.pre_process_las_files(str(tmp_path / "tiles"))
+        tiles[workers] = pipeline.pre_processor.lasfile_list
+        assert pipeline.instrumentation.record("tile_read").points_out == 650
+
+    assert [las_file.file_path for las_file in tiles[1]] == [las_file.file_path for las_file in tiles[2]]
+    # the tile without high vegetation comes back invalid
+    assert [las_file.valid for las_file in tiles[2]] == [True, False, True]
+    assert tiles[2][1].file_path.endswith("4811E_54560N.las")
+    for serial, pooled in zip(tiles[1], tiles[2]):
+        if serial.valid:
+            assert pooled.point_x.dtype == np.int32
+            assert np.array_equal(serial.point_x, pooled.point_x) and np.array_equal(serial.point_y, pooled.point_y)
+    assert [las_file.point_x.shape[0] for las_file in tiles[2] if las_file.valid] == [400, 250]
+
+
+def test_batches_are_balanced_and_largest_first():
+    sizes = np.array([5, 400, 30, 120, 90, 7, 250, 60, 35, 3])
+    batches = balanced_batches(sizes, 4)
+    assert sorted(cluster for batch in batches for cluster in batch) == list(range(10))
+    assert batches[0][0] == 1
+    # every cluster comes after the larger ones, so the largest batches are submitted first
+    order = [cluster for batch in batches for cluster in batch]
+    assert list(sizes[order]) == sorted(sizes, reverse=True)
+    totals = [int(sizes[batch].sum()) for batch in batches]
+    assert len(batches) <= 5 and all(total >= sizes.sum() / 4 for total in totals[:-1])
+    assert max(totals) < 2 * sizes.sum() / 4
+    assert balanced_batches(np.array([], dtype=np.int64), 4) == []
+
+
+class ReversedExecutor:
+    """runs the batches on submit and hands them out last submitted first, like workers
+    finishing in an unlucky order"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+def test_polygons_come_out_in_cluster_order_whatever_order_the_workers_finish(
+        tmp_path, monkeypatch, write_boundary, labelled_settings):
+    rng = np.random.default_rng(0)
+    centres = rng.uniform(0, 100000, (12, 2))
+    sizes = rng.integers(10, 200, 12)
+    labels = np.repeat(np.arange(12), sizes)
+    points = np.vstack([centre + rng.normal(0, 200, (size, 2)) for centre, size in zip(centres, sizes)])
+    clusters = ClusterIndex(labels, points[:, 0], points[:, 1])
+    boundary = write_boundary(tmp_path / "boundary.geojson", BOUNDARY)
+
+    monkeypatch.setattr(processing, "ProcessPoolExecutor", ReversedExecutor)
+    monkeypatch.setattr(processing, "as_completed", lambda futures: reversed(list(futures)))
+    polygons = {}
+    for workers in (1, 3):
+        pipeline = ProcessingPipeline(notebook=True, settings=labelled_settings(boundary, workers=workers))
+        progress = []
+        polygons[workers] = list(pipeline.iter_cluster_polygons(
+            clusters, lambda finished, total: progress.append((finished, total))))
+        assert [cluster for cluster, _ in polygons[workers]] == list(range(12))
+        assert progress[-1] == (12, 12) and [finished for finished, _ in progress] == sorted(
+            finished for finished, _ in progress)
+
+    assert all(len(serial) == len(pooled) and all(a.equals(b) for a, b in zip(serial, pooled))
+               for (_, serial), (_, pooled) in zip(polygons[1], polygons[3]))
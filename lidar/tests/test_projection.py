@@ -0,0 +1,22 @@
+import numpy as np
+import utm
+from pyproj import Transformer
+from lidar.projection import relative_rings_to_lonlat
+
+
+def test_batched_rings_match_pyproj_point_by_point():
+    rng = np.random.default_rng(0)
+    rings = [rng.integers(-50000, 500000, (length, 2)) for length in (4, 1, 25, 7)]
+    projected = relative_rings_to_lonlat(rings, 4810, 54560)
+    assert [ring.shape for ring in projected] == [(4, 2), (1, 2), (25, 2), (7, 2)]
+
+    transformer = Transformer.from_crs("EPSG:32610", "EPSG:4326", always_xy=True)
+    for ring, lonlat in zip(rings, projected):
+        for (x, y), (longitude, latitude) in zip(ring, lonlat):
+            east, north = 481000 + x / 100.0, 5456000 + y / 100.0
+            assert np.allclose((longitude, latitude), transformer.transform(east, north), rtol=0, atol=1e-12)
+            # the same place as the utm projection the pipeline used before
+            expected_latitude, expected_longitude = utm.to_latlon(east, north, 10, "U")
+            assert abs(latitude - expected_latitude) < 1e-7 and abs(longitude - expected_longitude) < 1e-7
+
+    assert relative_rings_to_lonlat([], 4810, 54560) == []
@@ -0,0 +1,37 @@
+import configparser
+import dataclasses
+import os
+import pytest
+from lidar.settings import LabelledSettings
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "lidar", "configs", "labelled_config.ini")
+
+
+def test_labelled_settings_are_read_once_and_validated():
+    config = configparser.ConfigParser()
+    config.read(CONFIG_PATH)
+    settings = LabelledSettings.from_config(config)
+    assert settings.cluster.eps == config.getfloat("Parameters", "eps")
+    assert settings.hull.alphashape_reduction == config.getint("Parameters", "alphashape_reduction")
+    assert settings.paths.tile_cache_dir == config.get("Constants", "tile_cache_dir")
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        settings.cluster.eps = 1.0
+    # a variant is validated like the settings read from a config
+    variant = dataclasses.replace(settings, cluster=dataclasses.replace(settings.cluster, eps=200.0))
+    assert variant.cluster.eps == 200.0 and settings.cluster.eps == config.getfloat("Parameters", "eps")
+    with pytest.raises(ValueError, match="min_sample"):
+        dataclasses.replace(settings.cluster, min_sample=0)
+    with pytest.raises(ValueError, match="dbscan_backend"):
+        dataclasses.replace(settings.cluster, dbscan_backend="grids")
+    # the neighbour graph is built up to the larger of eps and sweep_max_eps, so eps may exceed it
+    config.set("Parameters", "eps", "%s" % (config.getfloat("Configure", "sweep_max_eps") + 100))
+    assert LabelledSettings.from_config(config).cluster.eps > settings.cluster.sweep_max_eps
+    # the tile size only bounds eps on the tiled backend
+    large_eps = dataclasses.replace(settings.cluster, eps=500.0, cluster_tile_size=800.0)
+    with pytest.raises(ValueError, match="cluster_tile_size"):
+        dataclasses.replace(large_eps, dbscan_backend="tiled")
+
+    config.set("Parameters", "downsample_mode", "voxel")
+    with pytest.raises(ValueError, match="downsample_mode"):
+        LabelledSettings.from_config(config)
@@ -0,0 +1,36 @@
+import numpy as np
+from shapely.geometry import Polygon
+from lidar.simplification import SimplificationReport, simplify_polygons, vertex_count
+
+
+def test_simplify_keeps_polygons_valid():
+    rng = np.random.default_rng(0)
+    angles = np.linspace(0, 2 * np.pi, 500, endpoint=False)
+    radius = 1000 + rng.normal(0, 20, angles.shape[0])
+    crown = Polygon(np.column_stack((radius * np.cos(angles), radius * np.sin(angles))))
+    # a thin sliver that a careless simplification collapses
+    sliver = Polygon([[0, 0], [1000, 1], [2000, 0], [1000, 2]])
+    report = SimplificationReport(50)
+    simplified = simplify_polygons([crown, sliver], 50, report)
+    assert all(polygon.is_valid and polygon.geom_type == "Polygon" for polygon in simplified)
+    assert vertex_count(simplified[0]) < vertex_count(crown) / 5
+    assert report.polygon_count == 2
+    assert report.vertices_before == vertex_count(crown) + vertex_count(sliver)
+    assert report.vertex_reduction > 0.5
+    assert abs(report.area_change) < 0.02
+
+
+def test_zero_tolerance_keeps_every_vertex():
+    square = Polygon([[0, 0], [0, 10], [5, 10], [10, 10], [10, 0]])
+    assert simplify_polygons([square], 0)[0] is square
+
+
+def test_invalid_polygons_are_repaired_or_counted_as_skipped():
+    # a zero width spike is repaired into the square, a bow tie falls apart into two polygons
+    spike = Polygon([[0, 0], [10, 0], [10, 10], [5, 10], [5, 15], [5, 10], [0, 10]])
+    bow_tie = Polygon([[0, 0], [10, 10], [10, 0], [0, 10]])
+    report = SimplificationReport(1)
+    simplified = simplify_polygons([spike, bow_tie], 1, report)
+    assert simplified[0].is_valid and simplified[0].area == 100
+    assert simplified[1] is bow_tie
+    assert report.to_dict()["polygons"] == 1 and report.repaired_count == 1 and report.skipped_count == 1
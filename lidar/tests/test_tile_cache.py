@@ -0,0 +1,31 @@
+import dataclasses
+import numpy as np
+from lidar.settings import DownSampleSettings
+from lidar.tile_cache import TileCache
+
+
+def parameters(down_sample):
+    return {name: str(value) for name, value in dataclasses.asdict(down_sample).items()}
+
+
+def test_cached_points_are_invalidated_when_the_parameters_change(tmp_path):
+    cache = TileCache(str(tmp_path))
+    down_sample = DownSampleSettings()
+    key = TileCache.key("0123abcd", 5, parameters(down_sample))
+    assert cache.load(key) is None
+
+    x, y = np.arange(10, dtype=np.int32), np.arange(10, 20, dtype=np.int32)
+    cache.save(key, x, y)
+    cached_x, cached_y = cache.load(key)
+    assert np.array_equal(cached_x, x) and np.array_equal(cached_y, y)
+    assert TileCache(str(tmp_path)).load(TileCache.key("0123abcd", 5, parameters(down_sample))) is not None
+
+    # any other down sampling, class or tile content is a miss
+    for changed in (dataclasses.replace(down_sample, grid_cell_size=down_sample.grid_cell_size * 2),
+                    dataclasses.replace(down_sample, max_points_per_cell=down_sample.max_points_per_cell + 1),
+                    dataclasses.replace(down_sample, downsample_seed=down_sample.downsample_seed + 1),
+                    dataclasses.replace(down_sample, downsample_mode="grid")):
+        changed_key = TileCache.key("0123abcd", 5, parameters(changed))
+        assert changed_key != key and cache.load(changed_key) is None
+    assert cache.load(TileCache.key("0123abcd", 2, parameters(down_sample))) is None
+    assert cache.load(TileCache.key("4567ef01", 5, parameters(down_sample))) is None
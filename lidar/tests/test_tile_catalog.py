@@ -0,0 +1,40 @@
+import os
+import numpy as np
+from lidar.tile_catalog import TileCatalog
+
+
+def test_catalog_refreshes_tiles_whose_mtime_or_size_changed(tmp_path, write_las_tile):
+    points = np.random.default_rng(0).uniform(0, 100, (100, 2))
+    first = write_las_tile(tmp_path, 4810, 54560, points, [5] * 60 + [2] * 40)
+    second = write_las_tile(tmp_path, 4811, 54560, points, [5] * 100)
+
+    catalog = TileCatalog(str(tmp_path))
+    assert catalog.refresh() == 2 and catalog.point_count() == 200
+    assert catalog.class_counts(first) == {5: 60, 2: 40}
+    hashes = catalog.content_hashes([first, second])
+    catalog.save()
+
+    # an unchanged tile keeps the counts and the hash read from the saved catalog
+    catalog = TileCatalog(str(tmp_path))
+    assert catalog.refresh() == 2
+    assert catalog.entry(first)["class_counts"] is not None and catalog.entry(first)["sha1"] == hashes[0]
+
+    # a new modification time drops what was derived from the old content
+    stat = os.stat(first)
+    os.utime(first, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    catalog.refresh()
+    assert catalog.entry(first)["class_counts"] is None and catalog.entry(first)["sha1"] is None
+    assert catalog.entry(first)["mtime_ns"] == stat.st_mtime_ns + 10 ** 9
+    assert catalog.entry(second)["sha1"] == hashes[1]
+
+    # so does a new size, even with the same modification time
+    stat = os.stat(second)
+    write_las_tile(tmp_path, 4811, 54560, points[:50], [2] * 50)
+    os.utime(second, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    catalog.refresh()
+    assert catalog.entry(second)["point_count"] == 50 and catalog.class_counts(second) == {2: 50}
+    assert catalog.content_hashes([second]) != [hashes[1]]
+
+    os.remove(first)
+    assert catalog.refresh() == 1 and catalog.file_paths() == [second]
+    assert TileCatalog(str(tmp_path)).point_count() == 50
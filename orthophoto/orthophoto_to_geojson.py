@@ -6,71 +6,90 @@ import matplotlib.pyplot as plt
 from datetime import datetime
 from matplotlib import cm, colors
 from pyproj import Proj
+# the binary polygon format is shared with the lidar pipeline
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lidar", "lidar"))
+from polygon_binary import is_binary_path, write_polygon_features
+from simplification import SimplificationReport, simplify_polygons
+from instrumentation import RunInstrumentation
 UTM_10_PROJ = Proj("+proj=utm +zone=10N, +north +ellps=WGS84 +datum=WGS84 +units=m +no_defs")
 
 # Whether to include the outline of the bounding polygon
 #INCLUDE_BOUNDING_POLYGON = True
 # Include debug print messages
 DEBUG = False
+# The default furthest a contour vertex may be moved when simplifying, in metres. 0 keeps every vertex
+SIMPLIFY_TOLERANCE = 0.0
+SIMPLIFY_TOLERANCE_OPTION = "--simplify-tolerance="
+# Wall time, cpu time, memory and throughput of every stage of the run
+INSTRUMENTATION = RunInstrumentation("orthophoto")
 
 '''
 Finds all intersecting polygons and outputs them to geojson file with the given id prefix
 
 all_polygons_file: geojson file containing all the polygons
 bounding_polygon: The bounding polygon (geometry.shape)
-output_file: geojson file containing all the polygons or parts of the polygons that are within the bounding polygon
+output_file: geojson file containing all the polygons or parts of the polygons that are within the bounding polygon,
+             written in the binary polygon format instead when it ends with its extension (.plyb)
 id_prefix: all output polygons will have an id prefixed by this
 '''
 def find_intersecting_polygons(all_polygons_file, bounding_polygon, output_file, id_prefix):
     # Load all polygons into a feature set
-    with open(all_polygons_file, mode="r") as in_file:
-        all_polygons = geojson.load(in_file)
+    with INSTRUMENTATION.stage("merged_read") as record:
+        with open(all_polygons_file, mode="r") as in_file:
+            all_polygons = geojson.load(in_file)
+        record.points_out += len(all_polygons["features"])
+    with INSTRUMENTATION.stage("boundary_filter", points_in=len(all_polygons["features"])) as record:
+        total_area = 0
+        num_polys = 0
+        intersecting_polygons = []
+
+        # Find the intersecting polygons
+        for feature in all_polygons["features"]:
+            polygon = geometry.shape(feature["geometry"])
 
-    total_area = 0
-    num_polys = 0
-    intersecting_polygons = []
-
-    # Find the intersecting polygons
-    for feature in all_polygons["features"]:
-        polygon = geometry.shape(feature["geometry"])
-
-        if not polygon.is_valid:
-            if DEBUG:
-                print("Attempting to fix invalid polygon")
-            polygon = polygon.buffer(0)
-
-            # If it's still not valid, just skip it
             if not polygon.is_valid:
                 if DEBUG:
-                    print("Fix was unsuccessful. Skipping polygon")
-                continue
+                    print("Attempting to fix invalid polygon")
+                polygon = polygon.buffer(0)
+
+                # If it's still not valid, just skip it
+                if not polygon.is_valid:
+                    if DEBUG:
+                        print("Fix was unsuccessful. Skipping polygon")
+                    continue
 
-        intersection = bounding_polygon.intersection(polygon)
+            intersection = bounding_polygon.intersection(polygon)
 
-        # If polygon overlaps with bounds, we want to include it
-        if intersection.area > 0:
-            num_polys += 1
+            # If polygon overlaps with bounds, we want to include it
+            if intersection.area > 0:
+                num_polys += 1
 
-            # Construct new geojson polygon for intersection area
-            if intersection.geom_type == 'MultiPolygon':
-                new_polygon = geojson.MultiPolygon(geometry.mapping(intersection)["coordinates"])
-            else:
-                new_polygon = geojson.Polygon(geometry.mapping(intersection)["coordinates"])
+                # Construct new geojson polygon for intersection area
+                if intersection.geom_type == 'MultiPolygon':
+                    new_polygon = geojson.MultiPolygon(geometry.mapping(intersection)["coordinates"])
+                else:
+                    new_polygon = geojson.Polygon(geometry.mapping(intersection)["coordinates"])
 
-            #Create feature and add to list
-            new_feature = geojson.Feature(geometry=new_polygon)
+                #Create feature and add to list
+                new_feature = geojson.Feature(geometry=new_polygon)
 
-            new_feature["properties"]["id"] = id_prefix + str(uuid.uuid4())
+                new_feature["properties"]["id"] = id_prefix + str(uuid.uuid4())
 
-            # Add to list of features to return
-            intersecting_polygons.append(new_feature)
+                # Add to list of features to return
+                intersecting_polygons.append(new_feature)
+        record.points_out += len(intersecting_polygons)
 
     # Add all features to a feature set
     new_feature_collection = geojson.FeatureCollection(intersecting_polygons)
 
     # Output to a file
-    with open(output_file, mode="w") as out_file:
-        geojson.dump(new_feature_collection, out_file, indent=4)
+    with INSTRUMENTATION.stage("export", points_in=len(intersecting_polygons)) as record:
+        if is_binary_path(output_file):
+            write_polygon_features(output_file, intersecting_polygons)
+        else:
+            with open(output_file, mode="w") as out_file:
+                geojson.dump(new_feature_collection, out_file, indent=4)
+        record.points_out += len(intersecting_polygons)
 
 '''
 Calculates the standard devation in the specified window and returns if it's over the threshold
@@ -97,6 +116,19 @@ def compressed_green(x,y,window_size,green_mask):
     r = green_mask[x*window_size:(x+1)*window_size, y*window_size:(y+1)*window_size]
     return r.mean() > 128
 
+'''
+Converts the given polygon to utm10 coordinates with correct scaling
+
+polygon_raw: the raw polygon
+x_res: the resolution of x values
+y_res: the resolution of y values
+utm_10_top_left_coord: the utm10 coordinates of the top left corner of the image
+
+returns the polygon vertices in utm10 coordinates
+'''
+def convert_to_utm(polygon_raw, x_res, y_res, utm_10_top_left_coord):
+    return [[x[0][0]*x_res+utm_10_top_left_coord[0],x[0][1]*y_res+utm_10_top_left_coord[1]] for x in polygon_raw]
+
 '''
 Converts the given polygon to longitude and latitude with correct scaling
 
@@ -108,8 +140,17 @@ utm_10_top_left_coord: the utm10 coordinates of the top left corner of the image
 returns the projected polygon
 '''
 def convert_to_lon_lat(polygon_raw, x_res, y_res, utm_10_top_left_coord):
-    polygon_processed = [[x[0][0]*x_res+utm_10_top_left_coord[0],x[0][1]*y_res+utm_10_top_left_coord[1]] for x in polygon_raw]
-    projected = [UTM_10_PROJ(x[0], x[1], inverse=True) for x in polygon_processed]
+    return project_to_lon_lat(convert_to_utm(polygon_raw, x_res, y_res, utm_10_top_left_coord))
+
+'''
+Projects utm10 vertices to longitude and latitude and closes the ring
+
+polygon_utm: the polygon vertices in utm10 coordinates
+
+returns the projected polygon
+'''
+def project_to_lon_lat(polygon_utm):
+    projected = [UTM_10_PROJ(x[0], x[1], inverse=True) for x in polygon_utm]
     head = projected[0]
     projected.append(head)
     return projected
@@ -123,8 +164,11 @@ g: the granularity of the processing
 stddev_threshold: standard deviation threshold
 min_colour_threshold: the minimum colour that's considered green
 max_colour_threshold: the maximum colour that's considered green
+simplify_tolerance: the furthest a contour vertex may be moved when simplifying, in metres
+
+returns the simplification report of the tile
 '''
-def extract_tree_cover_from_tif_tfw(filename, image_size, g, stddev_threshold, min_colour_threshold, max_colour_threshold):
+def extract_tree_cover_from_tif_tfw(filename, image_size, g, stddev_threshold, min_colour_threshold, max_colour_threshold, simplify_tolerance=SIMPLIFY_TOLERANCE):
     # number of subimages
     n = int(image_size / g)
     print("Analysing "+ filename + ".tif...")
@@ -133,115 +177,163 @@ def extract_tree_cover_from_tif_tfw(filename, image_size, g, stddev_threshold, m
     x_coord = 0.0
     y_coord = 0.0
 
-    with open(filename+".tfw", mode = "r") as tfw_file:
-        x_res = float(tfw_file.readline())
-        tfw_file.readline()
-        tfw_file.readline()
-        y_res = float(tfw_file.readline())
-        x_coord = float(tfw_file.readline())
-        y_coord = float(tfw_file.readline())
-
-    image = cv2.imread(filename+'.tif')
-
-    kernel = np.ones((g,g),np.float32)/(g*g)
-    blurred_image = cv2.filter2D(image,-1,kernel)
-    hsv_blurred_image = cv2.cvtColor(blurred_image, cv2.COLOR_RGB2HSV)
-    mask = cv2.inRange(hsv_blurred_image, min_colour_threshold, max_colour_threshold)
-    blurred_image = ndimage.gaussian_filter(image, sigma=2)
-    stddev_array = np.array([stddev_above_threshold(i//n,i%n,g,stddev_threshold,blurred_image) for i in range(0,n**2)]).reshape(n,n)
-
-    compressed_green_array = np.array([compressed_green(i//n,i%n,g,mask) for i in range(0,n**2)]).reshape(n,n)
-
-    green_stddev_array = np.array([compressed_green_array[i//n,i%n] and stddev_array[i//n,i%n] for i in range(0,n**2)]).reshape(n,n)
-    close_img = ndimage.binary_closing(green_stddev_array)
-    open_img = ndimage.binary_opening(close_img)
-    thresh = np.array(open_img*255,dtype=np.uint8)
-
-    contours, hierarchy = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    with INSTRUMENTATION.stage("tile_read") as record:
+        with open(filename+".tfw", mode = "r") as tfw_file:
+            x_res = float(tfw_file.readline())
+            tfw_file.readline()
+            tfw_file.readline()
+            y_res = float(tfw_file.readline())
+            x_coord = float(tfw_file.readline())
+            y_coord = float(tfw_file.readline())
+
+        image = cv2.imread(filename+'.tif')
+        record.points_out += image.shape[0] * image.shape[1]
+
+    # the points of this stage are the pixels in and the green blocks out
+    with INSTRUMENTATION.stage("classification_filter", points_in=image.shape[0] * image.shape[1]) as record:
+        kernel = np.ones((g,g),np.float32)/(g*g)
+        blurred_image = cv2.filter2D(image,-1,kernel)
+        hsv_blurred_image = cv2.cvtColor(blurred_image, cv2.COLOR_RGB2HSV)
+        mask = cv2.inRange(hsv_blurred_image, min_colour_threshold, max_colour_threshold)
+        blurred_image = ndimage.gaussian_filter(image, sigma=2)
+        stddev_array = np.array([stddev_above_threshold(i//n,i%n,g,stddev_threshold,blurred_image) for i in range(0,n**2)]).reshape(n,n)
+
+        compressed_green_array = np.array([compressed_green(i//n,i%n,g,mask) for i in range(0,n**2)]).reshape(n,n)
+
+        green_stddev_array = np.array([compressed_green_array[i//n,i%n] and stddev_array[i//n,i%n] for i in range(0,n**2)]).reshape(n,n)
+        close_img = ndimage.binary_closing(green_stddev_array)
+        open_img = ndimage.binary_opening(close_img)
+        thresh = np.array(open_img*255,dtype=np.uint8)
+        record.points_out += int(np.count_nonzero(open_img))
+
+    with INSTRUMENTATION.stage("contours", points_in=int(np.count_nonzero(open_img))) as record:
+        contours, hierarchy = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        record.points_out += sum(len(c) for c in contours)
     print("Found "+str(len(contours))+" contours in " + filename + ".tif")
 
     feature_list = []
+    report = SimplificationReport(simplify_tolerance)
     for c in contours:
-        lon_lat = convert_to_lon_lat(c*g,x_res,y_res,[x_coord,y_coord])
-        feature_list.append(geojson.Feature(geometry=geojson.Polygon([lon_lat])))
+        with INSTRUMENTATION.stage("simplification", points_in=len(c)) as record:
+            polygon_utm = convert_to_utm(c*g,x_res,y_res,[x_coord,y_coord])
+            # simplify in metres before projecting, contours of less than 3 vertices are no polygons to simplify.
+            # Self touching contours are repaired first, the ones that cannot be are kept and counted as skipped
+            if len(polygon_utm) >= 3:
+                simplified = simplify_polygons([geometry.Polygon(polygon_utm)], simplify_tolerance, report)[0]
+                polygon_utm = list(simplified.exterior.coords)[:-1]
+            record.points_out += len(polygon_utm)
+        with INSTRUMENTATION.stage("projection", points_in=len(polygon_utm)) as record:
+            lon_lat = project_to_lon_lat(polygon_utm)
+            feature_list.append(geojson.Feature(geometry=geojson.Polygon([lon_lat])))
+            record.points_out += len(lon_lat)
     feature_collection = geojson.FeatureCollection(feature_list)
-
-    with open(filename + ".geojson", mode = "w") as out_file:
-        geojson.dump(feature_collection,out_file)
-
-# Command line arguments should be:
-# 1. The directory containing all the tif and tfw
-# 2. The bounding polygon to check for intersections with
-# 3. The file to output the intersecting polygons to
-# 4. The ID prefix
-# 5. The standard deviation threshold
-# 6-11.  [optional] The hsv of the min and max segmentation colour
-args = sys.argv
-if len(args) != 6 and len(args) != 12:
-    print(
-    '''
-    Invalid args!
-    Command line arguments should be:
-    1. The directory containing all the tif and tfw
-    2. The bounding polygon to check for intersections with
-    3. The file to output the intersecting polygons to
-    4. The ID prefix
-    5. The standard deviation threshold
-    6-11.  [optional] The hsv of the min and max segmentation colour
-    '''
-    )
-    sys.exit(1)
-
-if len(args) >= 6:
-    tif_tfw_directory = args[1]
-    with open(args[2], mode="r") as bounding_in_file:
-        bounding_polygon = geometry.shape(geojson.load(bounding_in_file)["features"][0]["geometry"])
-    output_file = args[3]
-    id_prefix = args[4]
-    standard_deviation_threshold = int(args[5])
-
-if len(args) == 12:
-    h_min = float(args[6])
-    s_min = float(args[7])
-    v_min = float(args[8])
-    h_max = float(args[9])
-    s_max = float(args[10])
-    v_max = float(args[11])
-else:
-    h_min = 35.0
-    s_min = 30.0
-    v_min = 0.0
-    h_max = 270.0
-    s_max = 255.0
-    v_max = 150.0
-
-# size of image
-image_size = 10000
-# granularity of subimages
-g = 20
-min_colour = (h_min/360*255,s_min, v_min)
-max_colour = (h_max/360*255,s_max, v_max)
-
-#Start extraction
-os.chdir(tif_tfw_directory)
-for file in os.listdir(tif_tfw_directory):
-     if file.endswith(".tif"):
-        extract_tree_cover_from_tif_tfw(file[:-4],image_size,g,standard_deviation_threshold,min_colour,max_colour)
-
-feature_list = []
-
-for file in os.listdir(tif_tfw_directory):
-     if file.endswith(".geojson"):
-        with open(file) as f:
-            gj = geojson.load(f)
-            feature_list += gj['features']
-feature_collection = geojson.FeatureCollection(feature_list)
-
-all_polygons_file = "full_map.geojson"
-
-with open(all_polygons_file, mode = "w") as out_file:
-    geojson.dump(feature_collection,out_file)
-
-find_intersecting_polygons(all_polygons_file, bounding_polygon, output_file, id_prefix)
-
-print("Done!")
+    if DEBUG:
+        print(report.summary())
+
+    with INSTRUMENTATION.stage("tile_export", points_in=len(feature_list)) as record:
+        with open(filename + ".geojson", mode = "w") as out_file:
+            geojson.dump(feature_collection,out_file)
+        record.points_out += len(feature_list)
+    return report
+
+def main():
+    # Command line arguments should be:
+    # 1. The directory containing all the tif and tfw
+    # 2. The bounding polygon to check for intersections with
+    # 3. The file to output the intersecting polygons to, .plyb for the binary polygon format
+    # 4. The ID prefix
+    # 5. The standard deviation threshold
+    # 6-11.  [optional] The hsv of the min and max segmentation colour
+    # --simplify-tolerance=<metres> [optional, anywhere] The furthest a contour vertex may be moved when simplifying
+    args = [arg for arg in sys.argv if not arg.startswith(SIMPLIFY_TOLERANCE_OPTION)]
+    simplify_tolerance = SIMPLIFY_TOLERANCE
+    for arg in sys.argv:
+        if arg.startswith(SIMPLIFY_TOLERANCE_OPTION):
+            simplify_tolerance = float(arg[len(SIMPLIFY_TOLERANCE_OPTION):])
+    if len(args) != 6 and len(args) != 12 or simplify_tolerance < 0:
+        print(
+        '''
+        Invalid args!
+        Command line arguments should be:
+        1. The directory containing all the tif and tfw
+        2. The bounding polygon to check for intersections with
+        3. The file to output the intersecting polygons to, .plyb for the binary polygon format
+        4. The ID prefix
+        5. The standard deviation threshold
+        6-11.  [optional] The hsv of the min and max segmentation colour
+        --simplify-tolerance=<metres> [optional] The furthest a contour vertex may be moved when
+            simplifying. Defaults to 0, which keeps every vertex
+        '''
+        )
+        sys.exit(1)
+
+    if len(args) >= 6:
+        tif_tfw_directory = args[1]
+        with open(args[2], mode="r") as bounding_in_file:
+            bounding_polygon = geometry.shape(geojson.load(bounding_in_file)["features"][0]["geometry"])
+        output_file = args[3]
+        id_prefix = args[4]
+        standard_deviation_threshold = int(args[5])
+
+    if len(args) == 12:
+        h_min = float(args[6])
+        s_min = float(args[7])
+        v_min = float(args[8])
+        h_max = float(args[9])
+        s_max = float(args[10])
+        v_max = float(args[11])
+    else:
+        h_min = 35.0
+        s_min = 30.0
+        v_min = 0.0
+        h_max = 270.0
+        s_max = 255.0
+        v_max = 150.0
+
+    # size of image
+    image_size = 10000
+    # granularity of subimages
+    g = 20
+    min_colour = (h_min/360*255,s_min, v_min)
+    max_colour = (h_max/360*255,s_max, v_max)
+
+    #Start extraction
+    os.chdir(tif_tfw_directory)
+    simplification_report = SimplificationReport(simplify_tolerance)
+    for file in os.listdir(tif_tfw_directory):
+         if file.endswith(".tif"):
+            simplification_report.merge(extract_tree_cover_from_tif_tfw(
+                file[:-4],image_size,g,standard_deviation_threshold,min_colour,max_colour,simplify_tolerance))
+
+    all_polygons_file = "full_map.geojson"
+
+    with INSTRUMENTATION.stage("merge") as record:
+        feature_list = []
+
+        for file in os.listdir(tif_tfw_directory):
+             if file.endswith(".geojson"):
+                with open(file) as f:
+                    gj = geojson.load(f)
+                    feature_list += gj['features']
+        feature_collection = geojson.FeatureCollection(feature_list)
+
+        with open(all_polygons_file, mode = "w") as out_file:
+            geojson.dump(feature_collection,out_file)
+        record.points_out += len(feature_list)
+
+    find_intersecting_polygons(all_polygons_file, bounding_polygon, output_file, id_prefix)
+
+    # the run report is kept next to the output
+    INSTRUMENTATION.metadata.update({
+        "tiles": len([file for file in os.listdir(tif_tfw_directory) if file.endswith(".tif")]),
+        "parameters": {"standard_deviation_threshold": standard_deviation_threshold,
+                       "min_colour": min_colour, "max_colour": max_colour, "granularity": g,
+                       "simplify_tolerance": simplify_tolerance},
+        "simplification": simplification_report.to_dict(),
+    })
+    print("Wrote run report " + INSTRUMENTATION.write_report(os.path.dirname(os.path.abspath(output_file))))
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()